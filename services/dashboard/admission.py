@@ -0,0 +1,172 @@
+"""
+Adaptive admission control with prioritized load shedding.
+
+Every ``/api/v1`` request is classified before it reaches the threadpool:
+
+- ``critical``: sales and inventory writes
+- ``low``: analytics queries and list pages larger than
+  ``settings.admission_large_page_size``
+- ``normal``: everything else
+
+Saturation is the highest of these signals, each relative to its limit:
+requests in flight against the capacity left for non-critical work, database
+pool utilization, recent pool checkout wait and recent request latency. Latency
+is tracked per priority: normal work is only shed for slow normal and critical
+requests, never for slow analytics, and a priority's latency only counts once
+it is based on ``settings.admission_latency_min_samples`` recent requests, so a
+single slow request after a quiet spell sheds nothing. Low
+priority work is rejected once saturation reaches
+``settings.admission_low_priority_threshold`` and normal work once it goes
+past 1.0, both with ``503`` and ``Retry-After``. Critical requests are only
+turned away when ``settings.admission_max_in_flight`` is reached, so
+``settings.admission_reserved_in_flight`` slots are always left for them.
+
+Decisions are counted in ``admission_requests_total`` and the latest
+saturation is exported as ``admission_saturation``.
+"""
+import json
+import time
+from typing import Callable, Optional, Tuple
+from urllib.parse import parse_qs
+
+from config import settings
+from metrics import Counter, DecayingAverage, DecayingCount, Gauge, registry
+
+API_PREFIX = "/api/v1"
+CRITICAL_WRITE_PREFIXES = (f"{API_PREFIX}/sales", f"{API_PREFIX}/inventory")
+LOW_PRIORITY_PREFIXES = (f"{API_PREFIX}/analytics/",)
+# Job creation and status are cheap; the work itself runs off the request path
+NORMAL_PRIORITY_PREFIXES = (f"{API_PREFIX}/analytics/jobs",)
+EXEMPT_PREFIXES = (f"{API_PREFIX}/admin",)
+# Latency of the priorities whose requests are slowed down by, and so may shed, each priority
+LATENCY_SIGNALS = {"low": ("critical", "normal", "low"), "normal": ("critical", "normal")}
+LATENCY_HALF_LIFE = 5.0
+
+# Only updated from the event loop
+admission_requests = registry.register(Counter(
+    "admission_requests_total", "Admission decisions by request priority, decision and shedding reason",
+    ["priority", "decision", "reason"], threadsafe=False
+))
+admission_saturation = registry.register(Gauge(
+    "admission_saturation", "Saturation at the latest admission decision (1.0 = at capacity)", threadsafe=False
+))
+
+
+def page_limit(query_string: bytes) -> int:
+    if b"limit=" not in query_string:
+        return 0
+    try:
+        return int(parse_qs(query_string.decode("latin-1")).get("limit", ["0"])[0])
+    except ValueError:
+        return 0
+
+
+def classify(method: str, path: str, query_string: bytes) -> Optional[str]:
+    """
+    Priority of a request, or None when it is not subject to admission control
+    """
+    if not path.startswith(API_PREFIX) or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if method != "GET" and path.startswith(CRITICAL_WRITE_PREFIXES):
+        return "critical"
+    if path.startswith(LOW_PRIORITY_PREFIXES) and not path.startswith(NORMAL_PRIORITY_PREFIXES):
+        return "low"
+    if method == "GET" and page_limit(query_string) > settings.admission_large_page_size:
+        return "low"
+    return "normal"
+
+
+class AdmissionController:
+    def __init__(self, pool_saturation: Callable[[], Tuple[float, float]]):
+        self.pool_saturation = pool_saturation
+        self.in_flight = 0
+        self.latency = {priority: DecayingAverage(half_life=LATENCY_HALF_LIFE) for priority in ("critical", "normal", "low")}
+        self.samples = {priority: DecayingCount(half_life=LATENCY_HALF_LIFE) for priority in ("critical", "normal", "low")}
+
+    def recent_latency(self, priority: str) -> float:
+        # Highest latency among the priorities with enough recent requests to go by
+        return max(
+            (self.latency[other].value() for other in LATENCY_SIGNALS[priority]
+             if self.samples[other].value() >= settings.admission_latency_min_samples),
+            default=0.0
+        )
+
+    def saturation(self, priority: str = "normal") -> Tuple[float, str]:
+        """
+        Highest signal relative to its limit for a request of this priority, with the name of that signal
+        """
+        shared_capacity = max(1, settings.admission_max_in_flight - settings.admission_reserved_in_flight)
+        utilization, pool_wait = self.pool_saturation()
+        signals = (
+            (self.in_flight / shared_capacity, "in_flight"),
+            (utilization, "pool"),
+            (pool_wait * 1000 / settings.admission_pool_wait_target_ms, "pool_wait"),
+            (self.recent_latency(priority) * 1000 / settings.admission_latency_target_ms, "latency"),
+        )
+        return max(signals)
+
+    def admit(self, priority: str) -> Optional[str]:
+        """
+        Admit a request, or return the reason it is shed
+        """
+        if priority == "critical":
+            reason = "in_flight" if self.in_flight >= settings.admission_max_in_flight else None
+        else:
+            score, reason = self.saturation(priority)
+            admission_saturation.set(score)
+            if priority == "low":
+                overloaded = score >= settings.admission_low_priority_threshold
+            else:
+                # In-flight requests are a hard cap; the other signals may reach their limit
+                overloaded = score > 1.0 or (reason == "in_flight" and score >= 1.0)
+            if not overloaded:
+                reason = None
+        admission_requests.inc((priority, "shed" if reason else "admitted", reason or ""))
+        if reason is None:
+            self.in_flight += 1
+        return reason
+
+    def release(self, priority: str, elapsed: float):
+        self.in_flight -= 1
+        self.latency[priority].observe(elapsed)
+        self.samples[priority].add()
+
+
+async def _send_overloaded(send, reason: str):
+    body = json.dumps({"detail": f"Server is overloaded ({reason}), retry later"}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(settings.admission_retry_after_seconds).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, pool_saturation: Callable[[], Tuple[float, float]]):
+        self.app = app
+        self.controller = AdmissionController(pool_saturation)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.admission_control:
+            await self.app(scope, receive, send)
+            return
+        priority = classify(scope["method"], scope["path"], scope.get("query_string", b""))
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = self.controller.admit(priority)
+        if reason is not None:
+            await _send_overloaded(send, reason)
+            return
+
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(priority, time.perf_counter() - started_at)
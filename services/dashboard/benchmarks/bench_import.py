@@ -0,0 +1,51 @@
+"""
+Time a bulk catalog import: first pass inserts every SKU, second pass updates them.
+
+Usage (from services/dashboard):
+    python -m benchmarks.bench_import --rows 100000
+"""
+import argparse
+import io
+import resource
+import time
+
+from benchmarks.common import create_bench_engine, seed
+
+from catalog_import import import_products
+
+
+def build_csv(rows: int, price_offset: float) -> bytes:
+    lines = ["sku,name,description,price,category,quantity"]
+    lines.extend(
+        f"IMPORT-{i:07d},Imported product {i},Supplier item {i},{5 + i % 500 + price_offset},Category {1 + i % 5},{i % 100}"
+        for i in range(rows)
+    )
+    return ("\n".join(lines) + "\n").encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--database-url", default=None, help="defaults to a throwaway SQLite file")
+    args = parser.parse_args()
+
+    engine, SessionLocal = create_bench_engine(args.database_url)
+    # Only the categories matter; the import resolves them by name
+    seed(engine, num_products=1, num_sales=0)
+
+    for label, price_offset in [("insert", 0.0), ("update", 1.0)]:
+        upload = io.BytesIO(build_csv(args.rows, price_offset))
+        db = SessionLocal()
+        start = time.perf_counter()
+        result = import_products(db, upload, "csv", create_inventory=True)
+        elapsed = time.perf_counter() - start
+        db.close()
+        print(
+            f"{label:<8}{args.rows:>9} rows {elapsed:8.2f}s {args.rows / elapsed:>10,.0f} rows/s  "
+            f"inserted={result['inserted']} updated={result['updated']} rejected={result['rejected']}"
+        )
+    print(f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
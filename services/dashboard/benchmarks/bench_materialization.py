@@ -0,0 +1,118 @@
+"""
+Compare ORM hydration against the Core select() list queries in crud.
+
+Measures CPU time (process_time) and peak traced memory per row for each
+read-only list query.
+
+Usage (from services/dashboard):
+    python -m benchmarks.bench_materialization --rows 10000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import desc
+from sqlalchemy.orm import selectinload
+
+from benchmarks.common import create_bench_engine, seed
+
+import crud, models, schemas
+
+
+def orm_products(db, rows):
+    return db.query(models.Product).limit(rows).all()
+
+
+def orm_inventory(db, rows):
+    return db.query(models.Inventory).limit(rows).all()
+
+
+def orm_sales(db, rows):
+    return db.query(models.Sale).options(
+        selectinload(models.Sale.items)
+    ).order_by(desc(models.Sale.transaction_date)).limit(rows).all()
+
+
+def product_sales_query():
+    # Covers the whole seeded year, i.e. every sale item
+    return schemas.ProductSalesQuery(
+        start_date=(datetime.now() - timedelta(days=400)).date(),
+        end_date=datetime.now().date()
+    )
+
+
+def orm_product_sales(db, rows):
+    query = product_sales_query()
+    return db.query(
+        models.SaleItem,
+        models.Sale.transaction_date,
+        models.Product.name.label("product_name"),
+        models.Category.name.label("category_name")
+    ).join(
+        models.Sale, models.SaleItem.sale_id == models.Sale.id
+    ).join(
+        models.Product, models.SaleItem.product_id == models.Product.id
+    ).join(
+        models.Category, models.Product.category_id == models.Category.id
+    ).filter(
+        models.Sale.transaction_date >= datetime.combine(query.start_date, datetime.min.time()),
+        models.Sale.transaction_date <= datetime.combine(query.end_date, datetime.max.time())
+    ).all()
+
+
+def core_product_sales(db, rows):
+    return crud.get_product_sales(db, query=product_sales_query())
+
+
+CASES = [
+    ("products", orm_products, lambda db, rows: crud.get_products(db, limit=rows)),
+    ("inventory", orm_inventory, lambda db, rows: crud.get_all_inventory(db, limit=rows)),
+    ("sales", orm_sales, lambda db, rows: crud.get_sales(db, limit=rows)),
+    ("product_sales", orm_product_sales, core_product_sales),
+]
+
+
+def measure(SessionLocal, fn, rows, repeat):
+    cpu_times = []
+    for _ in range(repeat):
+        db = SessionLocal()
+        gc.collect()
+        start = time.process_time()
+        result = fn(db, rows)
+        cpu_times.append(time.process_time() - start)
+        count = len(result)
+        db.close()
+
+    db = SessionLocal()
+    gc.collect()
+    tracemalloc.start()
+    result = fn(db, rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.close()
+    return min(cpu_times), peak, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine, SessionLocal = create_bench_engine()
+    seed(engine, num_products=args.rows, num_sales=args.rows)
+
+    print(f"{'query':<15}{'rows':>7}{'ORM us/row':>12}{'Core us/row':>13}{'ORM B/row':>11}{'Core B/row':>12}")
+    for name, orm_fn, core_fn in CASES:
+        orm_cpu, orm_peak, count = measure(SessionLocal, orm_fn, args.rows, args.repeat)
+        core_cpu, core_peak, _ = measure(SessionLocal, core_fn, args.rows, args.repeat)
+        print(
+            f"{name:<15}{count:>7}{orm_cpu / count * 1e6:>12.1f}{core_cpu / count * 1e6:>13.1f}"
+            f"{orm_peak / count:>11.0f}{core_peak / count:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compare the validated response_model path against the orjson fast path.
+
+Usage (from services/dashboard):
+    python -m benchmarks.bench_responses --rows 1000 --repeat 20
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.common import create_bench_engine, seed
+
+from fastapi.testclient import TestClient
+
+from config import settings
+from database import get_db, get_read_db
+from main import app
+
+ENDPOINTS = ["/api/v1/sales/?limit={rows}", "/api/v1/products/?limit={rows}"]
+
+
+def time_endpoint(client, url, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine, SessionLocal = create_bench_engine()
+    seed(engine, num_products=args.rows, num_sales=args.rows)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    client = TestClient(app)
+
+    print(f"{'endpoint':<32}{'validated (ms)':>16}{'fast (ms)':>12}{'speedup':>10}")
+    for template in ENDPOINTS:
+        url = template.format(rows=args.rows)
+        settings.fast_json_responses = False
+        client.get(url)
+        validated = time_endpoint(client, url, args.repeat)
+        settings.fast_json_responses = True
+        client.get(url)
+        fast = time_endpoint(client, url, args.repeat)
+        print(f"{url:<32}{validated * 1000:>16.1f}{fast * 1000:>12.1f}{validated / fast:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
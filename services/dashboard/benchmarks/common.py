@@ -0,0 +1,110 @@
+"""
+Shared helpers for the benchmark scripts: a throwaway SQLite database seeded
+with bulk Core inserts so large datasets can be built in seconds.
+"""
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# database.py builds its engine at import time, so give it something to connect to
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "dashboard_bench_app.db"))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import models
+from database import Base
+
+MARKETPLACES = ["Amazon", "Walmart", "Direct"]
+
+
+def create_bench_engine(database_url=None):
+    if database_url is None:
+        fd, path = tempfile.mkstemp(prefix="dashboard_bench_", suffix=".db")
+        os.close(fd)
+        database_url = f"sqlite:///{path}"
+    connect_args = {"check_same_thread": False} if database_url.startswith("sqlite") else {}
+    engine = create_engine(database_url, connect_args=connect_args)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def seed(engine, num_products=1000, num_sales=1000, items_per_sale=3, seed_value=42, batch_size=10000, logs_per_product=0):
+    """
+    Bulk insert categories, products, inventory, inventory logs and sales with their items
+    """
+    rng = random.Random(seed_value)
+    now = datetime.now()
+
+    with engine.begin() as conn:
+        conn.execute(insert(models.Category), [
+            {"id": i, "name": f"Category {i}", "description": f"Benchmark category {i}"}
+            for i in range(1, 6)
+        ])
+        conn.execute(insert(models.Product), [
+            {
+                "id": i,
+                "name": f"Product {i}",
+                "description": f"Benchmark product {i}",
+                "price": round(rng.uniform(5, 500), 2),
+                "sku": f"BENCH-{i:07d}",
+                "category_id": rng.randint(1, 5),
+                "created_at": now,
+            }
+            for i in range(1, num_products + 1)
+        ])
+        conn.execute(insert(models.Inventory), [
+            {
+                "product_id": i,
+                "quantity": rng.randint(0, 200),
+                "low_stock_threshold": 10,
+                "last_restocked": now,
+            }
+            for i in range(1, num_products + 1)
+        ])
+        if logs_per_product:
+            conn.execute(insert(models.InventoryLog), [
+                {
+                    "product_id": i,
+                    "previous_quantity": 100,
+                    "new_quantity": 99,
+                    "change_reason": "Benchmark restock",
+                    "timestamp": now - timedelta(hours=j),
+                }
+                for i in range(1, num_products + 1)
+                for j in range(logs_per_product)
+            ])
+
+    sale_id = 1
+    while sale_id <= num_sales:
+        sales, items = [], []
+        for sale_id in range(sale_id, min(sale_id + batch_size, num_sales + 1)):
+            transaction_date = now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+            total = 0.0
+            for _ in range(items_per_sale):
+                quantity = rng.randint(1, 3)
+                unit_price = round(rng.uniform(5, 500), 2)
+                items.append({
+                    "sale_id": sale_id,
+                    "product_id": rng.randint(1, num_products),
+                    "quantity": quantity,
+                    "unit_price": unit_price,
+                    "subtotal": unit_price * quantity,
+                    "transaction_date": transaction_date,
+                })
+                total += unit_price * quantity
+            sales.append({
+                "id": sale_id,
+                "order_id": f"ORD-BENCH-{sale_id}",
+                "total_amount": total,
+                "transaction_date": transaction_date,
+                "marketplace": rng.choice(MARKETPLACES),
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(models.Sale), sales)
+            conn.execute(insert(models.SaleItem), items)
+        sale_id += 1
@@ -0,0 +1,57 @@
+"""
+Diff two JSON result files written by benchmarks.bench_crud.
+
+Prints the change in ops/sec, p99 and statements per call for every
+(scale, function) present in both files, and exits non-zero when any
+function got slower than --threshold percent or issues more statements.
+
+Usage (from services/dashboard):
+    python -m benchmarks.compare before.json after.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        data = json.load(f)
+    return data, {(r["scale"], r["function"]): r for r in data["results"]}
+
+
+def percent_change(before, after):
+    return (after - before) / before * 100 if before else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed ops/sec drop in percent")
+    args = parser.parse_args()
+
+    before_meta, before = load(args.before)
+    after_meta, after = load(args.after)
+    print(f"{before_meta.get('commit')} -> {after_meta.get('commit')} ({after_meta.get('database')})")
+    print(f"{'scale':>9}  {'function':<25}{'ops/sec':>10}{'p99':>10}{'stmts/op':>12}")
+
+    regressions = []
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        ops = percent_change(old["ops_per_sec"], new["ops_per_sec"])
+        p99 = percent_change(old["p99_ms"], new["p99_ms"])
+        statements = new["statements_per_op"] - old["statements_per_op"]
+        print(f"{key[0]:>9}  {key[1]:<25}{ops:>+9.1f}%{p99:>+9.1f}%{statements:>+12.1f}")
+        if ops < -args.threshold or statements > 0:
+            regressions.append(key)
+
+    for key in sorted(before.keys() ^ after.keys()):
+        print(f"{key[0]:>9}  {key[1]:<25}  only in {'before' if key in before else 'after'}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold}% or with extra statements")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
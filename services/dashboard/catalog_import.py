@@ -0,0 +1,143 @@
+"""
+Bulk product catalog import for ``POST /api/v1/products/import``.
+
+The upload, CSV with a header line or NDJSON, is spooled to a temporary file
+that only stays in memory while it is small, and then read record by record.
+Category names are resolved to IDs once, and valid records are upserted by
+SKU with ``INSERT ... ON CONFLICT (sku) DO UPDATE`` in batches of
+``settings.product_import_batch_size``. Each batch is committed on its own,
+so memory stays bounded however large the catalog is. Invalid records are
+counted and skipped; only the first few errors are reported.
+"""
+import csv
+import io
+import json
+from typing import Optional
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import crud, schemas
+from config import settings
+
+FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/json": "ndjson",
+}
+# Uploads larger than this are spooled to disk
+SPOOL_MEMORY_BYTES = 8 * 1024 * 1024
+MAX_REPORTED_ERRORS = 100
+
+PRODUCT_FIELDS = ("name", "description", "price", "sku", "category_id")
+
+
+def upload_format(content_type: Optional[str], requested: Optional[str] = None) -> str:
+    if requested:
+        if requested not in ("csv", "ndjson"):
+            raise ValueError("format must be csv or ndjson")
+        return requested
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type not in FORMATS:
+        raise ValueError(f"Upload a CSV or NDJSON body ({', '.join(FORMATS)}) or pass format=csv|ndjson")
+    return FORMATS[media_type]
+
+
+def read_records(stream, fmt: str):
+    """
+    Yield (line number, record or the error that made it unreadable)
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            for record in reader:
+                # Empty cells mean "not given"
+                yield reader.line_num, {key: value for key, value in record.items() if key and value != ""}
+        else:
+            for line_number, line in enumerate(text, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as exc:
+                    yield line_number, exc
+                    continue
+                yield line_number, record if isinstance(record, dict) else ValueError("expected a JSON object")
+    finally:
+        text.detach()
+
+
+def validation_message(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors())
+
+
+class CatalogImport:
+    def __init__(self, db: Session, create_inventory: bool = False, batch_size: Optional[int] = None):
+        self.db = db
+        self.create_inventory = create_inventory
+        self.batch_size = batch_size or settings.product_import_batch_size
+        self.categories = dict(db.execute(select(crud.categories_table.c.name, crud.categories_table.c.id)).all())
+        self.category_ids = set(self.categories.values())
+        self.result = {"inserted": 0, "updated": 0, "rejected": 0, "inventory_created": 0, "errors": []}
+        # SKU -> product row and stock levels of the pending batch
+        self._products = {}
+        self._stock = {}
+
+    def run(self, stream, fmt: str):
+        for line, record in read_records(stream, fmt):
+            if isinstance(record, Exception):
+                self.reject(line, str(record))
+                continue
+            try:
+                row = schemas.ProductImportRow(**record)
+                category_id = self.resolve_category(row)
+            except ValidationError as exc:
+                self.reject(line, validation_message(exc))
+                continue
+            except ValueError as exc:
+                self.reject(line, str(exc))
+                continue
+
+            # A SKU repeated within a batch would be upserted twice by one statement
+            if row.sku in self._products:
+                self.flush()
+            self._products[row.sku] = {**row.model_dump(include=set(PRODUCT_FIELDS)), "category_id": category_id}
+            self._stock[row.sku] = {"quantity": row.quantity, "low_stock_threshold": row.low_stock_threshold}
+            if len(self._products) >= self.batch_size:
+                self.flush()
+        self.flush()
+        return self.result
+
+    def resolve_category(self, row: schemas.ProductImportRow) -> int:
+        if row.category_id is not None:
+            if row.category_id not in self.category_ids:
+                raise ValueError(f"Category {row.category_id} not found")
+            return row.category_id
+        if row.category is None:
+            raise ValueError("category or category_id is required")
+        if row.category not in self.categories:
+            raise ValueError(f"Category '{row.category}' not found")
+        return self.categories[row.category]
+
+    def reject(self, line: int, error: str):
+        self.result["rejected"] += 1
+        if len(self.result["errors"]) < MAX_REPORTED_ERRORS:
+            self.result["errors"].append({"line": line, "error": error})
+
+    def flush(self):
+        if not self._products:
+            return
+        inserted, updated = crud.upsert_products(self.db, list(self._products.values()))
+        if self.create_inventory:
+            self.result["inventory_created"] += crud.create_missing_inventory(self.db, self._stock)
+        self.db.commit()
+        self.result["inserted"] += inserted
+        self.result["updated"] += updated
+        self._products, self._stock = {}, {}
+
+
+def import_products(db: Session, stream, fmt: str, create_inventory: bool = False, batch_size: Optional[int] = None):
+    return CatalogImport(db, create_inventory=create_inventory, batch_size=batch_size).run(stream, fmt)
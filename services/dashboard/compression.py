@@ -0,0 +1,159 @@
+"""
+Response compression middleware with Accept-Encoding negotiation.
+
+Works like Starlette's ``GZipMiddleware`` but negotiates between the codecs
+listed in ``settings.compression_codecs`` (brotli and gzip), and keeps
+compressing chunk by chunk for streaming responses.
+"""
+import zlib
+from typing import List
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        # wbits=31 writes a gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def available_codecs(codecs: List[str]) -> List[str]:
+    supported = {"gzip"}
+    if brotli is not None:
+        supported.add("br")
+    return [codec for codec in codecs if codec in supported]
+
+
+def choose_encoding(accept_encoding: str, codecs: List[str]):
+    """
+    Pick the first configured codec the client accepts with a non-zero q-value
+    """
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for codec in codecs:
+        quality = accepted.get(codec, accepted.get("*", 0.0))
+        if quality > 0:
+            return codec
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, app, codecs: List[str], minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.codecs = available_codecs(codecs)
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def create_compressor(self, encoding: str):
+        if encoding == "br":
+            return BrotliCompressor(self.brotli_quality)
+        return GzipCompressor(self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.codecs:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""), self.codecs)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream_send = send
+        self.initial_message = None
+        self.started = False
+        self.passthrough = False
+        self.compressor = None
+
+    async def send(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Hold the headers back until we know whether the body is worth compressing
+            self.initial_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = "content-encoding" in headers
+            return
+
+        if message_type != "http.response.body":
+            await self.downstream_send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.started:
+            self.started = True
+            if self.passthrough or (not more_body and len(body) < self.middleware.minimum_size):
+                await self.downstream_send(self.initial_message)
+                await self.downstream_send(message)
+                return
+
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            self.compressor = self.middleware.create_compressor(self.encoding)
+            if more_body:
+                # Streaming response: the final length is unknown
+                del headers["Content-Length"]
+                await self.downstream_send(self.initial_message)
+                await self.downstream_send({
+                    "type": "http.response.body",
+                    "body": self.compressor.compress(body),
+                    "more_body": True
+                })
+            else:
+                compressed = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(compressed))
+                await self.downstream_send(self.initial_message)
+                await self.downstream_send({"type": "http.response.body", "body": compressed})
+            return
+
+        if self.compressor is None:
+            await self.downstream_send(message)
+            return
+
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.finish()
+        await self.downstream_send({"type": "http.response.body", "body": data, "more_body": more_body})
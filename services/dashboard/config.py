@@ -1,9 +1,92 @@
 import os
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     database_url: str = os.getenv("DATABASE_URL")
+    # Serialize list endpoints straight from ORM rows with orjson instead of re-validating them
+    fast_json_responses: bool = False
+    # Response compression, in order of preference ("br" needs the brotli package)
+    compression_codecs: List[str] = ["br", "gzip"]
+    compression_minimum_size: int = 1024
+    gzip_level: int = 6
+    brotli_quality: int = 4
+    # Alternative encodings offered via the Accept header on analytics, sales and inventory lists
+    binary_encodings: List[str] = ["msgpack", "arrow"]
+    # Read replicas used by GET and analytics routes; empty means everything uses the primary
+    replica_urls: List[str] = []
+    replica_max_lag_seconds: float = 5.0
+    replica_health_check_interval: float = 5.0
+    # Sharded storage: sales and sale_items are spread over these databases by order_id hash,
+    # while the catalog and inventory stay on database_url; empty means no sharding
+    shard_urls: List[str] = []
+    # Production server: worker processes and the Postgres connection budget they share
+    web_concurrency: int = 1
+    db_max_connections: int = 100
+    db_reserved_connections: int = 10
+    db_pool_timeout: float = 30.0
+    # With the psycopg 3 driver (postgresql+psycopg://), statements run this many times on a connection
+    # become server-side prepared statements; -1 disables them, e.g. behind PgBouncer in transaction mode
+    db_prepare_threshold: int = 5
+    # Token expected in the X-Admin-Token header by admin endpoints; unset disables them
+    admin_token: Optional[str] = None
+    # Statements from crud slower than this are logged and their plans captured
+    slow_query_threshold_ms: float = 500.0
+    slow_query_log_size: int = 100
+    slow_query_explain: bool = True
+    # On-demand request profiling (admin only): at most one profile at a time, this far apart
+    profile_min_interval_seconds: float = 10.0
+    profile_sample_interval_ms: float = 1.0
+    # Background analytics jobs: worker threads per process and jobs queued or running at once
+    analytics_job_workers: int = 2
+    analytics_job_max_queued: int = 20
+    # Date ranges are processed in chunks of this many days to report progress
+    analytics_job_chunk_days: int = 31
+    # Finished results are kept (and reused by identical jobs) this long; unfinished jobs are forgotten
+    # after analytics_job_timeout_seconds, e.g. when the worker running them died
+    analytics_job_result_ttl_seconds: float = 600.0
+    analytics_job_timeout_seconds: float = 3600.0
+    # Admission control: requests in flight per worker, of which some are kept for sales and inventory writes
+    admission_control: bool = True
+    admission_max_in_flight: int = 40
+    admission_reserved_in_flight: int = 8
+    # Saturation is the highest of in-flight, pool utilization, pool wait and latency relative to their limits;
+    # low-priority work (analytics, large pages) is shed above this fraction of it, other reads at 1.0
+    admission_low_priority_threshold: float = 0.7
+    admission_latency_target_ms: float = 500.0
+    # Latency is only a signal once this many requests of a priority finished recently (decaying, 5 s half-life)
+    admission_latency_min_samples: int = 20
+    admission_pool_wait_target_ms: float = 100.0
+    admission_large_page_size: int = 500
+    admission_retry_after_seconds: int = 2
+    # Statement timeouts (0 = none) for analytics routes and for background analytics jobs
+    analytics_statement_timeout_ms: int = 30000
+    analytics_job_statement_timeout_ms: int = 600000
+    # Product sales queries estimated to return more rows than this (0 = no estimate) are rejected,
+    # or run as a background job when analytics_over_budget_action is "job"
+    analytics_row_budget: int = 0
+    analytics_over_budget_action: str = "reject"
+    # Monthly partitions (Postgres): months created ahead of time, how often each process checks, and
+    # how many months to keep attached (0 = keep all; older ones are detached and kept as plain tables)
+    partition_months_ahead: int = 3
+    partition_maintenance_interval_seconds: float = 21600.0
+    partition_retention_months: int = 0
+    # Change feed: Postgres rows are returned once their transaction started this long ago, so a
+    # cursor never passes a change that has yet to commit; pages are capped at change_feed_max_limit
+    change_feed_settle_seconds: float = 5.0
+    change_feed_max_limit: int = 10000
+    # Rows upserted and committed per batch by POST /products/import
+    product_import_batch_size: int = 1000
+    # Durable ingest for POST /sales/: accepted sales are appended to a log in this directory and answered
+    # with 202, then committed in the background in batches; unset stores each sale before answering
+    sales_ingest_dir: Optional[str] = None
+    sales_ingest_batch_size: int = 500
+    sales_ingest_commit_interval_ms: float = 50.0
+    # Products sales are checked against before being accepted are reloaded this often
+    sales_ingest_catalog_ttl_seconds: float = 30.0
+    # Outcomes stay available from GET /sales/ingest/{tracking_id} this long
+    sales_ingest_result_ttl_seconds: float = 86400.0
 
 
 settings = Settings()
@@ -1,13 +1,51 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func, extract, and_, or_, desc
-from datetime import datetime, timedelta
-import models, schemas
-from typing import List, Optional, Dict, Any
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import func, extract, and_, or_, desc, select, bindparam, literal, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime, timedelta, timezone
+import itertools
+import heapq
+import re
+import models, records, schemas, sharding
+from query_limits import estimate_rows, statement_timeout
+from typing import List, Optional, Dict, Any, Tuple
+
+
+# Read-only list queries select only the columns the responses need, straight
+# from the tables, so rows come back as plain named tuples instead of ORM instances
+categories_table = models.Category.__table__
+products_table = models.Product.__table__
+inventory_table = models.Inventory.__table__
+sales_table = models.Sale.__table__
+sale_items_table = models.SaleItem.__table__
+
+PRODUCT_COLUMNS = (
+    products_table.c.id, products_table.c.name, products_table.c.description, products_table.c.price,
+    products_table.c.sku, products_table.c.category_id, products_table.c.created_at, products_table.c.updated_at
+)
+INVENTORY_COLUMNS = (
+    inventory_table.c.id, inventory_table.c.product_id, inventory_table.c.quantity,
+    inventory_table.c.low_stock_threshold, inventory_table.c.last_restocked, inventory_table.c.updated_at
+)
+SALE_COLUMNS = (
+    sales_table.c.id, sales_table.c.order_id, sales_table.c.total_amount,
+    sales_table.c.transaction_date, sales_table.c.marketplace
+)
+SALE_ITEM_COLUMNS = (
+    sale_items_table.c.id, sale_items_table.c.sale_id, sale_items_table.c.product_id,
+    sale_items_table.c.quantity, sale_items_table.c.unit_price, sale_items_table.c.subtotal
+)
+
+# The per-ID lookups are the most frequent statements. They are built once with
+# bound parameters, so each call skips building a Query and reuses the compiled
+# SQL from the engine's statement cache. Primary-key lookups go through
+# Session.get instead, which answers repeats within a request from the identity map
+INVENTORY_BY_PRODUCT_ID = select(models.Inventory).where(models.Inventory.product_id == bindparam("product_id"))
+SALE_BY_ID = select(models.Sale).options(selectinload(models.Sale.items)).where(models.Sale.id == bindparam("sale_id"))
 
 
 # Category CRUD operations
 def get_category(db: Session, category_id: int):
-    return db.query(models.Category).filter(models.Category.id == category_id).first()
+    return db.get(models.Category, category_id)
 
 
 def get_category_by_name(db: Session, name: str):
@@ -28,7 +66,7 @@ def create_category(db: Session, category: schemas.CategoryCreate):
 
 # Product CRUD operations
 def get_product(db: Session, product_id: int):
-    return db.query(models.Product).filter(models.Product.id == product_id).first()
+    return db.get(models.Product, product_id)
 
 
 def get_product_by_sku(db: Session, sku: str):
@@ -36,10 +74,22 @@ def get_product_by_sku(db: Session, sku: str):
 
 
 def get_products(db: Session, skip: int = 0, limit: int = 100, category_id: Optional[int] = None):
-    query = db.query(models.Product)
+    query = select(*PRODUCT_COLUMNS)
     if category_id:
-        query = query.filter(models.Product.category_id == category_id)
-    return query.offset(skip).limit(limit).all()
+        query = query.where(products_table.c.category_id == category_id)
+    return db.execute(query.offset(skip).limit(limit)).all()
+
+
+def get_products_by_ids(db: Session, product_ids: List[int]):
+    products = db.query(models.Product).filter(models.Product.id.in_(product_ids)).all()
+    return {product.id: product for product in products}
+
+
+def get_products_with_inventory(db: Session, product_ids: List[int]):
+    rows = db.query(models.Product, models.Inventory).outerjoin(
+        models.Inventory, models.Inventory.product_id == models.Product.id
+    ).filter(models.Product.id.in_(product_ids)).all()
+    return {product.id: (product, inventory) for product, inventory in rows}
 
 
 def create_product(db: Session, product: schemas.ProductCreate):
@@ -60,13 +110,97 @@ def update_product(db: Session, product_id: int, product_data: Dict[str, Any]):
     return db_product
 
 
+def dialect_insert(db: Session, table):
+    # INSERT with the dialect's ON CONFLICT support
+    dialect_module = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect_module.insert(table)
+
+
+def upsert_products(db: Session, rows: List[Dict[str, Any]]):
+    """
+    Insert products or update them by SKU in one batch; returns (inserted, updated)
+    """
+    skus = [row["sku"] for row in rows]
+    existing = set(db.execute(select(products_table.c.sku).where(products_table.c.sku.in_(skus))).scalars())
+    
+    stmt = dialect_insert(db, products_table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[products_table.c.sku],
+        set_={
+            "name": stmt.excluded.name,
+            "description": stmt.excluded.description,
+            "price": stmt.excluded.price,
+            "category_id": stmt.excluded.category_id,
+            "updated_at": func.now(),
+        }
+    )
+    db.execute(stmt, rows)
+    return len(rows) - len(existing), len(existing)
+
+
+def create_missing_inventory(db: Session, stock: Dict[str, Dict[str, int]]):
+    """
+    Create inventory for the products of stock (SKU -> quantity and low_stock_threshold) that have
+    none yet; returns how many were created
+    """
+    product_ids = dict(db.execute(
+        select(products_table.c.sku, products_table.c.id).where(products_table.c.sku.in_(list(stock)))
+    ).all())
+    stocked = set(db.execute(
+        select(inventory_table.c.product_id).where(inventory_table.c.product_id.in_(product_ids.values()))
+    ).scalars())
+    inventory_rows = [
+        {"product_id": product_ids[sku], "last_restocked": datetime.now(), **levels}
+        for sku, levels in stock.items() if product_ids[sku] not in stocked
+    ]
+    if inventory_rows:
+        # A concurrent import may have created some in the meantime
+        stmt = dialect_insert(db, inventory_table).on_conflict_do_nothing(index_elements=[inventory_table.c.product_id])
+        db.execute(stmt, inventory_rows)
+    return len(inventory_rows)
+
+
 # Inventory CRUD operations
+# Inventory is looked up by product_id, which the identity map does not index
+# (and it only holds weak references). Sessions live for one request, so the
+# rows a session has loaded are kept in session.info by product_id and a
+# repeated lookup in the same request costs no query
+INVENTORY_CACHE = "inventory_by_product"
+
+
+def remember_inventory(db: Session, inventory: models.Inventory):
+    db.info.setdefault(INVENTORY_CACHE, {})[inventory.product_id] = inventory
+    return inventory
+
+
+def cached_inventory(db: Session, product_id: int):
+    db_inventory = db.info.get(INVENTORY_CACHE, {}).get(product_id)
+    # Rows expunged from the session, e.g. by a rollback, are loaded again
+    return db_inventory if db_inventory is not None and db_inventory in db else None
+
+
 def get_inventory(db: Session, product_id: int):
-    return db.query(models.Inventory).filter(models.Inventory.product_id == product_id).first()
+    db_inventory = cached_inventory(db, product_id)
+    if db_inventory is not None:
+        return db_inventory
+    db_inventory = db.execute(INVENTORY_BY_PRODUCT_ID, {"product_id": product_id}).scalar()
+    return remember_inventory(db, db_inventory) if db_inventory is not None else None
+
+
+def get_inventory_by_product_ids(db: Session, product_ids: List[int]):
+    inventories = db.query(models.Inventory).filter(models.Inventory.product_id.in_(product_ids)).all()
+    return {inventory.product_id: remember_inventory(db, inventory) for inventory in inventories}
+
+
+def preload_inventory(db: Session, product_ids: List[int]):
+    # One query for the stock of every product the session has not looked up yet
+    missing = [product_id for product_id in set(product_ids) if cached_inventory(db, product_id) is None]
+    if missing:
+        get_inventory_by_product_ids(db, missing)
 
 
 def get_all_inventory(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Inventory).offset(skip).limit(limit).all()
+    return db.execute(select(*INVENTORY_COLUMNS).offset(skip).limit(limit)).all()
 
 
 def create_inventory(db: Session, inventory: schemas.InventoryCreate):
@@ -74,11 +208,11 @@ def create_inventory(db: Session, inventory: schemas.InventoryCreate):
     db.add(db_inventory)
     db.commit()
     db.refresh(db_inventory)
-    return db_inventory
+    return remember_inventory(db, db_inventory)
 
 
 def update_inventory(db: Session, product_id: int, inventory_data: schemas.InventoryUpdate):
-    db_inventory = db.query(models.Inventory).filter(models.Inventory.product_id == product_id).first()
+    db_inventory = get_inventory(db, product_id)
     
     if db_inventory:
         update_data = inventory_data.dict(exclude_unset=True)
@@ -121,6 +255,9 @@ def get_low_stock_products(db: Session):
 
 # Sale CRUD operations
 def create_sale(db: Session, sale: schemas.SaleCreate):
+    if sharding.shards is not None:
+        return create_sharded_sale(db, sale)
+
     # Create sale record
     db_sale = models.Sale(
         order_id=sale.order_id,
@@ -134,14 +271,61 @@ def create_sale(db: Session, sale: schemas.SaleCreate):
     for item in sale.items:
         db_sale_item = models.SaleItem(
             sale_id=db_sale.id,
+            transaction_date=db_sale.transaction_date,
             product_id=item.product_id,
             quantity=item.quantity,
             unit_price=item.unit_price,
             subtotal=item.subtotal
         )
         db.add(db_sale_item)
-        
-        # Update inventory
+    subtract_sale_stock(db, sale)
+    
+    db.commit()
+    db.refresh(db_sale)
+    return db_sale
+
+
+def create_sharded_sale(db: Session, sale: schemas.SaleCreate, transaction_date: Optional[datetime] = None):
+    shards = sharding.shards
+    index = shards.index_for_order(sale.order_id)
+    shard_db = shards.sessions[index]()
+    try:
+        # The date is set here so that the sale and its items get the same one
+        transaction_date = transaction_date or datetime.now(timezone.utc)
+        db_sale = models.Sale(
+            id=shards.next_sale_id(shard_db, index),
+            order_id=sale.order_id,
+            total_amount=sale.total_amount,
+            marketplace=sale.marketplace,
+            transaction_date=transaction_date
+        )
+        db_sale.items = [
+            models.SaleItem(
+                product_id=item.product_id,
+                quantity=item.quantity,
+                unit_price=item.unit_price,
+                subtotal=item.subtotal,
+                transaction_date=transaction_date
+            )
+            for item in sale.items
+        ]
+        shard_db.add(db_sale)
+        shard_db.flush()
+        sale_id = db_sale.id
+        shard_db.commit()
+
+        # Stock lives on the primary and is only taken once the sale is stored
+        subtract_sale_stock(db, sale)
+        db.commit()
+        return shard_db.execute(SALE_BY_ID, {"sale_id": sale_id}).scalar()
+    finally:
+        shard_db.close()
+
+
+def subtract_sale_stock(db: Session, sale: schemas.SaleCreate):
+    # Take each item off its product's stock and log the change
+    preload_inventory(db, [item.product_id for item in sale.items])
+    for item in sale.items:
         db_inventory = get_inventory(db, item.product_id)
         if db_inventory:
             new_quantity = max(0, db_inventory.quantity - item.quantity)
@@ -155,57 +339,283 @@ def create_sale(db: Session, sale: schemas.SaleCreate):
             
             db_inventory.quantity = new_quantity
             db.add(db_inventory)
-    
-    db.commit()
-    db.refresh(db_sale)
-    return db_sale
+
+
+def sale_refusal(db: Session, sale: schemas.SaleCreate, taken_order_ids: set) -> Optional[str]:
+    # The stock checks POST /sales/ makes, for sales the ingest buffer stores after answering
+    if sale.order_id in taken_order_ids:
+        return "Order ID already exists"
+    for item in sale.items:
+        db_inventory = get_inventory(db, item.product_id)
+        if db_inventory is None:
+            return f"Inventory for product {item.product_id} not found"
+        if db_inventory.quantity < item.quantity:
+            return f"Not enough inventory for product {item.product_id}"
+    return None
+
+
+def create_sales_batch(db: Session, sales: List[Tuple[schemas.SaleCreate, datetime]]):
+    """
+    Add sales accepted by the ingest buffer, each with the date it was accepted,
+    and their stock changes to the session without committing. Returns
+    (sale, None) for a sale stored and (None, reason) for one refused, in order.
+    """
+    order_ids = [sale.order_id for sale, _ in sales]
+    taken = set(db.execute(select(models.Sale.order_id).where(models.Sale.order_id.in_(order_ids))).scalars())
+    preload_inventory(db, [item.product_id for sale, _ in sales for item in sale.items])
+
+    outcomes = []
+    for sale, transaction_date in sales:
+        refusal = sale_refusal(db, sale, taken)
+        if refusal is not None:
+            outcomes.append((None, refusal))
+            continue
+        taken.add(sale.order_id)
+        db_sale = models.Sale(
+            order_id=sale.order_id,
+            total_amount=sale.total_amount,
+            marketplace=sale.marketplace,
+            transaction_date=transaction_date
+        )
+        db_sale.items = [
+            models.SaleItem(
+                product_id=item.product_id,
+                quantity=item.quantity,
+                unit_price=item.unit_price,
+                subtotal=item.subtotal,
+                transaction_date=transaction_date
+            )
+            for item in sale.items
+        ]
+        db.add(db_sale)
+        subtract_sale_stock(db, sale)
+        outcomes.append((db_sale, None))
+    db.flush()
+    return outcomes
+
+
+def get_stocked_product_ids(db: Session) -> set:
+    return set(db.execute(select(models.Inventory.product_id)).scalars())
 
 
 def get_sale(db: Session, sale_id: int):
-    return db.query(models.Sale).filter(models.Sale.id == sale_id).first()
+    if sharding.shards is not None:
+        shards = sharding.shards
+        return shards.run(
+            shards.index_for_sale(sale_id), lambda shard_db: shard_db.execute(SALE_BY_ID, {"sale_id": sale_id}).scalar()
+        )
+    return db.execute(SALE_BY_ID, {"sale_id": sale_id}).scalar()
 
 
-def get_sales(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Sale).order_by(desc(models.Sale.transaction_date)).offset(skip).limit(limit).all()
+def get_sale_items_by_sale_ids(db: Session, sale_ids: List[int]):
+    items_by_sale = {sale_id: [] for sale_id in sale_ids}
+    if sale_ids:
+        rows = db.execute(
+            select(*SALE_ITEM_COLUMNS).where(sale_items_table.c.sale_id.in_(sale_ids)).order_by(sale_items_table.c.id)
+        )
+        for row in rows:
+            items_by_sale[row.sale_id].append(row)
+    return items_by_sale
+
+
+def order_id_prefix_condition(dialect: str, prefix: str):
+    if dialect == "sqlite":
+        # SQLite only searches an index for a case-sensitive prefix match, which is GLOB
+        return sales_table.c.order_id.op("GLOB")(re.sub(r"([*?\[])", r"[\1]", prefix) + "*")
+    # The pattern is built here rather than in SQL, so the planner sees a constant prefix
+    # and can use ix_sales_order_id_pattern
+    return sales_table.c.order_id.like(re.sub(r"([%_\\])", r"\\\1", prefix) + "%", escape="\\")
+
+
+def sales_filter_conditions(db: Session, filters: schemas.SalesFilter):
+    start = datetime.combine(filters.start_date, datetime.min.time()) if filters.start_date else None
+    end = datetime.combine(filters.end_date, datetime.max.time()) if filters.end_date else None
+    conditions = []
+    if filters.marketplace is not None:
+        conditions.append(sales_table.c.marketplace == filters.marketplace)
+    if start is not None:
+        conditions.append(sales_table.c.transaction_date >= start)
+    if end is not None:
+        conditions.append(sales_table.c.transaction_date <= end)
+    if filters.min_total is not None:
+        conditions.append(sales_table.c.total_amount >= filters.min_total)
+    if filters.max_total is not None:
+        conditions.append(sales_table.c.total_amount <= filters.max_total)
+    if filters.order_id_prefix:
+        conditions.append(order_id_prefix_condition(db.get_bind().dialect.name, filters.order_id_prefix))
+    if filters.product_id is not None:
+        # Read from ix_sale_items_product_id_date_sale_id, limited to the same dates so
+        # only those months of sale_items are scanned
+        items = select(sale_items_table.c.sale_id).where(sale_items_table.c.product_id == filters.product_id)
+        if start is not None:
+            items = items.where(sale_items_table.c.transaction_date >= start)
+        if end is not None:
+            items = items.where(sale_items_table.c.transaction_date <= end)
+        conditions.append(sales_table.c.id.in_(items))
+    return conditions
+
+
+def get_sales(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    filters: Optional[schemas.SalesFilter] = None,
+    cursor: Optional[int] = None,
+):
+    """
+    Newest sales first, optionally filtered. ``cursor`` is the ID of the last
+    sale of the previous page: the page continues after it in (transaction_date,
+    id) order, so deep pages are read from the index instead of skipping rows.
+    """
+    if sharding.shards is not None:
+        return get_sharded_sales(skip, limit, filters, cursor)
+    cursor_date = None
+    if cursor is not None:
+        cursor_date = select(sales_table.c.transaction_date).where(sales_table.c.id == cursor).scalar_subquery()
+    sales = db.execute(sales_page_statement(db, filters, cursor, cursor_date).offset(skip).limit(limit)).all()
+    return sale_records(db, sales)
+
+
+def sales_page_statement(db: Session, filters: Optional[schemas.SalesFilter], cursor: Optional[int], cursor_date):
+    statement = select(*SALE_COLUMNS)
+    if filters is not None:
+        statement = statement.where(*sales_filter_conditions(db, filters))
+    if cursor is not None:
+        statement = statement.where(
+            tuple_(sales_table.c.transaction_date, sales_table.c.id) < tuple_(cursor_date, literal(cursor))
+        )
+    return statement.order_by(desc(sales_table.c.transaction_date), desc(sales_table.c.id))
+
+
+def sale_records(db: Session, sales):
+    # Load the items of the whole page in one extra SELECT ... IN instead of one per sale
+    items_by_sale = get_sale_items_by_sale_ids(db, [sale.id for sale in sales])
+    return [records.SaleRecord(*sale, items=items_by_sale[sale.id]) for sale in sales]
+
+
+def get_sharded_sales(skip: int, limit: int, filters: Optional[schemas.SalesFilter], cursor: Optional[int]):
+    shards = sharding.shards
+    cursor_date = None
+    if cursor is not None:
+        # Only the cursor's own shard knows its date; the others compare against the value
+        cursor_date = shards.run(
+            shards.index_for_sale(cursor),
+            lambda shard_db: shard_db.execute(
+                select(sales_table.c.transaction_date).where(sales_table.c.id == cursor)
+            ).scalar()
+        )
+        if cursor_date is None:
+            return []
+
+    def first_sales(shard_db):
+        statement = sales_page_statement(shard_db, filters, cursor, cursor_date).limit(skip + limit)
+        return sale_records(shard_db, shard_db.execute(statement).all())
+
+    # Every shard returns its first skip + limit sales and the page is cut from their merge
+    merged = heapq.merge(*shards.scatter(first_sales), key=lambda sale: (sale.transaction_date, sale.id), reverse=True)
+    return list(itertools.islice(merged, skip, skip + limit))
 
 
 # Analytics operations
+# With sharded storage these run on every shard and merge the results (see sharding.py)
+@sharding.scatter_gather(sharding.concat)
 def get_sales_by_date_range(db: Session, start_date: datetime, end_date: datetime):
-    return db.query(models.Sale).filter(
+    return db.query(models.Sale).options(
+        selectinload(models.Sale.items)
+    ).filter(
         models.Sale.transaction_date >= start_date,
         models.Sale.transaction_date <= end_date
     ).all()
 
 
-def get_product_sales(db: Session, query: schemas.ProductSalesQuery):
+def product_sales_statement(query: schemas.ProductSalesQuery):
     start_date = datetime.combine(query.start_date, datetime.min.time())
     end_date = datetime.combine(query.end_date, datetime.max.time())
     
-    sale_items_query = db.query(
-        models.SaleItem,
-        models.Sale.transaction_date,
-        models.Product.name.label("product_name"),
-        models.Category.name.label("category_name")
-    ).join(
-        models.Sale, models.SaleItem.sale_id == models.Sale.id
+    sale_items_query = select(
+        sale_items_table.c.product_id,
+        products_table.c.name.label("product_name"),
+        categories_table.c.name.label("category_name"),
+        sale_items_table.c.quantity,
+        sale_items_table.c.unit_price,
+        sale_items_table.c.subtotal,
+        sale_items_table.c.transaction_date
+    ).join_from(
+        sale_items_table, products_table, sale_items_table.c.product_id == products_table.c.id
     ).join(
-        models.Product, models.SaleItem.product_id == models.Product.id
-    ).join(
-        models.Category, models.Product.category_id == models.Category.id
-    ).filter(
-        models.Sale.transaction_date >= start_date,
-        models.Sale.transaction_date <= end_date
+        categories_table, products_table.c.category_id == categories_table.c.id
+    ).where(
+        # The items carry their sale's date, so sales is not joined and only their months are scanned
+        sale_items_table.c.transaction_date >= start_date,
+        sale_items_table.c.transaction_date <= end_date
     )
     
     if query.product_id:
-        sale_items_query = sale_items_query.filter(models.SaleItem.product_id == query.product_id)
+        sale_items_query = sale_items_query.where(sale_items_table.c.product_id == query.product_id)
     
     if query.category_id:
-        sale_items_query = sale_items_query.filter(models.Product.category_id == query.category_id)
+        sale_items_query = sale_items_query.where(products_table.c.category_id == query.category_id)
     
-    return sale_items_query.all()
+    return sale_items_query
 
 
+def get_product_sales(db: Session, query: schemas.ProductSalesQuery):
+    if sharding.shards is not None:
+        return get_sharded_product_sales(db, query)
+    return db.execute(product_sales_statement(query)).all()
+
+
+def estimate_product_sales_rows(db: Session, query: schemas.ProductSalesQuery) -> int:
+    if sharding.shards is None:
+        return estimate_rows(db, product_sales_statement(query))
+    # Every shard estimates its own items
+    items = sharded_product_sales_statement(db, query)
+    return sum(sharding.shards.scatter(lambda shard_db: estimate_rows(shard_db, items), timeout_ms=statement_timeout(db)))
+
+
+def sharded_product_sales_statement(db: Session, query: schemas.ProductSalesQuery):
+    # The shards only hold the items; a category is resolved to its products on the primary
+    items = select(
+        sale_items_table.c.product_id,
+        sale_items_table.c.quantity,
+        sale_items_table.c.unit_price,
+        sale_items_table.c.subtotal,
+        sale_items_table.c.transaction_date
+    ).where(
+        sale_items_table.c.transaction_date >= datetime.combine(query.start_date, datetime.min.time()),
+        sale_items_table.c.transaction_date <= datetime.combine(query.end_date, datetime.max.time())
+    )
+    if query.product_id:
+        items = items.where(sale_items_table.c.product_id == query.product_id)
+    if query.category_id:
+        category_products = select(products_table.c.id).where(products_table.c.category_id == query.category_id)
+        items = items.where(sale_items_table.c.product_id.in_(db.execute(category_products).scalars().all()))
+    return items
+
+
+def get_sharded_product_sales(db: Session, query: schemas.ProductSalesQuery):
+    # Product and category names come from the catalog on the primary
+    items = sharded_product_sales_statement(db, query)
+    rows = sharding.concat(sharding.shards.scatter(lambda shard_db: shard_db.execute(items).all(), timeout_ms=statement_timeout(db)))
+
+    names = {
+        row.id: row for row in db.execute(
+            select(products_table.c.id, products_table.c.name, categories_table.c.name.label("category_name"))
+            .join(categories_table, products_table.c.category_id == categories_table.c.id)
+            .where(products_table.c.id.in_({row.product_id for row in rows}))
+        )
+    }
+    # Items of products missing from the catalog are left out, as the join does without sharding
+    return [
+        records.ProductSale(
+            row.product_id, names[row.product_id].name, names[row.product_id].category_name,
+            row.quantity, row.unit_price, row.subtotal, row.transaction_date
+        )
+        for row in rows if row.product_id in names
+    ]
+
+
+@sharding.scatter_gather(sharding.add_up)
 def get_sales_summary(db: Session, start_date: datetime, end_date: datetime):
     sales_data = db.query(
         func.sum(models.Sale.total_amount).label("total_sales"),
@@ -217,11 +627,9 @@ def get_sales_summary(db: Session, start_date: datetime, end_date: datetime):
     
     items_count = db.query(
         func.sum(models.SaleItem.quantity).label("items_sold")
-    ).join(
-        models.Sale, models.SaleItem.sale_id == models.Sale.id
     ).filter(
-        models.Sale.transaction_date >= start_date,
-        models.Sale.transaction_date <= end_date
+        models.SaleItem.transaction_date >= start_date,
+        models.SaleItem.transaction_date <= end_date
     ).scalar()
     
     if sales_data:
@@ -233,6 +641,7 @@ def get_sales_summary(db: Session, start_date: datetime, end_date: datetime):
     return {"total_sales": 0, "total_orders": 0, "items_sold": 0}
 
 
+@sharding.scatter_gather(sum)
 def get_revenue_by_period(db: Session, period: str, date: datetime):
     """
     Get revenue for a specific period (day, week, month, year)
@@ -307,3 +716,30 @@ def get_inventory_history(db: Session, product_id: int, limit: int = 10):
     return db.query(models.InventoryLog).filter(
         models.InventoryLog.product_id == product_id
     ).order_by(desc(models.InventoryLog.timestamp)).limit(limit).all()
+
+
+# Change feed
+CHANGE_FEED_TABLES = {
+    "sales": sales_table,
+    "inventory": inventory_table,
+    "inventory_logs": models.InventoryLog.__table__,
+    "products": products_table,
+}
+
+
+def get_changes(db: Session, feed: str, since: int, limit: int, settle_seconds: float = 0):
+    """
+    Rows of a change feed table written after the since cursor, in change_seq order, as dicts;
+    sales come with their items
+    """
+    table = CHANGE_FEED_TABLES[feed]
+    query = select(table).where(table.c.change_seq > since).order_by(table.c.change_seq).limit(limit)
+    if settle_seconds and db.get_bind().dialect.name == "postgresql":
+        query = query.where(table.c.changed_at <= func.now() - timedelta(seconds=settle_seconds))
+    rows = [row._asdict() for row in db.execute(query)]
+
+    if feed == "sales":
+        items_by_sale = get_sale_items_by_sale_ids(db, [row["id"] for row in rows])
+        for row in rows:
+            row["items"] = [item._asdict() for item in items_by_sale[row["id"]]]
+    return rows
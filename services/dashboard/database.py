@@ -1,9 +1,14 @@
 from sqlalchemy.dialects.postgresql.base import PGDialect
 PGDialect._get_server_version_info = lambda *args: (9, 2)
-from sqlalchemy import create_engine
+import itertools
+import threading
+import time
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from config import settings
+from metrics import DecayingAverage
 import os
 from dotenv import load_dotenv
 
@@ -13,7 +18,56 @@ load_dotenv()
 # Get database URL from settings or environment variable
 SQLALCHEMY_DATABASE_URL = settings.database_url
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+def pool_sizing(max_connections, reserved_connections, workers):
+    """
+    Split the Postgres connection budget between worker processes so that
+    every worker's pool_size + max_overflow together stays within max_connections
+    """
+    per_worker = max(1, (max_connections - reserved_connections) // max(1, workers))
+    max_overflow = per_worker // 4
+    return per_worker - max_overflow, max_overflow
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that tracks how long checkouts wait for a free connection, for admission control
+    """
+
+    def __init__(self, creator, pool_size=5, max_overflow=10, **kw):
+        super().__init__(creator, pool_size=pool_size, max_overflow=max_overflow, **kw)
+        self.capacity = pool_size + max_overflow if max_overflow >= 0 else None
+        self.wait_time = DecayingAverage(half_life=5.0)
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.wait_time.observe(time.perf_counter() - started_at)
+
+
+def engine_options(url):
+    if url.startswith("sqlite"):
+        return {}
+    pool_size, max_overflow = pool_sizing(
+        settings.db_max_connections, settings.db_reserved_connections, settings.web_concurrency
+    )
+    options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_pre_ping": True,
+    }
+    if url.startswith("postgresql+psycopg:"):
+        # psycopg 3 prepares a statement on the server after it has run this many times on a connection
+        threshold = settings.db_prepare_threshold
+        options["connect_args"] = {"prepare_threshold": threshold if threshold >= 0 else None}
+    return options
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -25,3 +79,139 @@ def get_db():
         db.close()
 
 
+class ReplicaSet:
+    """
+    Round-robin over replica engines, skipping replicas that are down or lag
+    too far behind. Falls back to the primary when no replica is usable.
+    """
+
+    def __init__(self, primary, replicas, max_lag_seconds=5.0, check_interval=5.0, lag_probe=None):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.lag_probe = lag_probe or replica_lag
+        self._cycle = itertools.cycle(self.replicas)
+        self._health = {}
+        self._lock = threading.Lock()
+
+    def is_healthy(self, replica):
+        now = time.monotonic()
+        checked_at, healthy = self._health.get(replica, (None, False))
+        if checked_at is not None and now - checked_at < self.check_interval:
+            return healthy
+
+        try:
+            healthy = self.lag_probe(replica) <= self.max_lag_seconds
+        except Exception:
+            healthy = False
+        self._health[replica] = (now, healthy)
+        return healthy
+
+    def choose(self):
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = next(self._cycle)
+                if self.is_healthy(replica):
+                    return replica
+        return self.primary
+
+
+def replica_lag(replica):
+    """
+    Replication lag in seconds; a replica that answers but has no lag notion reports 0
+    """
+    with replica.connect() as conn:
+        if replica.dialect.name == "postgresql":
+            lag = conn.execute(text(
+                "SELECT CASE WHEN pg_is_in_recovery() "
+                "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+                "ELSE 0 END"
+            )).scalar()
+            return float(lag)
+        conn.execute(text("SELECT 1"))
+        return 0.0
+
+
+class RoutingSession(Session):
+    """
+    Session that reads from a replica until it writes. Once anything is
+    flushed or a DML statement runs, the session sticks to the primary so
+    reads that follow a write in the same request see that write.
+    """
+
+    def __init__(self, replica_set=None, **kwargs):
+        super().__init__(**kwargs)
+        self.replica_set = replica_set
+        self.replica_bind = None
+        self.use_primary = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.replica_set is None or self.use_primary or self._flushing or getattr(clause, "is_dml", False):
+            self.use_primary = True
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if self.replica_bind is None:
+            self.replica_bind = self.replica_set.choose()
+        return self.replica_bind
+
+
+replica_set = None
+if settings.replica_urls:
+    replica_set = ReplicaSet(
+        engine,
+        [create_engine(url, **engine_options(url)) for url in settings.replica_urls],
+        max_lag_seconds=settings.replica_max_lag_seconds,
+        check_interval=settings.replica_health_check_interval,
+    )
+# Shards holding the sales tables when sharded storage is on (see sharding.py)
+shard_engines = [create_engine(url, **engine_options(url)) for url in settings.shard_urls]
+
+ReadSessionLocal = sessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False, bind=engine, replica_set=replica_set
+)
+
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def all_engines():
+    engines = [engine]
+    if replica_set is not None:
+        engines.extend(replica_set.replicas)
+    engines.extend(shard_engines)
+    return engines
+
+
+def pool_saturation():
+    """
+    Highest (utilization, recent checkout wait in seconds) over the primary, replica and shard pools
+    """
+    utilization, wait_time = 0.0, 0.0
+    for db_engine in all_engines():
+        pool = db_engine.pool
+        if isinstance(pool, TimedQueuePool):
+            if pool.capacity:
+                utilization = max(utilization, pool.checkedout() / pool.capacity)
+            wait_time = max(wait_time, pool.wait_time.value())
+    return utilization, wait_time
+
+
+def reset_engine_pools():
+    """
+    Drop pooled connections inherited from a parent process without closing
+    them, so a forked worker opens its own connections (see gunicorn.conf.py)
+    """
+    for db_engine in all_engines():
+        db_engine.dispose(close=False)
+
+
+def dispose_engines():
+    for db_engine in all_engines():
+        db_engine.dispose()
+
+
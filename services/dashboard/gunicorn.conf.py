@@ -0,0 +1,37 @@
+"""
+Production server profile: N uvicorn workers managed by gunicorn.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The app is imported once in the master (preload_app) and then forked. Each
+worker drops the pooled connections it inherited, so no database connection is
+ever shared between processes. WEB_CONCURRENCY is also read by config.Settings,
+so the connection pool of every worker is sized to keep the total within
+DB_MAX_CONNECTIONS.
+"""
+import os
+
+from config import settings
+
+bind = f"0.0.0.0:{os.getenv('PORT', '6061')}"
+workers = settings.web_concurrency
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# On SIGTERM workers stop accepting connections and get this long to finish in-flight requests
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    from database import reset_engine_pools
+    reset_engine_pools()
+
+
+def worker_exit(server, worker):
+    from database import dispose_engines
+    dispose_engines()
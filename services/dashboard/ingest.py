@@ -0,0 +1,419 @@
+"""
+Durable ingest buffer for ``POST /sales/``.
+
+With ``settings.sales_ingest_dir`` set, a sale that passes validation against
+a cached copy of the catalog is appended to this process's log file in that
+directory and answered with ``202`` and a tracking ID once the log has been
+fsynced. Requests that arrive while an fsync is running are written behind it
+and share the next one, so a burst of orders costs a few fsyncs instead of a
+database commit each. A background committer drains the log into the
+database in batches of up to ``settings.sales_ingest_batch_size``, one
+transaction per batch, and stores each sale's outcome (committed, or failed
+with a reason such as short stock) in ``sale_ingest_results`` in the same
+transaction. ``GET /sales/ingest/{tracking_id}`` reports it.
+
+Each process owns its log through an exclusive ``flock``. At startup, and
+every ``ORPHAN_CHECK_SECONDS`` after, the committer replays the pending
+entries of logs no process holds, e.g. left by a crash. Entries whose
+tracking ID already has a result are skipped, so a replay never stores a
+sale twice.
+
+Log lines are JSON: ``{"id", "accepted_at", "sale"}`` for an accepted sale
+and ``{"done": [ids]}`` once those entries are committed. Done markers are
+not fsynced; losing one only means a replay finds the results and skips.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError, SQLAlchemyError
+
+import crud, models, schemas, sharding
+from config import settings
+from database import SessionLocal
+
+logger = logging.getLogger("ingest")
+
+LOG_SUFFIX = ".log"
+# A log is replaced by a new one once it is this large, and removed when its last entry is committed
+MAX_LOG_BYTES = 64 * 1024 * 1024
+ORPHAN_CHECK_SECONDS = 60.0
+RETRY_SECONDS = 1.0
+
+
+class IngestUnavailable(Exception):
+    pass
+
+
+class LogRetired(Exception):
+    pass
+
+
+def is_transient(exc: Exception) -> bool:
+    # Errors that say nothing about the sales being stored, e.g. a lost connection or a locked database
+    return isinstance(exc, OperationalError) or (isinstance(exc, DBAPIError) and exc.connection_invalidated)
+
+
+class Entry(NamedTuple):
+    tracking_id: str
+    accepted_at: datetime
+    sale: schemas.SaleCreate
+    # The log the entry was appended to; None for entries replayed from an orphaned log
+    log: Optional["SaleLog"] = None
+
+
+def read_log(path: str) -> List[Entry]:
+    """
+    The entries of a log file that have no done marker, in the order they were appended
+    """
+    entries: Dict[str, Entry] = {}
+    done = set()
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line torn by a crash mid-append; it was never acknowledged
+                continue
+            if "done" in record:
+                done.update(record["done"])
+            else:
+                entries[record["id"]] = Entry(
+                    record["id"], datetime.fromisoformat(record["accepted_at"]), schemas.SaleCreate(**record["sale"])
+                )
+    return [entry for tracking_id, entry in entries.items() if tracking_id not in done]
+
+
+class SaleLog:
+    """
+    Append-only log file owned by this process, with fsyncs shared between concurrent appends
+    """
+
+    def __init__(self, directory: str):
+        self.name = uuid.uuid4().hex[:16]
+        self.path = os.path.join(directory, self.name + LOG_SUFFIX)
+        self.size = 0
+        self.retired = False
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._synced = 0
+        self._syncing = False
+        # Entries appended and not yet marked done
+        self._outstanding = 0
+
+    def append(self, sale: schemas.SaleCreate) -> Entry:
+        """
+        Write a sale and return its entry once it is on disk
+        """
+        with self._cond:
+            if self.retired:
+                raise LogRetired()
+            self._seq += 1
+            seq = self._seq
+            entry = Entry(f"{self.name}-{seq}", datetime.now(timezone.utc), sale, self)
+            self._write({"id": entry.tracking_id, "accepted_at": entry.accepted_at.isoformat(), "sale": sale.model_dump(mode="json")})
+            self._outstanding += 1
+            while self._synced < seq:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                # Sync everything written so far, including the entries of appends waiting on this one
+                self._syncing, target = True, self._seq
+                self._cond.release()
+                try:
+                    os.fsync(self._fd)
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self._cond.notify_all()
+                self._synced = max(self._synced, target)
+        return entry
+
+    def mark_done(self, tracking_ids: List[str]):
+        with self._cond:
+            self._write({"done": tracking_ids})
+            self._outstanding -= len(tracking_ids)
+            if self.retired and self._outstanding == 0:
+                self._remove()
+
+    def retire(self):
+        # No more appends; the file goes once its last entry is committed
+        with self._cond:
+            self.retired = True
+            if self._outstanding == 0:
+                self._remove()
+
+    def close(self):
+        # Keeps the file if it has uncommitted entries, for the next process to replay
+        with self._cond:
+            self.retired = True
+            if self._outstanding == 0:
+                self._remove()
+            elif self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def _write(self, record: dict):
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        os.write(self._fd, line)
+        self.size += len(line)
+
+    def _remove(self):
+        if self._fd is None:
+            return
+        # Unlinked before the lock is released, so no other process can pick it up as an orphan
+        os.unlink(self.path)
+        os.close(self._fd)
+        self._fd = None
+
+
+class CatalogCache:
+    """
+    IDs of the products that have inventory, reloaded every ``settings.sales_ingest_catalog_ttl_seconds``.
+    A stale copy is used while the database is unreachable.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self._product_ids: Optional[set] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def stocked_product_ids(self) -> set:
+        with self._lock:
+            if self._product_ids is None or time.monotonic() - self._loaded_at > settings.sales_ingest_catalog_ttl_seconds:
+                db = self.session_factory()
+                try:
+                    self._product_ids = crud.get_stocked_product_ids(db)
+                    self._loaded_at = time.monotonic()
+                except SQLAlchemyError:
+                    if self._product_ids is None:
+                        raise IngestUnavailable("The product catalog could not be loaded")
+                    logger.warning("Could not refresh the product catalog, using a copy from %.0fs ago",
+                                   time.monotonic() - self._loaded_at, exc_info=True)
+                finally:
+                    db.close()
+            return self._product_ids
+
+
+class SalesIngest:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.session_factory = SessionLocal
+        self.catalog = CatalogCache(lambda: self.session_factory())
+        self.log: Optional[SaleLog] = None
+        self._pending = deque()
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.log = SaleLog(self.directory)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="sales-ingest", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        # Commit what has been accepted if the database allows; anything left is replayed by the next process
+        self.wait_idle(timeout)
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.log is not None:
+            self.log.close()
+
+    def submit(self, sale: schemas.SaleCreate) -> str:
+        while True:
+            try:
+                entry = self.log.append(sale)
+                break
+            except LogRetired:
+                # The committer replaced the log between reading self.log and appending
+                continue
+        with self._cond:
+            self._pending.append(entry)
+            self._cond.notify_all()
+        return entry.tracking_id
+
+    def is_pending(self, tracking_id: str) -> bool:
+        # Accepted and not committed yet: its log, this process's or another's, has not been removed
+        name = tracking_id.rsplit("-", 1)[0]
+        return name.isalnum() and os.path.exists(os.path.join(self.directory, name + LOG_SUFFIX))
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+
+    def _next_batch(self) -> List[Entry]:
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(RETRY_SECONDS)
+            batch = [self._pending.popleft() for _ in range(min(len(self._pending), settings.sales_ingest_batch_size))]
+            self._in_flight = len(batch)
+            return batch
+
+    def _finish(self, batch: List[Entry], committed: bool):
+        with self._cond:
+            if not committed:
+                self._pending.extendleft(reversed(batch))
+            self._in_flight = 0
+            self._cond.notify_all()
+
+    def _loop(self):
+        next_maintenance = 0.0
+        while not self._stop.is_set():
+            if time.monotonic() >= next_maintenance:
+                next_maintenance = time.monotonic() + ORPHAN_CHECK_SECONDS
+                try:
+                    self.replay_orphans()
+                    self._expire_results()
+                except Exception:
+                    logger.exception("Ingest log maintenance failed")
+
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self.commit(batch)
+            except Exception:
+                # commit() records entries that cannot be stored as failed, so anything raised here means
+                # the database is unreachable: keep the entries and try again
+                logger.exception("Committing %d ingested sales failed, retrying", len(batch))
+                self._finish(batch, committed=False)
+                self._stop.wait(RETRY_SECONDS)
+                continue
+            self._finish(batch, committed=True)
+            for log in {entry.log for entry in batch}:
+                log.mark_done([entry.tracking_id for entry in batch if entry.log is log])
+            if self.log.size > MAX_LOG_BYTES:
+                old_log, self.log = self.log, SaleLog(self.directory)
+                old_log.retire()
+            if len(batch) < settings.sales_ingest_batch_size:
+                # Let the next batch gather instead of committing every sale on its own
+                self._stop.wait(settings.sales_ingest_commit_interval_ms / 1000)
+
+    def commit(self, entries: List[Entry]):
+        """
+        Store the entries that have no result yet, with their results, in one transaction.
+        A batch that fails for any reason other than a transient database error is
+        split in halves until the entry at fault is found and recorded as failed.
+        """
+        db = self.session_factory()
+        try:
+            entries = self._without_results(db, entries)
+            if not entries:
+                return
+            try:
+                if sharding.shards is not None:
+                    self._commit_sharded(db, entries)
+                    return
+                outcomes = crud.create_sales_batch(db, [(entry.sale, entry.accepted_at) for entry in entries])
+                db.add_all(self._result(entry, db_sale, error) for entry, (db_sale, error) in zip(entries, outcomes))
+                db.commit()
+            except Exception as exc:
+                db.rollback()
+                if is_transient(exc):
+                    raise
+                if len(entries) > 1:
+                    half = len(entries) // 2
+                    self.commit(entries[:half])
+                    self.commit(entries[half:])
+                    return
+                if isinstance(exc, IntegrityError):
+                    # Raced with a sale stored by POST /sales/ or another process
+                    error = "Order ID already exists"
+                else:
+                    logger.exception("Ingested sale %s could not be stored", entries[0].tracking_id)
+                    error = f"Could not be stored ({type(exc).__name__})"
+                db.add(self._result(entries[0], None, error))
+                db.commit()
+        finally:
+            db.close()
+
+    def _commit_sharded(self, db, entries: List[Entry]):
+        # Each sale is committed on its own shard, as by POST /sales/, then its result on the primary
+        for entry in entries:
+            error = crud.sale_refusal(db, entry.sale, set())
+            db_sale = None
+            if error is None:
+                try:
+                    db_sale = crud.create_sharded_sale(db, entry.sale, transaction_date=entry.accepted_at)
+                except IntegrityError:
+                    db.rollback()
+                    error = "Order ID already exists"
+            db.add(self._result(entry, db_sale, error))
+            db.commit()
+
+    def _without_results(self, db, entries: List[Entry]) -> List[Entry]:
+        results = models.SaleIngestResult.__table__
+        done = set(db.execute(
+            select(results.c.tracking_id).where(results.c.tracking_id.in_([entry.tracking_id for entry in entries]))
+        ).scalars())
+        return [entry for entry in entries if entry.tracking_id not in done]
+
+    @staticmethod
+    def _result(entry: Entry, db_sale, error: Optional[str]) -> models.SaleIngestResult:
+        return models.SaleIngestResult(
+            tracking_id=entry.tracking_id,
+            order_id=entry.sale.order_id,
+            status="committed" if db_sale is not None else "failed",
+            sale_id=db_sale.id if db_sale is not None else None,
+            error=error,
+            created_at=datetime.now(),
+        )
+
+    def replay_orphans(self) -> int:
+        """
+        Commit the pending entries of logs no running process holds, then remove them
+        """
+        replayed = 0
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(LOG_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Held by a running process, this one included
+                    continue
+                entries = read_log(path)
+                for start in range(0, len(entries), settings.sales_ingest_batch_size):
+                    self.commit(entries[start:start + settings.sales_ingest_batch_size])
+                os.unlink(path)
+                replayed += len(entries)
+                logger.info("Replayed %d pending sales from %s", len(entries), name)
+            finally:
+                os.close(fd)
+        return replayed
+
+    def _expire_results(self):
+        results = models.SaleIngestResult.__table__
+        cutoff = datetime.now() - timedelta(seconds=settings.sales_ingest_result_ttl_seconds)
+        db = self.session_factory()
+        try:
+            db.execute(delete(results).where(results.c.created_at < cutoff))
+            db.commit()
+        finally:
+            db.close()
+
+
+sales_ingest = SalesIngest(settings.sales_ingest_dir) if settings.sales_ingest_dir else None
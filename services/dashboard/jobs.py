@@ -0,0 +1,217 @@
+"""
+Asynchronous analytics jobs for long-range reports.
+
+``POST /analytics/jobs`` stores a job in the ``analytics_jobs`` table and runs
+its query on a bounded thread pool with its own database sessions, so
+multi-year reports neither tie up a request worker nor run into the load
+balancer timeout. Date ranges are processed in chunks of
+``settings.analytics_job_chunk_days`` so the job can report progress.
+
+Because jobs live in the database, any worker can serve their status and
+results. Finished results are kept for
+``settings.analytics_job_result_ttl_seconds``; submitting the same query
+while an identical job is in flight or its result is still cached returns
+that job instead of starting a new one.
+"""
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+import crud, models, schemas
+from config import settings
+from database import ReadSessionLocal, SessionLocal
+from query_limits import set_statement_timeout
+
+logger = logging.getLogger("jobs")
+
+VALID_PERIODS = ["day", "week", "month", "year"]
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def validate_job(query: schemas.AnalyticsJobCreate):
+    if query.kind in ("product_sales", "sales_summary"):
+        if query.start_date is None or query.end_date is None:
+            raise ValueError(f"start_date and end_date are required for {query.kind} jobs")
+        if query.start_date > query.end_date:
+            raise ValueError("Start date must be before end date")
+    elif query.period not in VALID_PERIODS:
+        raise ValueError(f"Period must be one of: {', '.join(VALID_PERIODS)}")
+
+
+def job_key(query: schemas.AnalyticsJobCreate) -> str:
+    return json.dumps(jsonable_encoder(query), sort_keys=True)
+
+
+def date_chunks(start_date: date, end_date: date, days: int):
+    while start_date <= end_date:
+        chunk_end = min(end_date, start_date + timedelta(days=days - 1))
+        yield start_date, chunk_end
+        start_date = chunk_end + timedelta(days=1)
+
+
+def run_product_sales(db: Session, query: schemas.AnalyticsJobCreate, report_progress):
+    chunks = list(date_chunks(query.start_date, query.end_date, settings.analytics_job_chunk_days))
+    rows = []
+    for done, (start_date, end_date) in enumerate(chunks, 1):
+        chunk_query = schemas.ProductSalesQuery(
+            start_date=start_date, end_date=end_date, product_id=query.product_id, category_id=query.category_id
+        )
+        rows.extend(row._asdict() for row in crud.get_product_sales(db, query=chunk_query))
+        report_progress(done / len(chunks))
+    return rows
+
+
+def run_sales_summary(db: Session, query: schemas.AnalyticsJobCreate, report_progress):
+    chunks = list(date_chunks(query.start_date, query.end_date, settings.analytics_job_chunk_days))
+    totals = {"total_sales": 0, "total_orders": 0, "items_sold": 0}
+    for done, (start_date, end_date) in enumerate(chunks, 1):
+        summary = crud.get_sales_summary(
+            db,
+            start_date=datetime.combine(start_date, datetime.min.time()),
+            end_date=datetime.combine(end_date, datetime.max.time())
+        )
+        for name in totals:
+            totals[name] += summary[name]
+        report_progress(done / len(chunks))
+    return totals
+
+
+def run_revenue(db: Session, query: schemas.AnalyticsJobCreate, report_progress):
+    current_date = query.current_date or datetime.now().date()
+    return crud.get_revenue_comparison(
+        db, period=query.period, current_date=datetime.combine(current_date, datetime.min.time())
+    )
+
+
+JOB_RUNNERS = {
+    "product_sales": run_product_sales,
+    "sales_summary": run_sales_summary,
+    "revenue": run_revenue,
+}
+
+
+def job_response(job: models.AnalyticsJob, offset: int = 0, limit: int = 1000):
+    """
+    Job status, with one page of the result when it is a list
+    """
+    response = {
+        "id": job.id,
+        "kind": job.query["kind"],
+        "status": job.status,
+        "progress": job.progress,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "error": job.error,
+    }
+    if isinstance(job.result, list):
+        response["result_count"] = len(job.result)
+        response["result"] = job.result[offset:offset + limit]
+        if offset + limit < len(job.result):
+            response["next_offset"] = offset + limit
+    else:
+        response["result"] = job.result
+    return response
+
+
+class AnalyticsJobManager:
+    def __init__(self, max_workers: int):
+        # Sessions used by the job threads; tests point these at their own database
+        self.session_factory = SessionLocal
+        self.read_session_factory = ReadSessionLocal
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analytics-job")
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, db: Session, query: schemas.AnalyticsJobCreate) -> models.AnalyticsJob:
+        key = job_key(query)
+        now = datetime.now()
+        db.execute(delete(models.AnalyticsJob).where(models.AnalyticsJob.expires_at < now))
+        existing = db.execute(
+            select(models.AnalyticsJob).where(
+                models.AnalyticsJob.query_key == key,
+                models.AnalyticsJob.status != "failed",
+            ).order_by(models.AnalyticsJob.created_at.desc()).limit(1)
+        ).scalar()
+        if existing is not None:
+            db.commit()
+            return existing
+
+        with self._lock:
+            if len(self._futures) >= settings.analytics_job_max_queued:
+                db.rollback()
+                raise JobQueueFull()
+            job = models.AnalyticsJob(
+                id=uuid.uuid4().hex,
+                query_key=key,
+                query=jsonable_encoder(query),
+                status="pending",
+                progress=0.0,
+                created_at=now,
+                updated_at=now,
+                expires_at=now + timedelta(seconds=settings.analytics_job_timeout_seconds),
+            )
+            db.add(job)
+            db.commit()
+            future = self._executor.submit(self._run, job.id, query)
+            self._futures[job.id] = future
+        future.add_done_callback(lambda _, job_id=job.id: self._forget(job_id))
+        return job
+
+    def get(self, db: Session, job_id: str) -> Optional[models.AnalyticsJob]:
+        job = db.get(models.AnalyticsJob, job_id)
+        if job is None or job.expires_at < datetime.now():
+            return None
+        return job
+
+    def wait(self, job_id: str, timeout: Optional[float] = None):
+        """
+        Block until a job submitted by this process has finished
+        """
+        future = self._futures.get(job_id)
+        if future is not None:
+            wait([future], timeout=timeout)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _forget(self, job_id: str):
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+    def _update(self, db: Session, job_id: str, **values):
+        db.execute(
+            update(models.AnalyticsJob).where(models.AnalyticsJob.id == job_id).values(updated_at=datetime.now(), **values)
+        )
+        db.commit()
+
+    def _run(self, job_id: str, query: schemas.AnalyticsJobCreate):
+        db = self.session_factory()
+        read_db = self.read_session_factory()
+        set_statement_timeout(read_db, settings.analytics_job_statement_timeout_ms)
+        try:
+            self._update(db, job_id, status="running")
+            result = JOB_RUNNERS[query.kind](read_db, query, lambda progress: self._update(db, job_id, progress=progress))
+            expires_at = datetime.now() + timedelta(seconds=settings.analytics_job_result_ttl_seconds)
+            self._update(db, job_id, status="done", progress=1.0, result=jsonable_encoder(result), expires_at=expires_at)
+        except Exception as exc:
+            logger.exception("Analytics job %s failed", job_id)
+            db.rollback()
+            expires_at = datetime.now() + timedelta(seconds=settings.analytics_job_result_ttl_seconds)
+            self._update(db, job_id, status="failed", error=str(exc), expires_at=expires_at)
+        finally:
+            read_db.close()
+            db.close()
+
+
+analytics_jobs = AnalyticsJobManager(settings.analytics_job_workers)
@@ -1,10 +1,20 @@
-from fastapi import FastAPI
-from database import engine
-from models import Base
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from compression import CompressionMiddleware
+from config import settings
+from admission import AdmissionMiddleware
+from database import dispose_engines, engine, pool_saturation, shard_engines
+from jobs import analytics_jobs
+from metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from partitions import PartitionMaintenance
+from profiling import ProfilingMiddleware
+from query_limits import statement_timeout_handler
+from sqlalchemy.exc import OperationalError
 from routes import router
+import ingest
+import sharding
 
-Base.metadata.create_all(bind=engine)
+# The schema is managed by versioned migrations (python migrate.py), not at import time
 app = FastAPI(title="E-commerce Admin API", 
               description="API for e-commerce admin dashboard with sales, revenue, and inventory management")
 
@@ -19,6 +29,27 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Compress large responses, including streamed ones
+app.add_middleware(
+    CompressionMiddleware,
+    codecs=settings.compression_codecs,
+    minimum_size=settings.compression_minimum_size,
+    gzip_level=settings.gzip_level,
+    brotli_quality=settings.brotli_quality,
+)
+
+# Inside MetricsMiddleware, so a profile can report the SQL time recorded for its request
+app.add_middleware(ProfilingMiddleware)
+
+# Shed low-priority work before it queues for the threadpool and database pool
+app.add_middleware(AdmissionMiddleware, pool_saturation=pool_saturation)
+
+# Outermost, so request latency covers every other middleware
+app.add_middleware(MetricsMiddleware)
+
+# Queries cancelled by their statement timeout get a 503 with advice instead of a 500
+app.add_exception_handler(OperationalError, statement_timeout_handler)
+
 # Include the router
 app.include_router(router, prefix="/api/v1")
 
@@ -26,3 +57,39 @@ app.include_router(router, prefix="/api/v1")
 async def root():
     return {"message": "Welcome to the E-commerce Admin API"}
 
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+# Keeps next months' partitions created on a partitioned Postgres database, and on every
+# shard when sales are sharded; a no-op on SQLite
+partition_maintenance = [PartitionMaintenance(db_engine) for db_engine in [engine, *shard_engines]]
+
+
+@app.on_event("startup")
+def start_partition_maintenance():
+    for maintenance in partition_maintenance:
+        maintenance.start()
+
+
+@app.on_event("startup")
+def start_sales_ingest():
+    # Also replays what earlier processes accepted and did not commit
+    if ingest.sales_ingest is not None:
+        ingest.sales_ingest.start()
+
+
+@app.on_event("shutdown")
+def close_database_connections():
+    # Runs after in-flight requests have drained, so pooled connections close cleanly;
+    # queued analytics jobs are dropped and expire from the jobs table
+    for maintenance in partition_maintenance:
+        maintenance.stop()
+    analytics_jobs.shutdown()
+    if ingest.sales_ingest is not None:
+        ingest.sales_ingest.stop()
+    if sharding.shards is not None:
+        sharding.shards.shutdown()
+    dispose_engines()
@@ -0,0 +1,308 @@
+"""
+Prometheus metrics for request latency and SQL timing, exposed at /metrics.
+
+The collectors are deliberately small: a labelled value is a dict entry and
+a histogram observation is a bisect into a fixed bucket list. Collectors that
+are only updated from the event loop (the request metrics) skip locking, so
+the per-request overhead stays in the low microseconds.
+
+Request metrics come from ``MetricsMiddleware``. SQL metrics come from
+``before_cursor_execute``/``after_cursor_execute`` listeners on every engine.
+They are attributed to the ``crud`` function that issued the statement and
+added to the stats of the request being served.
+"""
+import bisect
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+# Modules whose functions SQL statements are attributed to
+QUERY_MODULES = {"crud"}
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labelnames: Sequence[str], labels: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), threadsafe: bool = True):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock() if threadsafe else None
+
+    def inc(self, labels: Tuple = (), amount: float = 1):
+        if self._lock is None:
+            self.values[labels] = self.values.get(labels, 0) + amount
+            return
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, labels: Tuple = ()):
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Tuple = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+    def set(self, value: float, labels: Tuple = ()):
+        self.values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (),
+        buckets=LATENCY_BUCKETS, threadsafe: bool = True
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self.values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock() if threadsafe else None
+
+    def observe(self, value: float, labels: Tuple = ()):
+        if self._lock is None:
+            self._observe(value, labels)
+            return
+        with self._lock:
+            self._observe(value, labels)
+
+    def _observe(self, value: float, labels: Tuple):
+        state = self.values.get(labels)
+        if state is None:
+            state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def get_count(self, labels: Tuple = ()):
+        state = self.values.get(labels)
+        return state[2] if state else 0
+
+    def samples(self):
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, labels, f'le="{le}"'), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), count
+
+
+class DecayingAverage:
+    """
+    Exponentially weighted moving average that also decays towards zero while no samples arrive,
+    so a burst of slow samples stops mattering once traffic has moved on
+    """
+
+    def __init__(self, half_life: float):
+        self.half_life = half_life
+        self._value = 0.0
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _decayed(self, now: float) -> float:
+        return self._value * 0.5 ** ((now - self._updated_at) / self.half_life)
+
+    def observe(self, value: float):
+        with self._lock:
+            now = time.monotonic()
+            weight = 0.5 ** ((now - self._updated_at) / self.half_life)
+            # Successive samples in the same instant still move the average by a fixed fraction
+            weight = min(weight, 0.9)
+            self._value = self._value * weight + value * (1 - weight)
+            self._updated_at = now
+
+    def value(self) -> float:
+        with self._lock:
+            return self._decayed(time.monotonic())
+
+
+class DecayingCount:
+    """
+    Number of recent events, each counting for less as it ages by half_life
+    """
+
+    def __init__(self, half_life: float):
+        self.half_life = half_life
+        self._value = 0.0
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, count: float = 1.0):
+        with self._lock:
+            now = time.monotonic()
+            self._value = self._value * 0.5 ** ((now - self._updated_at) / self.half_life) + count
+            self._updated_at = now
+
+    def value(self) -> float:
+        with self._lock:
+            return self._value * 0.5 ** ((time.monotonic() - self._updated_at) / self.half_life)
+
+
+class Registry:
+    def __init__(self):
+        self.collectors = []
+
+    def register(self, collector):
+        self.collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        lines = []
+        for collector in self.collectors:
+            lines.append(f"# HELP {collector.name} {collector.documentation}")
+            lines.append(f"# TYPE {collector.name} {collector.kind}")
+            for name, labels, value in collector.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Request metrics are only updated by MetricsMiddleware on the event loop thread
+request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], threadsafe=False
+))
+requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", threadsafe=False
+))
+request_rows = registry.register(Histogram(
+    "http_request_db_rows", "Rows returned by the database per request", ["route"],
+    buckets=ROW_BUCKETS, threadsafe=False
+))
+request_statements = registry.register(Histogram(
+    "http_request_db_statements", "SQL statements executed per request", ["route"],
+    buckets=ROW_BUCKETS, threadsafe=False
+))
+sql_statements = registry.register(Counter(
+    "db_statements_total", "SQL statements executed by originating crud function", ["function"]
+))
+sql_duration = registry.register(Histogram(
+    "db_statement_duration_seconds", "SQL statement execution time by originating crud function", ["function"]
+))
+
+
+class RequestStats:
+    __slots__ = ("statements", "sql_seconds", "rows")
+
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def query_origin() -> str:
+    """
+    Name of the innermost crud function on the call stack
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_globals.get("__name__") in QUERY_MODULES:
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return "other"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started_at = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started_at
+    function = query_origin()
+    sql_statements.inc((function,))
+    sql_duration.observe(elapsed, (function,))
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_seconds += elapsed
+        # Drivers that buffer results (psycopg2) know the row count of a SELECT
+        # up front; SQLite reports -1 and is left out
+        if context.isinsert or context.isupdate or context.isdelete:
+            return
+        rowcount = cursor.rowcount
+        if rowcount > 0:
+            stats.rows += rowcount
+
+
+def route_template(scope) -> str:
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        requests_in_flight.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            requests_in_flight.dec()
+            _request_stats.reset(token)
+
+            route = route_template(scope)
+            request_duration.observe(elapsed, (scope["method"], route, status[0]))
+            request_statements.observe(stats.statements, (route,))
+            if stats.rows:
+                request_rows.observe(stats.rows, (route,))
@@ -0,0 +1,34 @@
+"""
+Apply pending schema migrations to the configured database.
+
+Usage:
+    python migrate.py           # apply pending migrations
+    python migrate.py --status  # list pending migrations without applying them
+"""
+import argparse
+
+import migrations
+from database import engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--status", action="store_true", help="only list pending migrations")
+    args = parser.parse_args()
+
+    if args.status:
+        pending = migrations.pending_migrations(engine)
+        print("Pending migrations:" if pending else "Database is up to date.")
+        for name in pending:
+            print(f"  {name}")
+        return
+
+    applied = migrations.upgrade(engine)
+    for name in applied:
+        print(f"Applied {name}")
+    if not applied:
+        print("Database is up to date.")
+
+
+if __name__ == "__main__":
+    main()
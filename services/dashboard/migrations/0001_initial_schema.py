@@ -0,0 +1,76 @@
+"""
+Baseline schema, as it was created by Base.metadata.create_all before
+migrations existed. Tables are created with checkfirst, so databases that
+already have them are simply marked as migrated.
+"""
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, func
+
+metadata = MetaData()
+
+Table(
+    "categories",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, unique=True, index=True),
+    Column("description", String, nullable=True),
+)
+
+Table(
+    "products",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, index=True),
+    Column("description", String, nullable=True),
+    Column("price", Float, nullable=False),
+    Column("sku", String, unique=True, index=True),
+    Column("category_id", Integer, ForeignKey("categories.id")),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("updated_at", DateTime(timezone=True)),
+)
+
+Table(
+    "inventory",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("product_id", Integer, ForeignKey("products.id"), unique=True),
+    Column("quantity", Integer),
+    Column("low_stock_threshold", Integer),
+    Column("last_restocked", DateTime(timezone=True), nullable=True),
+    Column("updated_at", DateTime(timezone=True)),
+)
+
+Table(
+    "sales",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("order_id", String, unique=True, index=True),
+    Column("total_amount", Float, nullable=False),
+    Column("transaction_date", DateTime(timezone=True), server_default=func.now()),
+    Column("marketplace", String, index=True),
+)
+
+Table(
+    "sale_items",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("sale_id", Integer, ForeignKey("sales.id")),
+    Column("product_id", Integer, ForeignKey("products.id")),
+    Column("quantity", Integer, nullable=False),
+    Column("unit_price", Float, nullable=False),
+    Column("subtotal", Float, nullable=False),
+)
+
+Table(
+    "inventory_logs",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("product_id", Integer, ForeignKey("products.id")),
+    Column("previous_quantity", Integer, nullable=False),
+    Column("new_quantity", Integer, nullable=False),
+    Column("change_reason", String, nullable=True),
+    Column("timestamp", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
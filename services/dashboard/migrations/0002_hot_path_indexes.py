@@ -0,0 +1,15 @@
+"""
+Indexes on the columns the analytics and history queries in crud filter and
+join on. Built concurrently on Postgres so live tables stay writable.
+"""
+from migrations import create_index
+
+transactional = False
+
+
+def upgrade(conn):
+    create_index(conn, "ix_sales_transaction_date", "sales", ["transaction_date"])
+    create_index(conn, "ix_sale_items_sale_id", "sale_items", ["sale_id"])
+    create_index(conn, "ix_sale_items_product_id", "sale_items", ["product_id"])
+    create_index(conn, "ix_products_category_id", "products", ["category_id"])
+    create_index(conn, "ix_inventory_logs_product_id_timestamp", "inventory_logs", ["product_id", "timestamp"])
@@ -0,0 +1,27 @@
+"""
+Table backing the asynchronous analytics job API, shared by all workers.
+"""
+from sqlalchemy import JSON, Column, DateTime, Float, Index, MetaData, String, Table
+
+metadata = MetaData()
+
+Table(
+    "analytics_jobs",
+    metadata,
+    Column("id", String, primary_key=True),
+    Column("query_key", String, nullable=False),
+    Column("query", JSON, nullable=False),
+    Column("status", String, nullable=False),
+    Column("progress", Float, nullable=False),
+    Column("result", JSON, nullable=True),
+    Column("error", String, nullable=True),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Column("expires_at", DateTime, nullable=False),
+    Index("ix_analytics_jobs_query_key", "query_key"),
+    Index("ix_analytics_jobs_expires_at", "expires_at"),
+)
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
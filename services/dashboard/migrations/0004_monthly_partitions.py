@@ -0,0 +1,157 @@
+"""
+Copy each sale's transaction_date onto its sale_items, and on Postgres
+partition sales, sale_items and inventory_logs by month.
+
+Postgres cannot partition a table in place, so each table is renamed, a
+partitioned table is created under its name, monthly partitions are created
+for every month with data up to settings.partition_months_ahead months from
+now, and the rows are copied over. The three tables are locked while this
+runs; migrate a large database in a maintenance window.
+
+Primary keys and unique indexes of a partitioned table must include the
+partition key, so the primary keys become (id, date) and sale_items
+references sales on (sale_id, transaction_date). order_id stays unique
+across partitions through the small sale_order_ids table, which a trigger
+fills on every insert into sales.
+"""
+from sqlalchemy import (
+    Column, DateTime, Float, ForeignKey, ForeignKeyConstraint, Index, Integer, MetaData, PrimaryKeyConstraint,
+    String, Table, func, inspect, text
+)
+
+from config import settings
+from partitions import add_months, current_month, ensure_partitions
+
+metadata = MetaData()
+
+# products is only here so the foreign keys below resolve; it already exists
+Table("products", metadata, Column("id", Integer, primary_key=True))
+
+sales = Table(
+    "sales",
+    metadata,
+    Column("id", Integer, nullable=False, autoincrement=False),
+    Column("order_id", String),
+    Column("total_amount", Float, nullable=False),
+    Column("transaction_date", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Column("marketplace", String),
+    PrimaryKeyConstraint("id", "transaction_date"),
+    postgresql_partition_by="RANGE (transaction_date)",
+)
+
+sale_items = Table(
+    "sale_items",
+    metadata,
+    Column("id", Integer, nullable=False, autoincrement=False),
+    Column("sale_id", Integer),
+    Column("product_id", Integer, ForeignKey("products.id")),
+    Column("quantity", Integer, nullable=False),
+    Column("unit_price", Float, nullable=False),
+    Column("subtotal", Float, nullable=False),
+    Column("transaction_date", DateTime(timezone=True), nullable=False),
+    PrimaryKeyConstraint("id", "transaction_date"),
+    ForeignKeyConstraint(["sale_id", "transaction_date"], ["sales.id", "sales.transaction_date"]),
+    postgresql_partition_by="RANGE (transaction_date)",
+)
+
+inventory_logs = Table(
+    "inventory_logs",
+    metadata,
+    Column("id", Integer, nullable=False, autoincrement=False),
+    Column("product_id", Integer, ForeignKey("products.id")),
+    Column("previous_quantity", Integer, nullable=False),
+    Column("new_quantity", Integer, nullable=False),
+    Column("change_reason", String, nullable=True),
+    Column("timestamp", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    PrimaryKeyConstraint("id", "timestamp"),
+    postgresql_partition_by="RANGE (timestamp)",
+)
+
+sale_order_ids = Table(
+    "sale_order_ids",
+    metadata,
+    Column("order_id", String, primary_key=True),
+)
+
+INDEXES = [
+    Index("ix_sales_order_id", sales.c.order_id),
+    Index("ix_sales_marketplace", sales.c.marketplace),
+    Index("ix_sales_transaction_date", sales.c.transaction_date),
+    Index("ix_sale_items_sale_id", sale_items.c.sale_id),
+    Index("ix_sale_items_product_id", sale_items.c.product_id),
+    Index("ix_sale_items_transaction_date", sale_items.c.transaction_date),
+    Index("ix_inventory_logs_product_id_timestamp", inventory_logs.c.product_id, inventory_logs.c.timestamp),
+]
+
+COPY_ROWS = {
+    "sales": "INSERT INTO sales SELECT id, order_id, total_amount, transaction_date, marketplace FROM sales_heap",
+    # Items are placed by the date of their sale; items without a sale have no month to go to
+    "sale_items": (
+        "INSERT INTO sale_items SELECT sale_items_heap.id, sale_id, product_id, quantity, unit_price, subtotal, "
+        "sales_heap.transaction_date FROM sale_items_heap JOIN sales_heap ON sales_heap.id = sale_items_heap.sale_id"
+    ),
+    "inventory_logs": (
+        "INSERT INTO inventory_logs SELECT id, product_id, previous_quantity, new_quantity, change_reason, timestamp "
+        "FROM inventory_logs_heap"
+    ),
+}
+
+CLAIM_ORDER_ID = """
+CREATE OR REPLACE FUNCTION claim_sale_order_id() RETURNS trigger AS $$
+BEGIN
+    IF NEW.order_id IS NOT NULL THEN
+        INSERT INTO sale_order_ids (order_id) VALUES (NEW.order_id);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade(conn):
+    if conn.dialect.name == "postgresql":
+        upgrade_postgres(conn)
+        return
+
+    if "transaction_date" not in [column["name"] for column in inspect(conn).get_columns("sale_items")]:
+        conn.execute(text("ALTER TABLE sale_items ADD COLUMN transaction_date DATETIME"))
+    conn.execute(text(
+        "UPDATE sale_items SET transaction_date = "
+        "(SELECT transaction_date FROM sales WHERE sales.id = sale_items.sale_id) WHERE transaction_date IS NULL"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sale_items_transaction_date ON sale_items (transaction_date)"))
+
+
+def upgrade_postgres(conn):
+    sequences = {}
+    for table in ["sales", "sale_items", "inventory_logs"]:
+        sequences[table] = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}).scalar()
+        conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}_heap"))
+        conn.execute(text(f"ALTER INDEX {table}_pkey RENAME TO {table}_heap_pkey"))
+        # Frees the index names for the partitioned table; the copy below does not need them
+        for index in [f"ix_{table}_id"] + [index.name for index in INDEXES if index.table.name == table]:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+
+    metadata.create_all(conn, tables=[sales, sale_items, inventory_logs, sale_order_ids])
+
+    first_row = conn.execute(text(
+        "SELECT min(first_row) FROM (SELECT min(transaction_date) AS first_row FROM sales_heap "
+        "UNION ALL SELECT min(timestamp) FROM inventory_logs_heap) AS first_rows"
+    )).scalar()
+    ensure_partitions(conn, first_row or current_month(), add_months(current_month(), settings.partition_months_ahead))
+
+    for table in ["sales", "sale_items", "inventory_logs"]:
+        conn.execute(text(COPY_ROWS[table]))
+        # New rows keep numbering from the old sequence, which now belongs to the partitioned table
+        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{sequences[table]}')"))
+        conn.execute(text(f"ALTER SEQUENCE {sequences[table]} OWNED BY {table}.id"))
+
+    conn.execute(text("INSERT INTO sale_order_ids SELECT DISTINCT order_id FROM sales WHERE order_id IS NOT NULL"))
+    conn.execute(text(CLAIM_ORDER_ID))
+    conn.execute(text(
+        "CREATE TRIGGER sales_claim_order_id AFTER INSERT ON sales FOR EACH ROW EXECUTE FUNCTION claim_sale_order_id()"
+    ))
+
+    for table in ["sale_items", "sales", "inventory_logs"]:
+        conn.execute(text(f"DROP TABLE {table}_heap"))
+    conn.execute(text("ANALYZE sales, sale_items, inventory_logs"))
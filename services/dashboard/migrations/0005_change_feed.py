@@ -0,0 +1,33 @@
+"""
+change_seq and changed_at columns, stamped by triggers, on the tables served
+by the change feed. Existing rows are numbered once here, so the first sync
+from cursor 0 returns the whole history. On Postgres this rewrites every row
+of the four tables; the BEFORE ROW triggers on the partitioned tables need
+Postgres 13 or later.
+"""
+from sqlalchemy import inspect, text
+
+from change_feed import change_tracking_statements
+
+TABLES = ["products", "inventory", "sales", "inventory_logs"]
+
+
+def upgrade(conn):
+    dialect = conn.dialect.name
+    inspector = inspect(conn)
+    for table in TABLES:
+        if "change_seq" not in [column["name"] for column in inspector.get_columns(table)]:
+            timestamp_type = "TIMESTAMP WITH TIME ZONE" if dialect == "postgresql" else "DATETIME"
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN change_seq BIGINT"))
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN changed_at {timestamp_type}"))
+
+    if dialect == "postgresql":
+        conn.exec_driver_sql("CREATE SEQUENCE IF NOT EXISTS change_seq")
+    for table in TABLES:
+        if dialect == "postgresql":
+            conn.execute(text(f"UPDATE {table} SET change_seq = nextval('change_seq'), changed_at = now() WHERE change_seq IS NULL"))
+        else:
+            conn.execute(text(f"UPDATE {table} SET change_seq = id, changed_at = CURRENT_TIMESTAMP WHERE change_seq IS NULL"))
+        for statement in change_tracking_statements(dialect, table):
+            conn.exec_driver_sql(statement)
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_change_seq ON {table} (change_seq)"))
@@ -0,0 +1,21 @@
+"""
+Composite indexes behind the GET /sales/ filters and keyset pagination.
+
+Every index ends in (transaction_date, id), the listing order, so a filtered
+page is read in order and stops at the limit. total_amount is carried along
+so the min/max total filters are checked in the index rather than the table.
+On Postgres the indexes on the partitioned sales and sale_items tables are
+built partition by partition (see ``migrations.create_index``).
+"""
+from migrations import create_index
+
+transactional = False
+
+
+def upgrade(conn):
+    create_index(conn, "ix_sales_date_id", "sales", ["transaction_date", "id", "total_amount"])
+    create_index(conn, "ix_sales_marketplace_date_id", "sales", ["marketplace", "transaction_date", "id", "total_amount"])
+    create_index(conn, "ix_sale_items_product_id_date_sale_id", "sale_items", ["product_id", "transaction_date", "sale_id"])
+    if conn.dialect.name == "postgresql":
+        # LIKE 'prefix%' can only use a text_pattern_ops index unless the database uses the C collation
+        create_index(conn, "ix_sales_order_id_pattern", "sales", ["order_id text_pattern_ops"])
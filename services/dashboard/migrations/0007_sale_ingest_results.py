@@ -0,0 +1,23 @@
+"""
+Outcomes of sales accepted by the durable ingest buffer (ingest.py), so any
+worker can answer for a tracking ID once its sale has been committed.
+"""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table
+
+metadata = MetaData()
+
+Table(
+    "sale_ingest_results",
+    metadata,
+    Column("tracking_id", String, primary_key=True),
+    Column("order_id", String, nullable=False),
+    Column("status", String, nullable=False),
+    Column("sale_id", Integer, nullable=True),
+    Column("error", String, nullable=True),
+    Column("created_at", DateTime, nullable=False),
+    Index("ix_sale_ingest_results_created_at", "created_at"),
+)
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
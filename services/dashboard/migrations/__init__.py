@@ -0,0 +1,90 @@
+"""
+Versioned schema migrations.
+
+Each module in this package named ``NNNN_description.py`` defines
+``upgrade(conn)``. Applied versions are recorded in the ``schema_migrations``
+table and pending ones run in version order. A module that sets
+``transactional = False`` runs on an autocommit connection instead of inside
+a transaction, which Postgres requires for ``CREATE INDEX CONCURRENTLY``.
+"""
+import importlib
+import pkgutil
+import re
+from typing import List
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, func, select, text
+
+from partitions import list_partitions, partitioned_tables
+
+MIGRATION_NAME = re.compile(r"^(\d{4})_\w+$")
+
+metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    metadata,
+    Column("version", String, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+def available_migrations() -> List[str]:
+    names = [module.name for module in pkgutil.iter_modules(__path__) if MIGRATION_NAME.match(module.name)]
+    return sorted(names)
+
+
+def applied_versions(engine) -> List[str]:
+    with engine.begin() as conn:
+        metadata.create_all(conn, checkfirst=True)
+        return [row.version for row in conn.execute(select(schema_migrations.c.version))]
+
+
+def pending_migrations(engine) -> List[str]:
+    applied = set(applied_versions(engine))
+    return [name for name in available_migrations() if MIGRATION_NAME.match(name).group(1) not in applied]
+
+
+def upgrade(engine) -> List[str]:
+    """
+    Apply every pending migration and return the names of the ones that ran
+    """
+    applied = []
+    for name in pending_migrations(engine):
+        module = importlib.import_module(f"{__name__}.{name}")
+        record = schema_migrations.insert().values(version=MIGRATION_NAME.match(name).group(1), name=name)
+
+        if getattr(module, "transactional", True):
+            with engine.begin() as conn:
+                module.upgrade(conn)
+                conn.execute(record)
+        else:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                module.upgrade(conn)
+                conn.execute(record)
+        applied.append(name)
+    return applied
+
+
+def create_index(conn, name: str, table: str, columns: List[str]):
+    """
+    Create an index if it does not exist yet, without blocking writes on Postgres.
+
+    A partitioned table cannot be indexed concurrently. Its index is created on
+    the parent only, each partition is indexed concurrently and attached to it,
+    and partitions created later get the index automatically.
+    """
+    column_list = ", ".join(columns)
+    if conn.dialect.name != "postgresql":
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column_list})"))
+        return
+    if table not in partitioned_tables(conn):
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column_list})"))
+        return
+
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} ({column_list})"))
+    for partition in list_partitions(conn, table):
+        # ix_sales_date_id on sales_y2024m05 becomes ix_sales_date_id_y2024m05
+        partition_index = f"{name}_{partition[len(table) + 1:]}"
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition_index} ON {partition} ({column_list})"))
+        conn.execute(text(f"ALTER INDEX {name} ATTACH PARTITION {partition_index}"))
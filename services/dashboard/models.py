@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Date
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Boolean, Date, Index, JSON, select
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from change_feed import track_changes
 from database import Base
 
 
@@ -22,9 +23,12 @@ class Product(Base):
     description = Column(String, nullable=True)
     price = Column(Float, nullable=False)
     sku = Column(String, unique=True, index=True)
-    category_id = Column(Integer, ForeignKey("categories.id"))
+    category_id = Column(Integer, ForeignKey("categories.id"), index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Stamped by a trigger on every insert and update, for the change feed (change_feed.py)
+    change_seq = Column(BigInteger, index=True)
+    changed_at = Column(DateTime(timezone=True))
     
     category = relationship("Category", back_populates="products")
     inventory = relationship("Inventory", back_populates="product", uselist=False)
@@ -40,31 +44,56 @@ class Inventory(Base):
     low_stock_threshold = Column(Integer, default=10)
     last_restocked = Column(DateTime(timezone=True), nullable=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    change_seq = Column(BigInteger, index=True)
+    changed_at = Column(DateTime(timezone=True))
     
     product = relationship("Product", back_populates="inventory")
 
 
 class Sale(Base):
     __tablename__ = "sales"
+    # Indexes behind the GET /sales/ filters (migration 0006)
+    __table_args__ = (
+        Index("ix_sales_date_id", "transaction_date", "id", "total_amount"),
+        Index("ix_sales_marketplace_date_id", "marketplace", "transaction_date", "id", "total_amount"),
+        Index(
+            "ix_sales_order_id_pattern", "order_id", postgresql_ops={"order_id": "text_pattern_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
+    # Fetch the server-side transaction_date with the INSERT, so it can be copied to the items
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(String, unique=True, index=True)
     total_amount = Column(Float, nullable=False)
-    transaction_date = Column(DateTime(timezone=True), server_default=func.now())
+    transaction_date = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     marketplace = Column(String, index=True)  # Amazon, Walmart, etc.
+    change_seq = Column(BigInteger, index=True)
+    changed_at = Column(DateTime(timezone=True))
     
     items = relationship("SaleItem", back_populates="sale")
 
 
+def sale_transaction_date(context):
+    # Items written without a date get their sale's, which must already be inserted
+    sale_id = context.get_current_parameters()["sale_id"]
+    return context.connection.execute(select(Sale.transaction_date).where(Sale.id == sale_id)).scalar()
+
+
 class SaleItem(Base):
     __tablename__ = "sale_items"
+    __table_args__ = (
+        Index("ix_sale_items_product_id_date_sale_id", "product_id", "transaction_date", "sale_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    sale_id = Column(Integer, ForeignKey("sales.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    sale_id = Column(Integer, ForeignKey("sales.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     quantity = Column(Integer, nullable=False)
     unit_price = Column(Float, nullable=False)
     subtotal = Column(Float, nullable=False)
+    # Copy of sales.transaction_date, the partition key of sale_items on Postgres (migration 0004)
+    transaction_date = Column(DateTime(timezone=True), default=sale_transaction_date, index=True)
     
     sale = relationship("Sale", back_populates="items")
     product = relationship("Product", back_populates="sales")
@@ -72,6 +101,9 @@ class SaleItem(Base):
 
 class InventoryLog(Base):
     __tablename__ = "inventory_logs"
+    __table_args__ = (
+        Index("ix_inventory_logs_product_id_timestamp", "product_id", "timestamp"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
@@ -79,3 +111,39 @@ class InventoryLog(Base):
     new_quantity = Column(Integer, nullable=False)
     change_reason = Column(String, nullable=True)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    change_seq = Column(BigInteger, index=True)
+    changed_at = Column(DateTime(timezone=True))
+
+
+class AnalyticsJob(Base):
+    __tablename__ = "analytics_jobs"
+    
+    id = Column(String, primary_key=True)
+    # Canonical JSON of the query, used to reuse identical jobs
+    query_key = Column(String, nullable=False, index=True)
+    query = Column(JSON, nullable=False)
+    status = Column(String, nullable=False, default="pending")
+    progress = Column(Float, nullable=False, default=0.0)
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class SaleIngestResult(Base):
+    """
+    Outcome of a sale accepted by the ingest buffer, written with the sale itself
+    """
+    __tablename__ = "sale_ingest_results"
+
+    tracking_id = Column(String, primary_key=True)
+    order_id = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # committed or failed
+    sale_id = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+
+for model in (Product, Inventory, Sale, InventoryLog):
+    track_changes(model.__table__)
@@ -0,0 +1,217 @@
+"""
+Monthly range partitions of sales, sale_items and inventory_logs on Postgres.
+
+Migration 0004 turns the three tables into tables partitioned by month on
+``transaction_date`` (``timestamp`` for inventory_logs), so date-bounded
+analytics only scan the months they cover and old months can be detached
+instead of deleted row by row. A partition has to exist before rows for its
+month arrive: ``PartitionMaintenance`` runs in every app process and keeps
+``settings.partition_months_ahead`` months created ahead of time, and
+detaches months older than ``settings.partition_retention_months`` when that
+is set. Detached partitions are left as plain tables for archiving.
+
+On SQLite, or before the migration has run, every function here is a no-op.
+
+Usage:
+    python partitions.py list
+    python partitions.py ensure [--months-ahead N]
+    python partitions.py detach --older-than-months N [--drop]
+"""
+import argparse
+import logging
+import re
+import threading
+from datetime import date, datetime, timezone
+from typing import List
+
+from sqlalchemy import text
+
+from config import settings
+
+logger = logging.getLogger("partitions")
+
+# Partitioned table -> partition key. Referencing tables come first, so
+# sale_items months are detached before the sales months they point at
+PARTITIONED_TABLES = {
+    "sale_items": "transaction_date",
+    "sales": "transaction_date",
+    "inventory_logs": "timestamp",
+}
+PARTITION_NAME = re.compile(r"^(?P<table>\w+)_y(?P<year>\d{4})m(?P<month>\d{2})$")
+# Any constant shared by all processes; only one of them runs maintenance at a time
+MAINTENANCE_LOCK_ID = 7305
+
+
+def month_start(value) -> date:
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def current_month() -> date:
+    return month_start(datetime.now(timezone.utc))
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+
+def partitioned_tables(conn) -> List[str]:
+    """
+    The tables of PARTITIONED_TABLES that are actually partitioned in this database
+    """
+    if conn.dialect.name != "postgresql":
+        return []
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE pg_table_is_visible(c.oid)"
+    ))
+    partitioned = {row.relname for row in rows}
+    return [table for table in PARTITIONED_TABLES if table in partitioned]
+
+
+def list_partitions(conn, table: str) -> List[str]:
+    rows = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table AND pg_table_is_visible(parent.oid) ORDER BY child.relname"
+    ), {"table": table})
+    return [row.relname for row in rows]
+
+
+def ensure_partitions(conn, start, end) -> List[str]:
+    """
+    Create the missing monthly partitions covering start to end and return their names
+    """
+    created = []
+    for table in partitioned_tables(conn):
+        existing = set(list_partitions(conn, table))
+        month = month_start(start)
+        while month <= month_start(end):
+            name = partition_name(table, month)
+            if name not in existing:
+                # Bounds are UTC midnights, so a month means the same thing to every session
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+                ))
+                created.append(name)
+            month = add_months(month, 1)
+    return created
+
+
+def ensure_future_partitions(conn, months_ahead: int = None) -> List[str]:
+    if months_ahead is None:
+        months_ahead = settings.partition_months_ahead
+    return ensure_partitions(conn, current_month(), add_months(current_month(), months_ahead))
+
+
+def detach_partitions(conn, older_than_months: int, drop: bool = False) -> List[str]:
+    """
+    Detach (or drop) the partitions of months that ended more than older_than_months months ago
+    """
+    cutoff = add_months(current_month(), -older_than_months)
+    detached = []
+    for table in partitioned_tables(conn):
+        for name in list_partitions(conn, table):
+            match = PARTITION_NAME.match(name)
+            if match is None or match["table"] != table:
+                continue
+            if date(int(match["year"]), int(match["month"]), 1) >= cutoff:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            if drop:
+                conn.execute(text(f"DROP TABLE {name}"))
+            else:
+                # The archived month keeps its rows but no longer points into the live sales table
+                foreign_keys = conn.execute(text(
+                    "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:name AS regclass) AND contype = 'f' "
+                    "AND confrelid = CAST('sales' AS regclass)"
+                ), {"name": name}).scalars().all()
+                for constraint in foreign_keys:
+                    conn.execute(text(f'ALTER TABLE {name} DROP CONSTRAINT "{constraint}"'))
+            detached.append(name)
+    return detached
+
+
+def run_maintenance(engine) -> List[str]:
+    """
+    Create upcoming partitions and detach expired ones, unless another process is doing it
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+    with engine.begin() as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": MAINTENANCE_LOCK_ID}).scalar():
+            return []
+        changed = ensure_future_partitions(conn)
+        if settings.partition_retention_months:
+            changed += detach_partitions(conn, settings.partition_retention_months)
+    return changed
+
+
+class PartitionMaintenance:
+    """
+    Background thread running run_maintenance every settings.partition_maintenance_interval_seconds
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.engine.dialect.name != "postgresql" or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="partition-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            try:
+                for name in run_maintenance(self.engine):
+                    logger.info("Partition maintenance: %s", name)
+            except Exception:
+                logger.exception("Partition maintenance failed")
+            self._stopped.wait(settings.partition_maintenance_interval_seconds)
+
+
+def main():
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Manage the monthly partitions of sales, sale_items and inventory_logs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list the partitions of every partitioned table")
+    ensure = commands.add_parser("ensure", help="create partitions for the coming months")
+    ensure.add_argument("--months-ahead", type=int, default=settings.partition_months_ahead)
+    detach = commands.add_parser("detach", help="detach the partitions of old months")
+    detach.add_argument("--older-than-months", type=int, required=True)
+    detach.add_argument("--drop", action="store_true", help="drop the detached partitions instead of keeping them")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        tables = partitioned_tables(conn)
+        if not tables:
+            print("No partitioned tables (partitioning needs Postgres and migration 0004).")
+            return
+        if args.command == "list":
+            for table in tables:
+                print(f"{table}: {', '.join(list_partitions(conn, table))}")
+        elif args.command == "ensure":
+            for name in ensure_future_partitions(conn, args.months_ahead):
+                print(f"Created {name}")
+        else:
+            for name in detach_partitions(conn, args.older_than_months, drop=args.drop):
+                print(f"{'Dropped' if args.drop else 'Detached'} {name}")
+
+
+if __name__ == "__main__":
+    main()
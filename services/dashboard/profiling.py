@@ -0,0 +1,265 @@
+"""
+On-demand profiling of a single request, for admins.
+
+Send ``X-Profile: collapsed`` or ``X-Profile: calltree`` (or the
+``__profile`` query parameter) together with a valid ``X-Admin-Token``, and
+the route runs under a profiler. The response body is then the profile
+instead of the normal body:
+
+- ``collapsed``: stacks sampled every ``settings.profile_sample_interval_ms``
+  in the collapsed format that flamegraph.pl and speedscope read
+- ``calltree``: a deterministic cProfile report with callee breakdown
+
+The original status and the SQL statements and time recorded for the request
+by ``metrics`` are returned in ``X-Profile-*`` headers. Only one request is
+profiled at a time, and profiles start at least
+``settings.profile_min_interval_seconds`` apart.
+"""
+import asyncio
+import cProfile
+import functools
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+from urllib.parse import parse_qs
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers
+
+from config import settings
+from metrics import current_request_stats
+from utils import is_admin_token
+
+PROFILE_MODES = ("collapsed", "calltree")
+MAX_STACK_DEPTH = 128
+
+
+class StackSampler:
+    """
+    Samples the call stack of one thread from a background thread
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def render(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileSession:
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.output = ""
+
+    def run(self, fn, *args, **kwargs):
+        if self.mode == "calltree":
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(fn, *args, **kwargs)
+            finally:
+                self.output = render_call_tree(profiler)
+
+        sampler = StackSampler(threading.get_ident(), settings.profile_sample_interval_ms / 1000)
+        try:
+            with sampler:
+                return fn(*args, **kwargs)
+        finally:
+            self.output = sampler.render()
+
+    async def run_async(self, fn, *args, **kwargs):
+        # Coroutine endpoints run on the event loop, so other tasks may show up in the profile
+        if self.mode == "calltree":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                profiler.disable()
+                self.output = render_call_tree(profiler)
+
+        sampler = StackSampler(threading.get_ident(), settings.profile_sample_interval_ms / 1000)
+        try:
+            with sampler:
+                return await fn(*args, **kwargs)
+        finally:
+            self.output = sampler.render()
+
+
+def render_call_tree(profiler: cProfile.Profile) -> str:
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream).sort_stats("cumulative")
+    stats.print_stats(50)
+    stats.print_callees(50)
+    return stream.getvalue()
+
+
+_active_profile: ContextVar[Optional[ProfileSession]] = ContextVar("active_profile", default=None)
+
+
+def wrap_endpoint(endpoint):
+    """
+    Run the endpoint under the active profile session, in whatever thread it executes
+    """
+    # include_router copies routes with their (already wrapped) endpoints
+    if getattr(endpoint, "_profiled", False):
+        return endpoint
+
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def profiled_async_endpoint(*args, **kwargs):
+            session = _active_profile.get()
+            if session is None:
+                return await endpoint(*args, **kwargs)
+            return await session.run_async(endpoint, *args, **kwargs)
+
+        profiled_async_endpoint._profiled = True
+        return profiled_async_endpoint
+
+    @functools.wraps(endpoint)
+    def profiled_endpoint(*args, **kwargs):
+        session = _active_profile.get()
+        if session is None:
+            return endpoint(*args, **kwargs)
+        return session.run(endpoint, *args, **kwargs)
+
+    profiled_endpoint._profiled = True
+    return profiled_endpoint
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, wrap_endpoint(endpoint), **kwargs)
+
+
+class ProfileRateLimiter:
+    def __init__(self):
+        self.active = False
+        self.last_started = float("-inf")
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Start a profile if allowed; otherwise return the seconds to wait before retrying
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = self.last_started + settings.profile_min_interval_seconds - now
+            if self.active:
+                return max(wait, 1.0)
+            if wait > 0:
+                return wait
+            self.active = True
+            self.last_started = now
+            return 0.0
+
+    def release(self):
+        with self._lock:
+            self.active = False
+
+
+rate_limiter = ProfileRateLimiter()
+
+
+def requested_mode(scope) -> Optional[str]:
+    mode = Headers(scope=scope).get("x-profile")
+    if mode is None and scope.get("query_string"):
+        mode = parse_qs(scope["query_string"].decode("latin-1")).get("__profile", [None])[0]
+    return mode
+
+
+async def _send_plain(send, status: int, body: str, headers=()):
+    encoded = body.encode()
+    raw_headers = [
+        (b"content-type", b"text/plain; charset=utf-8"),
+        (b"content-length", str(len(encoded)).encode()),
+    ]
+    raw_headers.extend((name.encode(), value.encode()) for name, value in headers)
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": encoded})
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        mode = requested_mode(scope)
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not is_admin_token(Headers(scope=scope).get("x-admin-token")):
+            await _send_plain(send, 403, json.dumps({"detail": "Admin token required"}))
+            return
+        if mode not in PROFILE_MODES:
+            await _send_plain(send, 400, json.dumps({"detail": f"Profile mode must be one of: {', '.join(PROFILE_MODES)}"}))
+            return
+
+        retry_after = rate_limiter.acquire()
+        if retry_after > 0:
+            await _send_plain(
+                send, 429, json.dumps({"detail": "Another profile is running or one ran too recently"}),
+                headers=[("retry-after", str(int(retry_after) + 1))]
+            )
+            return
+
+        session = ProfileSession(mode)
+        token = _active_profile.set(session)
+        status = [500]
+
+        async def capture(message):
+            # The normal response is replaced by the profile
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            _active_profile.reset(token)
+            rate_limiter.release()
+        elapsed = time.perf_counter() - started_at
+
+        headers = [
+            ("x-profile-mode", mode),
+            ("x-profile-response-status", str(status[0])),
+            ("x-profile-wall-time-ms", f"{elapsed * 1000:.3f}"),
+        ]
+        stats = current_request_stats()
+        if stats is not None:
+            headers.append(("x-profile-sql-statements", str(stats.statements)))
+            headers.append(("x-profile-sql-time-ms", f"{stats.sql_seconds * 1000:.3f}"))
+        await _send_plain(send, 200, session.output, headers=headers)
@@ -0,0 +1,146 @@
+"""
+Statement timeouts and pre-flight cost checks for expensive queries.
+
+``set_statement_timeout(db, ms)`` bounds every statement the session runs
+afterwards. It is applied whenever the session begins a transaction on a
+connection, primary or replica: Postgres gets ``SET LOCAL
+statement_timeout``, which ends with the transaction, and SQLite gets a
+progress handler that interrupts the statement once its deadline passes.
+Either way the query fails with an ``OperationalError`` that
+``statement_timeout_handler`` turns into a ``503`` telling the client how to
+narrow the query.
+
+``estimate_rows`` estimates how many rows a query would return before
+running it: from the planner's ``EXPLAIN`` estimate on Postgres, and with a
+``COUNT(*)`` of the same query on SQLite, whose planner does not estimate
+rows. ``check_row_budget`` raises ``RowBudgetExceeded`` when an estimate is
+over budget.
+"""
+import json
+import time
+from typing import Callable
+
+from fastapi import Depends, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import Pool
+
+from config import settings
+from database import get_read_db
+
+TIMEOUT_KEY = "statement_timeout_ms"
+SQLITE_DEADLINE_KEY = "sqlite_statement_deadline"
+# SQLite virtual machine instructions between deadline checks
+SQLITE_PROGRESS_INTERVAL = 1000
+POSTGRES_QUERY_CANCELED = "57014"
+
+NARROW_QUERY_HINT = (
+    "narrow the date range, filter by product_id or category_id, use GET /api/v1/analytics/sales/ "
+    "for totals, or run it in the background with POST /api/v1/analytics/jobs"
+)
+
+
+class RowBudgetExceeded(Exception):
+    def __init__(self, estimated_rows: int, budget: int):
+        super().__init__(f"Query would return about {estimated_rows} rows, over the budget of {budget}")
+        self.estimated_rows = estimated_rows
+        self.budget = budget
+
+
+def set_statement_timeout(db: Session, timeout_ms: int):
+    """
+    Bound the statements of a session; call before its first query. 0 disables the timeout.
+    """
+    if timeout_ms:
+        db.info[TIMEOUT_KEY] = int(timeout_ms)
+    else:
+        db.info.pop(TIMEOUT_KEY, None)
+
+
+def statement_timeout(db: Session) -> int:
+    return db.info.get(TIMEOUT_KEY, 0)
+
+
+def analytics_read_db(db: Session = Depends(get_read_db)):
+    set_statement_timeout(db, settings.analytics_statement_timeout_ms)
+    return db
+
+
+class _SqliteDeadline:
+    def __init__(self):
+        self.deadline = float("inf")
+
+    def __call__(self):
+        # A non-zero return value interrupts the running statement
+        return time.monotonic() > self.deadline
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    timeout_ms = session.info.get(TIMEOUT_KEY)
+    if timeout_ms is None:
+        return
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+    elif connection.dialect.name == "sqlite":
+        deadline = _SqliteDeadline()
+        connection.info[TIMEOUT_KEY] = timeout_ms
+        connection.info[SQLITE_DEADLINE_KEY] = deadline
+        connection.connection.dbapi_connection.set_progress_handler(deadline, SQLITE_PROGRESS_INTERVAL)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_sqlite_deadline(conn, cursor, statement, parameters, context, executemany):
+    deadline = conn.info.get(SQLITE_DEADLINE_KEY)
+    if deadline is not None:
+        deadline.deadline = time.monotonic() + conn.info[TIMEOUT_KEY] / 1000
+
+
+@event.listens_for(Pool, "checkin")
+def _clear_sqlite_deadline(dbapi_connection, connection_record):
+    # The connection may next serve a session without a timeout
+    if connection_record is not None and connection_record.info.pop(SQLITE_DEADLINE_KEY, None) is not None:
+        connection_record.info.pop(TIMEOUT_KEY, None)
+        dbapi_connection.set_progress_handler(None, 0)
+
+
+def is_statement_timeout(exc) -> bool:
+    orig = getattr(exc, "orig", None)
+    if orig is None:
+        return False
+    if getattr(orig, "pgcode", None) == POSTGRES_QUERY_CANCELED or getattr(orig, "sqlstate", None) == POSTGRES_QUERY_CANCELED:
+        return True
+    return type(orig).__module__.startswith("sqlite3") and "interrupted" in str(orig)
+
+
+async def statement_timeout_handler(request: Request, exc):
+    if not is_statement_timeout(exc):
+        raise exc
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Query exceeded its statement timeout; {NARROW_QUERY_HINT}"},
+    )
+
+
+def estimate_rows(db: Session, statement) -> int:
+    conn = db.connection(bind_arguments={"clause": statement})
+    if conn.dialect.name == "postgresql":
+        compiled = statement.compile(dialect=conn.dialect)
+        plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    return db.execute(select(func.count()).select_from(statement.subquery())).scalar()
+
+
+def check_row_budget(estimate: Callable[[], int], budget: int):
+    """
+    Raise RowBudgetExceeded when estimate() is more than budget rows; 0 disables the check and skips the estimate
+    """
+    if not budget:
+        return
+    estimated_rows = estimate()
+    if estimated_rows > budget:
+        raise RowBudgetExceeded(estimated_rows, budget)
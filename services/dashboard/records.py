@@ -0,0 +1,28 @@
+"""
+Lightweight read-only records for the list endpoints.
+
+The list queries in ``crud`` select plain columns with Core ``select()``, so
+their rows are already named tuples with no identity map or attribute
+instrumentation behind them. ``SaleRecord`` adds the one thing a flat row
+cannot hold: the nested list of sale items.
+"""
+from collections import namedtuple
+
+# A product sales row, as selected by crud.product_sales_statement, when it is
+# assembled from sharded sale items and the catalog instead
+ProductSale = namedtuple(
+    "ProductSale",
+    ["product_id", "product_name", "category_name", "quantity", "unit_price", "subtotal", "transaction_date"],
+)
+
+
+class SaleRecord:
+    __slots__ = ("id", "order_id", "total_amount", "transaction_date", "marketplace", "items")
+
+    def __init__(self, id, order_id, total_amount, transaction_date, marketplace, items):
+        self.id = id
+        self.order_id = order_id
+        self.total_amount = total_amount
+        self.transaction_date = transaction_date
+        self.marketplace = marketplace
+        self.items = items
@@ -1,12 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, date
+from tempfile import SpooledTemporaryFile
 
-import crud, models, schemas
-from database import get_db
+import catalog_import, change_feed, crud, ingest, models, schemas, serializers, sharding
+from config import settings
+from database import get_db, get_read_db
+from jobs import JobQueueFull, analytics_jobs, job_response, validate_job
+from profiling import ProfiledRoute
+from query_limits import NARROW_QUERY_HINT, RowBudgetExceeded, analytics_read_db, check_row_budget
+from singleflight import analytics_flight, inventory_flight
+from slow_queries import slow_query_log
+from utils import parse_id_list, require_admin
 
-router = APIRouter()
+# ProfiledRoute lets ProfilingMiddleware run any endpoint under a profiler on demand
+router = APIRouter(route_class=ProfiledRoute)
+
+# Read-only routes take get_read_db, which uses a replica session when replicas
+# are configured; routes that write take get_db and stay on the primary
 
 
 # Category routes
@@ -19,13 +34,15 @@ def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_
 
 
 @router.get("/categories/", response_model=List[schemas.Category])
-def read_categories(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_categories(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     categories = crud.get_categories(db, skip=skip, limit=limit)
+    if serializers.fast_json_enabled():
+        return serializers.fast_json(categories, serializers.category_record)
     return categories
 
 
 @router.get("/categories/{category_id}", response_model=schemas.Category)
-def read_category(category_id: int, db: Session = Depends(get_db)):
+def read_category(category_id: int, db: Session = Depends(get_read_db)):
     db_category = crud.get_category(db, category_id=category_id)
     if db_category is None:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -47,19 +64,79 @@ def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)
     return crud.create_product(db=db, product=product)
 
 
+@router.post("/products/import", response_model=schemas.ProductImportResult)
+async def import_products(
+    request: Request,
+    format: Optional[str] = Query(None, description="csv or ndjson; taken from the Content-Type by default"),
+    create_inventory: bool = Query(False, description="also create inventory rows for products that have none"),
+    db: Session = Depends(get_db)
+):
+    try:
+        upload_format = catalog_import.upload_format(request.headers.get("content-type"), format)
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    
+    with SpooledTemporaryFile(max_size=catalog_import.SPOOL_MEMORY_BYTES) as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        upload.seek(0)
+        # Parsing and the database work run on the threadpool, off the event loop
+        return await run_in_threadpool(
+            catalog_import.import_products, db, upload, upload_format, create_inventory=create_inventory
+        )
+
+
 @router.get("/products/", response_model=List[schemas.Product])
 def read_products(
     skip: int = 0, 
     limit: int = 100, 
     category_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     products = crud.get_products(db, skip=skip, limit=limit, category_id=category_id)
+    if serializers.fast_json_enabled():
+        return serializers.fast_json(products, serializers.product_record)
     return products
 
 
+@router.get("/products", response_model=List[schemas.ProductLookup])
+def read_products_batch(
+    ids: str = Query(..., description="Comma separated product IDs, e.g. 1,2,3"),
+    db: Session = Depends(get_read_db)
+):
+    product_ids = parse_id_list(ids, name="ids")
+    products = crud.get_products_by_ids(db, product_ids=product_ids)
+    
+    # Keep the request order and mark missing products explicitly
+    return [
+        {"id": product_id, "found": product_id in products, "product": products.get(product_id)}
+        for product_id in product_ids
+    ]
+
+
+@router.get("/products/details", response_model=List[schemas.ProductDetailLookup])
+def read_product_details_batch(
+    ids: str = Query(..., description="Comma separated product IDs, e.g. 1,2,3"),
+    db: Session = Depends(get_read_db)
+):
+    product_ids = parse_id_list(ids, name="ids")
+    details = crud.get_products_with_inventory(db, product_ids=product_ids)
+    
+    result = []
+    for product_id in product_ids:
+        product, inventory = details.get(product_id, (None, None))
+        result.append({
+            "id": product_id,
+            "found": product is not None,
+            "product": product,
+            "inventory": inventory
+        })
+    
+    return result
+
+
 @router.get("/products/{product_id}", response_model=schemas.Product)
-def read_product(product_id: int, db: Session = Depends(get_db)):
+def read_product(product_id: int, db: Session = Depends(get_read_db)):
     db_product = crud.get_product(db, product_id=product_id)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -83,13 +160,28 @@ def create_inventory(inventory: schemas.InventoryCreate, db: Session = Depends(g
 
 
 @router.get("/inventory/", response_model=List[schemas.Inventory])
-def read_inventory(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_inventory(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     inventory = crud.get_all_inventory(db, skip=skip, limit=limit)
-    return inventory
+    response = serializers.encoded_response(request, inventory, serializers.inventory_record)
+    return inventory if response is None else response
+
+
+@router.get("/inventory", response_model=List[schemas.InventoryLookup])
+def read_inventory_batch(
+    product_ids: str = Query(..., description="Comma separated product IDs, e.g. 1,2,3"),
+    db: Session = Depends(get_read_db)
+):
+    ids = parse_id_list(product_ids, name="product_ids")
+    inventories = crud.get_inventory_by_product_ids(db, product_ids=ids)
+    
+    return [
+        {"product_id": product_id, "found": product_id in inventories, "inventory": inventories.get(product_id)}
+        for product_id in ids
+    ]
 
 
 @router.get("/inventory/{product_id}", response_model=schemas.Inventory)
-def read_product_inventory(product_id: int, db: Session = Depends(get_db)):
+def read_product_inventory(product_id: int, db: Session = Depends(get_read_db)):
     db_inventory = crud.get_inventory(db, product_id=product_id)
     if db_inventory is None:
         raise HTTPException(status_code=404, detail="Inventory not found for this product")
@@ -116,38 +208,56 @@ def update_product_inventory(
 
 
 @router.get("/inventory/low-stock/", response_model=List[schemas.LowStockProduct])
-def read_low_stock_products(db: Session = Depends(get_db)):
-    result = crud.get_low_stock_products(db)
-    
-    low_stock_products = []
-    for inventory, product_name in result:
-        low_stock_products.append({
-            "product_id": inventory.product_id,
-            "product_name": product_name,
-            "current_quantity": inventory.quantity,
-            "threshold": inventory.low_stock_threshold
-        })
+def read_low_stock_products(db: Session = Depends(get_read_db)):
+    def low_stock_products():
+        return [
+            {
+                "product_id": inventory.product_id,
+                "product_name": product_name,
+                "current_quantity": inventory.quantity,
+                "threshold": inventory.low_stock_threshold
+            }
+            for inventory, product_name in crud.get_low_stock_products(db)
+        ]
     
-    return low_stock_products
+    # Concurrent identical requests share one query
+    return inventory_flight.do("low_stock", low_stock_products)
 
 
 @router.get("/inventory/history/{product_id}", response_model=List[schemas.InventoryLog])
-def read_inventory_history(product_id: int, limit: int = 10, db: Session = Depends(get_db)):
+def read_inventory_history(product_id: int, limit: int = 10, db: Session = Depends(get_read_db)):
     # Check if product exists
     product = crud.get_product(db, product_id=product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     inventory_logs = crud.get_inventory_history(db, product_id=product_id, limit=limit)
+    if serializers.fast_json_enabled():
+        return serializers.fast_json(inventory_logs, serializers.inventory_log_record)
     return inventory_logs
 
 
 # Sales routes
-@router.post("/sales/", response_model=schemas.Sale)
+def check_sale_total(sale: schemas.SaleCreate):
+    calculated_total = sum(item.subtotal for item in sale.items)
+    if abs(calculated_total - sale.total_amount) > 0.01:  # Allow small rounding differences
+        raise HTTPException(status_code=400, detail="Total amount doesn't match sum of item subtotals")
+
+
+@router.post("/sales/", response_model=schemas.Sale, responses={202: {"model": schemas.SaleIngestStatus}})
 def create_sale(sale: schemas.SaleCreate, db: Session = Depends(get_db)):
+    if ingest.sales_ingest is not None:
+        return accept_sale(sale)
+
+    # Load every product and stock level in the sale with two queries; the per-item
+    # lookups below and in crud.create_sale are then answered by the session
+    product_ids = [item.product_id for item in sale.items]
+    products = crud.get_products_by_ids(db, product_ids=product_ids)
+    crud.preload_inventory(db, product_ids=product_ids)
+
     # Validate all products in the sale
     for item in sale.items:
-        product = crud.get_product(db, product_id=item.product_id)
+        product = products.get(item.product_id)
         if not product:
             raise HTTPException(status_code=404, detail=f"Product with ID {item.product_id} not found")
         
@@ -160,21 +270,80 @@ def create_sale(sale: schemas.SaleCreate, db: Session = Depends(get_db)):
             raise HTTPException(status_code=400, detail=f"Not enough inventory for product {product.name} (ID: {product.id})")
     
     # Validate total amount
-    calculated_total = sum(item.subtotal for item in sale.items)
-    if abs(calculated_total - sale.total_amount) > 0.01:  # Allow small rounding differences
-        raise HTTPException(status_code=400, detail="Total amount doesn't match sum of item subtotals")
+    check_sale_total(sale)
     
     return crud.create_sale(db=db, sale=sale)
 
 
+def accept_sale(sale: schemas.SaleCreate):
+    # Ingest mode: products are checked against the cached catalog here and stock when the
+    # sale is committed, so a sale can still fail after its 202
+    try:
+        stocked_product_ids = ingest.sales_ingest.catalog.stocked_product_ids()
+    except ingest.IngestUnavailable as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    for item in sale.items:
+        if item.product_id not in stocked_product_ids:
+            raise HTTPException(status_code=404, detail=f"Product with ID {item.product_id} not found")
+    check_sale_total(sale)
+
+    try:
+        tracking_id = ingest.sales_ingest.submit(sale)
+    except OSError:
+        ingest.logger.exception("Appending sale %s to the ingest log failed", sale.order_id)
+        raise HTTPException(status_code=503, detail="The sale could not be recorded, try again later")
+    return JSONResponse(
+        status_code=202,
+        content={"tracking_id": tracking_id, "status": "pending"},
+        headers={"Location": f"/api/v1/sales/ingest/{tracking_id}"}
+    )
+
+
+@router.get("/sales/ingest/{tracking_id}", response_model=schemas.SaleIngestStatus)
+def read_sale_ingest_status(tracking_id: str, db: Session = Depends(get_db)):
+    result = db.get(models.SaleIngestResult, tracking_id)
+    if result is not None:
+        return result
+    if ingest.sales_ingest is not None and ingest.sales_ingest.is_pending(tracking_id):
+        return {"tracking_id": tracking_id, "status": "pending"}
+    raise HTTPException(status_code=404, detail="Tracking ID not found")
+
+
 @router.get("/sales/", response_model=List[schemas.Sale])
-def read_sales(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    sales = crud.get_sales(db, skip=skip, limit=limit)
-    return sales
+def read_sales(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    marketplace: Optional[str] = None,
+    start_date: Optional[date] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[date] = Query(None, description="End date (YYYY-MM-DD), inclusive"),
+    min_total: Optional[float] = None,
+    max_total: Optional[float] = None,
+    product_id: Optional[int] = Query(None, description="Only sales containing this product"),
+    order_id_prefix: Optional[str] = Query(None, min_length=1),
+    cursor: Optional[int] = Query(None, description="X-Next-Cursor of the previous page"),
+    db: Session = Depends(get_read_db)
+):
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="Start date must be before end date")
+    if min_total is not None and max_total is not None and min_total > max_total:
+        raise HTTPException(status_code=400, detail="min_total must not be greater than max_total")
+
+    filters = schemas.SalesFilter(
+        marketplace=marketplace, start_date=start_date, end_date=end_date, min_total=min_total,
+        max_total=max_total, product_id=product_id, order_id_prefix=order_id_prefix
+    )
+    sales = crud.get_sales(db, skip=skip, limit=limit, filters=filters, cursor=cursor)
+    encoded = serializers.encoded_response(request, sales, serializers.sale_record)
+    # A full page may have more after it
+    if sales and len(sales) == limit:
+        (response if encoded is None else encoded).headers["X-Next-Cursor"] = str(sales[-1].id)
+    return sales if encoded is None else encoded
 
 
 @router.get("/sales/{sale_id}", response_model=schemas.Sale)
-def read_sale(sale_id: int, db: Session = Depends(get_db)):
+def read_sale(sale_id: int, db: Session = Depends(get_read_db)):
     db_sale = crud.get_sale(db, sale_id=sale_id)
     if db_sale is None:
         raise HTTPException(status_code=404, detail="Sale not found")
@@ -184,9 +353,10 @@ def read_sale(sale_id: int, db: Session = Depends(get_db)):
 # Analytics routes
 @router.get("/analytics/sales/", response_model=schemas.SalesSummary)
 def get_sales_analytics(
+    request: Request,
     start_date: date = Query(..., description="Start date (YYYY-MM-DD)"),
     end_date: date = Query(..., description="End date (YYYY-MM-DD)"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(analytics_read_db)
 ):
     start_datetime = datetime.combine(start_date, datetime.min.time())
     end_datetime = datetime.combine(end_date, datetime.max.time())
@@ -194,15 +364,20 @@ def get_sales_analytics(
     if start_date > end_date:
         raise HTTPException(status_code=400, detail="Start date must be before end date")
     
-    sales_summary = crud.get_sales_summary(db, start_date=start_datetime, end_date=end_datetime)
-    return sales_summary
+    sales_summary = analytics_flight.do(
+        ("sales_summary", start_datetime, end_datetime),
+        lambda: crud.get_sales_summary(db, start_date=start_datetime, end_date=end_datetime)
+    )
+    response = serializers.encoded_response(request, sales_summary, fast_json=False)
+    return sales_summary if response is None else response
 
 
 @router.get("/analytics/revenue/{period}", response_model=schemas.RevenueSummary)
 def get_revenue_analytics(
+    request: Request,
     period: str,
     date: Optional[date] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(analytics_read_db)
 ):
     valid_periods = ["day", "week", "month", "year"]
     if period not in valid_periods:
@@ -213,31 +388,94 @@ def get_revenue_analytics(
         date = datetime.now().date()
     
     current_datetime = datetime.combine(date, datetime.min.time())
-    revenue_data = crud.get_revenue_comparison(db, period=period, current_date=current_datetime)
-    return revenue_data
+    revenue_data = analytics_flight.do(
+        ("revenue", period, current_datetime),
+        lambda: crud.get_revenue_comparison(db, period=period, current_date=current_datetime)
+    )
+    response = serializers.encoded_response(request, revenue_data, fast_json=False)
+    return revenue_data if response is None else response
 
 
 @router.post("/analytics/product-sales/", response_model=List)
 def get_product_sales_analytics(
+    request: Request,
     query: schemas.ProductSalesQuery,
-    db: Session = Depends(get_db)
+    db: Session = Depends(analytics_read_db),
+    primary_db: Session = Depends(get_db)
 ):
     if query.start_date > query.end_date:
         raise HTTPException(status_code=400, detail="Start date must be before end date")
     
-    sales_data = crud.get_product_sales(db, query=query)
+    def product_sales():
+        # Estimate the result size before running an open-ended query
+        check_row_budget(lambda: crud.estimate_product_sales_rows(db, query), settings.analytics_row_budget)
+        # Rows already carry exactly the response columns
+        return [row._asdict() for row in crud.get_product_sales(db, query=query)]
     
-    # Transform the result into a more usable format
-    result = []
-    for sale_item, transaction_date, product_name, category_name in sales_data:
-        result.append({
-            "product_id": sale_item.product_id,
-            "product_name": product_name,
-            "category_name": category_name,
-            "quantity": sale_item.quantity,
-            "unit_price": sale_item.unit_price,
-            "subtotal": sale_item.subtotal,
-            "transaction_date": transaction_date
-        })
-    
-    return result
+    try:
+        result = analytics_flight.do(
+            ("product_sales", query.start_date, query.end_date, query.product_id, query.category_id),
+            product_sales
+        )
+    except RowBudgetExceeded as exc:
+        if settings.analytics_over_budget_action != "job":
+            raise HTTPException(status_code=400, detail=f"{exc}; {NARROW_QUERY_HINT}")
+        job = analytics_jobs.submit(primary_db, schemas.AnalyticsJobCreate(kind="product_sales", **query.dict()))
+        return JSONResponse(
+            status_code=202,
+            content=jsonable_encoder(job_response(job, limit=0)),
+            headers={"Location": f"/api/v1/analytics/jobs/{job.id}"}
+        )
+    response = serializers.encoded_response(request, result)
+    return result if response is None else response
+
+
+# Analytics job routes
+@router.post("/analytics/jobs", response_model=schemas.AnalyticsJob, status_code=202)
+def create_analytics_job(query: schemas.AnalyticsJobCreate, db: Session = Depends(get_db)):
+    try:
+        validate_job(query)
+        job = analytics_jobs.submit(db, query)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="Too many analytics jobs queued, try again later")
+    return job_response(job, limit=0)
+
+
+@router.get("/analytics/jobs/{job_id}", response_model=schemas.AnalyticsJob)
+def read_analytics_job(job_id: str, offset: int = 0, limit: int = Query(1000, le=10000), db: Session = Depends(get_db)):
+    # Job state is written on the primary, so it is read there too
+    job = analytics_jobs.get(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Analytics job not found")
+    return job_response(job, offset=offset, limit=limit)
+
+
+# Change feed routes
+@router.get("/changes/{feed}", response_class=StreamingResponse)
+def read_changes(
+    feed: str,
+    since: int = Query(0, ge=0, description="X-Next-Cursor of the previous page; 0 for the full history"),
+    limit: int = Query(1000, ge=1),
+    db: Session = Depends(get_read_db)
+):
+    if feed not in crud.CHANGE_FEED_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown change feed, use one of: {', '.join(crud.CHANGE_FEED_TABLES)}")
+    if feed == "sales" and sharding.shards is not None:
+        # Each shard numbers its own changes, so there is no single cursor over them
+        raise HTTPException(status_code=501, detail="The sales change feed is not available with sharded storage")
+    rows = crud.get_changes(
+        db, feed, since=since, limit=min(limit, settings.change_feed_max_limit),
+        settle_seconds=settings.change_feed_settle_seconds
+    )
+    next_cursor = rows[-1]["change_seq"] if rows else since
+    return StreamingResponse(
+        change_feed.ndjson_chunks(rows), media_type="application/x-ndjson", headers={"X-Next-Cursor": str(next_cursor)}
+    )
+
+
+# Admin routes
+@router.get("/admin/slow-queries", response_model=List[schemas.SlowQuery], dependencies=[Depends(require_admin)])
+def read_slow_queries(limit: int = 50):
+    return slow_query_log.recent(limit)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, List, Literal, Optional
 from datetime import datetime, date
 
 
@@ -40,6 +40,32 @@ class Product(ProductBase):
         orm_mode = True
 
 
+class ProductImportRow(BaseModel):
+    # One line of a catalog import; the category is given by name or by ID
+    name: str
+    description: Optional[str] = None
+    price: float = Field(ge=0)
+    sku: str = Field(min_length=1)
+    category: Optional[str] = None
+    category_id: Optional[int] = None
+    quantity: int = Field(0, ge=0)
+    low_stock_threshold: int = Field(10, ge=0)
+
+
+class ProductImportError(BaseModel):
+    line: int
+    error: str
+
+
+class ProductImportResult(BaseModel):
+    inserted: int
+    updated: int
+    rejected: int
+    inventory_created: int
+    # The first errors only, so a bad file does not produce a huge response
+    errors: List[ProductImportError]
+
+
 class InventoryBase(BaseModel):
     product_id: int
     quantity: int
@@ -102,6 +128,16 @@ class Sale(SaleBase):
         orm_mode = True
 
 
+class SaleIngestStatus(BaseModel):
+    tracking_id: str
+    status: str  # pending, committed or failed
+    sale_id: Optional[int] = None
+    error: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+
 class InventoryLogBase(BaseModel):
     product_id: int
     previous_quantity: int
@@ -133,6 +169,16 @@ class ProductSalesQuery(DateRangeQuery):
     category_id: Optional[int] = None
 
 
+class SalesFilter(BaseModel):
+    marketplace: Optional[str] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    min_total: Optional[float] = None
+    max_total: Optional[float] = None
+    product_id: Optional[int] = None
+    order_id_prefix: Optional[str] = None
+
+
 class SalesSummary(BaseModel):
     total_sales: float
     total_orders: int
@@ -154,3 +200,65 @@ class LowStockProduct(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+# Batch lookup schemas
+
+class ProductLookup(BaseModel):
+    id: int
+    found: bool
+    product: Optional[Product] = None
+
+
+class InventoryLookup(BaseModel):
+    product_id: int
+    found: bool
+    inventory: Optional[Inventory] = None
+
+
+class ProductDetailLookup(BaseModel):
+    id: int
+    found: bool
+    product: Optional[Product] = None
+    inventory: Optional[Inventory] = None
+
+
+# Admin schemas
+
+class SlowQuery(BaseModel):
+    id: int
+    function: str
+    statement: str
+    parameters: Any = None
+    rowcount: int
+    elapsed_ms: float
+    recorded_at: datetime
+    plan: Optional[str] = None
+
+
+# Analytics job schemas
+
+class AnalyticsJobCreate(BaseModel):
+    kind: Literal["product_sales", "sales_summary", "revenue"]
+    # product_sales and sales_summary
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    # product_sales filters
+    product_id: Optional[int] = None
+    category_id: Optional[int] = None
+    # revenue
+    period: Optional[str] = None
+    current_date: Optional[date] = None
+
+
+class AnalyticsJob(BaseModel):
+    id: str
+    kind: str
+    status: str
+    progress: float
+    created_at: datetime
+    updated_at: datetime
+    error: Optional[str] = None
+    result_count: Optional[int] = None
+    result: Any = None
+    next_offset: Optional[int] = None
@@ -1,9 +1,11 @@
+import os
 import random
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine
 import models
 from models import Base
+from partitions import ensure_partitions
 
 # Categories data
 categories = [
@@ -183,6 +185,9 @@ def seed_database():
         
         sales = generate_sales(db, 500, start_date, end_date)
         
+        # On a partitioned Postgres database every month of the history needs its partition
+        ensure_partitions(db.connection(), start_date, end_date)
+        
         # Add sales to database
         for sale_data in sales:
             items = sale_data.pop("items")
@@ -192,6 +197,7 @@ def seed_database():
             
             for item_data in items:
                 item_data["sale_id"] = sale.id
+                item_data["transaction_date"] = sale.transaction_date
                 sale_item = models.SaleItem(**item_data)
                 db.add(sale_item)
                 
@@ -220,4 +226,7 @@ def seed_database():
 
 
 if __name__ == "__main__":
+    # Load tests set this so every run starts from the same data
+    if os.getenv("SEED_RANDOM_SEED"):
+        random.seed(int(os.getenv("SEED_RANDOM_SEED")))
     seed_database() 
\ No newline at end of file
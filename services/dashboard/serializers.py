@@ -0,0 +1,174 @@
+"""
+Fast serialization path for list endpoints.
+
+When ``settings.fast_json_responses`` is enabled, list routes skip the
+``response_model`` validation round trip and build plain dicts straight from the
+ORM rows, which are then encoded with orjson. The ``response_model`` declared on
+each route is left untouched so the OpenAPI schema stays the same.
+
+Routes that opt into binary encodings also answer ``Accept: application/msgpack``
+and ``Accept: application/vnd.apache.arrow.stream`` with the same records.
+"""
+from datetime import date, datetime
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is optional
+    msgpack = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pyarrow = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        # OPT_UTC_Z matches the "Z" suffix pydantic uses for UTC datetimes
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+class MsgPackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content) -> bytes:
+        return msgpack.packb(content, default=_encode_msgpack_value)
+
+
+class ArrowResponse(Response):
+    media_type = ARROW_MEDIA_TYPE
+
+    def render(self, content) -> bytes:
+        if isinstance(content, dict):
+            content = [content]
+        table = pyarrow.Table.from_pylist(content)
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+def _encode_msgpack_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__} to msgpack")
+
+
+def binary_response_class(request: Request):
+    """
+    Return the binary response class the client asked for, if it is enabled and installed
+    """
+    accept = request.headers.get("accept", "")
+    if "msgpack" in settings.binary_encodings and msgpack is not None:
+        if any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES):
+            return MsgPackResponse
+    if "arrow" in settings.binary_encodings and pyarrow is not None:
+        if ARROW_MEDIA_TYPE in accept:
+            return ArrowResponse
+    return None
+
+
+def fast_json_enabled() -> bool:
+    return settings.fast_json_responses and orjson is not None
+
+
+def category_record(category):
+    return {
+        "name": category.name,
+        "description": category.description,
+        "id": category.id,
+    }
+
+
+def product_record(product):
+    return {
+        "name": product.name,
+        "description": product.description,
+        "price": product.price,
+        "sku": product.sku,
+        "category_id": product.category_id,
+        "id": product.id,
+        "created_at": product.created_at,
+        "updated_at": product.updated_at,
+    }
+
+
+def inventory_record(inventory):
+    return {
+        "product_id": inventory.product_id,
+        "quantity": inventory.quantity,
+        "low_stock_threshold": inventory.low_stock_threshold,
+        "id": inventory.id,
+        "last_restocked": inventory.last_restocked,
+        "updated_at": inventory.updated_at,
+    }
+
+
+def sale_item_record(item):
+    return {
+        "product_id": item.product_id,
+        "quantity": item.quantity,
+        "unit_price": item.unit_price,
+        "subtotal": item.subtotal,
+        "id": item.id,
+        "sale_id": item.sale_id,
+    }
+
+
+def sale_record(sale):
+    return {
+        "order_id": sale.order_id,
+        "total_amount": sale.total_amount,
+        "marketplace": sale.marketplace,
+        "id": sale.id,
+        "transaction_date": sale.transaction_date,
+        "items": [sale_item_record(item) for item in sale.items],
+    }
+
+
+def inventory_log_record(log):
+    return {
+        "product_id": log.product_id,
+        "previous_quantity": log.previous_quantity,
+        "new_quantity": log.new_quantity,
+        "change_reason": log.change_reason,
+        "id": log.id,
+        "timestamp": log.timestamp,
+    }
+
+
+def fast_json(rows, record):
+    return FastJSONResponse([record(row) for row in rows])
+
+
+def encoded_response(request: Request, content, record=None, fast_json: bool = True) -> Optional[Response]:
+    """
+    Encode ``content`` with a negotiated binary codec, or with orjson when the
+    fast path is on. Returns None when the route should fall back to its
+    response_model.
+    """
+    response_class = binary_response_class(request)
+    if response_class is None:
+        if not fast_json or not fast_json_enabled():
+            return None
+        response_class = FastJSONResponse
+    if record is not None:
+        content = [record(row) for row in content]
+    return response_class(content)
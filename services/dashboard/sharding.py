@@ -0,0 +1,160 @@
+"""
+Optional horizontal sharding of sales data.
+
+With ``settings.shard_urls`` set, ``sales`` and ``sale_items`` are stored in
+those databases instead of the primary. A sale is written to the shard
+picked by a stable hash of its order ID. Its ID is allocated so that
+``(id - 1) % len(shard_urls)`` is that shard, so reads by ID go straight to
+it. The catalog, inventory and inventory_logs stay on the primary: a sale's
+stock changes are committed there once the sale is stored on its shard (the
+two commits are not atomic). Listings and analytics run on every shard in
+parallel, and ``crud`` merges the partial results.
+
+Every shard needs the schema. ``python sharding.py migrate`` runs the
+migrations on each shard. On Postgres it also drops the sale_items foreign key
+to the catalog, which is not on the shards, and makes the sales ID sequence
+step by the number of shards.
+
+Usage:
+    python sharding.py migrate
+    python sharding.py locate ORDER_ID
+"""
+import argparse
+import functools
+import itertools
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session, sessionmaker
+
+import database
+import migrations
+import models
+from query_limits import set_statement_timeout, statement_timeout
+
+sales_table = models.Sale.__table__
+
+
+class ShardSet:
+    def __init__(self, engines):
+        self.engines = list(engines)
+        self.sessions = [sessionmaker(autocommit=False, autoflush=False, bind=engine) for engine in self.engines]
+        self._executor = ThreadPoolExecutor(max_workers=len(self.engines), thread_name_prefix="shard")
+
+    def __len__(self):
+        return len(self.engines)
+
+    def index_for_order(self, order_id: str) -> int:
+        # crc32 rather than hash(), which differs between processes
+        return zlib.crc32(order_id.encode()) % len(self.engines)
+
+    def index_for_sale(self, sale_id: int) -> int:
+        return (sale_id - 1) % len(self.engines)
+
+    def run(self, index: int, fn: Callable[[Session], object], timeout_ms: int = 0):
+        db = self.sessions[index]()
+        set_statement_timeout(db, timeout_ms)
+        try:
+            return fn(db)
+        finally:
+            db.close()
+
+    def scatter(self, fn: Callable[[Session], object], timeout_ms: int = 0) -> List:
+        """
+        Run fn with a session on every shard in parallel and return the results in shard order.
+        Pass the statement timeout of the request's own session as timeout_ms so it bounds the shards too.
+        """
+        run = functools.partial(self.run, fn=fn, timeout_ms=timeout_ms)
+        return list(self._executor.map(run, range(len(self.engines))))
+
+    def next_sale_id(self, db: Session, index: int) -> Optional[int]:
+        """
+        The ID for a new sale on shard ``index``. SQLite IDs are allocated here,
+        as the next one after the shard's highest; Postgres shards return None and
+        use their sales ID sequence. Call it first in the transaction that stores
+        the sale: on SQLite it takes the shard's write lock until that commits,
+        so concurrent sales cannot be given the same ID.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            return None
+        db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+        highest = db.execute(select(func.max(sales_table.c.id))).scalar()
+        return index + 1 if highest is None else highest + len(self.engines)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+def scatter_gather(merge: Callable[[List], object]):
+    """
+    Decorator for crud queries over the sharded tables. With sharding on, the
+    query runs on every shard instead of the session it is given, and merge
+    combines the per-shard results.
+    """
+    def decorator(query):
+        @functools.wraps(query)
+        def wrapper(db: Session, *args, **kwargs):
+            if shards is None:
+                return query(db, *args, **kwargs)
+            return merge(shards.scatter(lambda shard_db: query(shard_db, *args, **kwargs), timeout_ms=statement_timeout(db)))
+        return wrapper
+    return decorator
+
+
+def concat(parts: List[List]) -> List:
+    return list(itertools.chain.from_iterable(parts))
+
+
+def add_up(parts: List[dict]) -> dict:
+    return {key: sum(part[key] for part in parts) for key in parts[0]}
+
+
+def prepare_postgres_shard(conn, index: int, count: int):
+    # The catalog is only on the primary, so product IDs cannot be checked here
+    for row in conn.execute(text(
+        "SELECT conname FROM pg_constraint WHERE contype = 'f' "
+        "AND conrelid = 'sale_items'::regclass AND confrelid = 'products'::regclass"
+    )):
+        conn.execute(text(f'ALTER TABLE sale_items DROP CONSTRAINT "{row.conname}"'))
+
+    # Continue after the highest existing ID with the next one that maps to this shard
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence('sales', 'id')")).scalar()
+    highest = conn.execute(select(func.coalesce(func.max(sales_table.c.id), 0))).scalar()
+    restart = highest + 1 + (index - highest) % count
+    conn.execute(text(f"ALTER SEQUENCE {sequence} INCREMENT BY {count} RESTART WITH {restart}"))
+
+
+def migrate(shard_set: ShardSet) -> List[List[str]]:
+    applied = []
+    for index, engine in enumerate(shard_set.engines):
+        applied.append(migrations.upgrade(engine))
+        if engine.dialect.name == "postgresql":
+            with engine.begin() as conn:
+                prepare_postgres_shard(conn, index, len(shard_set))
+    return applied
+
+
+shards = ShardSet(database.shard_engines) if database.shard_engines else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate", help="apply the migrations to every shard")
+    locate = subparsers.add_parser("locate", help="print the shard an order ID is stored on")
+    locate.add_argument("order_id")
+    args = parser.parse_args()
+
+    if shards is None:
+        parser.error("SHARD_URLS is not set")
+    if args.command == "migrate":
+        for index, applied in enumerate(migrate(shards)):
+            print(f"shard {index}: {', '.join(applied) or 'up to date'}")
+    else:
+        print(shards.index_for_order(args.order_id))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Single-flight coalescing of identical concurrent calls.
+
+When many dashboards ask for the same analytics at the same moment, the
+first request for a key (the leader) runs the query and every request that
+arrives while it is in flight (the waiters) receives the leader's result or
+exception instead of running the query again. Nothing is cached: the key is
+released as soon as the leader finishes, so later requests query afresh.
+
+Results are shared between requests, so coalesced functions must return
+plain data (dicts, lists of dicts) rather than ORM objects tied to the
+leader's session.
+
+If the leader is interrupted by something other than an ordinary exception
+(cancellation, worker shutdown), waiters are not given that error; one of
+them becomes the new leader and runs the call itself.
+"""
+import threading
+from concurrent.futures import CancelledError, Future
+from typing import Any, Callable, Hashable
+
+from metrics import Counter, registry
+
+coalesced_calls = registry.register(Counter(
+    "singleflight_calls_total", "Coalesced calls by group and role (leader ran the query, waiter shared it)",
+    ["group", "role"]
+))
+
+
+class SingleFlight:
+    def __init__(self, group: str):
+        self.group = group
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = Future()
+                    self._calls[key] = future
+
+            if leader:
+                coalesced_calls.inc((self.group, "leader"))
+                return self._lead(key, future, fn)
+
+            coalesced_calls.inc((self.group, "waiter"))
+            try:
+                return future.result()
+            except CancelledError:
+                # The leader gave up without a result; retry, possibly as the new leader
+                continue
+
+    def _lead(self, key, future: Future, fn):
+        try:
+            result = fn()
+        except Exception as exc:
+            self._release(key)
+            future.set_exception(exc)
+            raise
+        except BaseException:
+            self._release(key)
+            future.cancel()
+            raise
+        self._release(key)
+        future.set_result(result)
+        return result
+
+    def _release(self, key):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+analytics_flight = SingleFlight("analytics")
+inventory_flight = SingleFlight("inventory")
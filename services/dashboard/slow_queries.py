@@ -0,0 +1,126 @@
+"""
+Slow-query log with automatic plan capture.
+
+Statements issued from ``crud`` that take longer than
+``settings.slow_query_threshold_ms`` are logged together with their bound
+parameters, calling function, row count and elapsed time. The last
+``settings.slow_query_log_size`` entries are kept for the admin endpoint.
+
+For SELECT statements the query plan is captured on a background thread, so
+the request that ran the slow query is not delayed. On Postgres this uses
+``EXPLAIN (ANALYZE, BUFFERS)``, and on SQLite ``EXPLAIN QUERY PLAN``. Other
+statements are never re-run, because EXPLAIN ANALYZE executes them.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from itertools import count
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+from metrics import query_origin
+
+logger = logging.getLogger("slow_queries")
+
+MAX_PARAMETER_LENGTH = 200
+MAX_PENDING_EXPLAINS = 10
+
+
+def _loggable_parameters(parameters):
+    def shorten(value):
+        text = repr(value)
+        return text if len(text) <= MAX_PARAMETER_LENGTH else text[:MAX_PARAMETER_LENGTH] + "..."
+
+    if isinstance(parameters, dict):
+        return {key: shorten(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [shorten(value) for value in parameters]
+    return shorten(parameters)
+
+
+def explain(engine, statement, parameters):
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            rows = conn.exec_driver_sql("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters).all()
+            return "\n".join(row[0] for row in rows)
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+        return "\n".join(row[-1] for row in rows)
+
+
+class SlowQueryLog:
+    def __init__(self, size: int):
+        self.entries = deque(maxlen=size)
+        self._ids = count(1)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+        self._pending = set()
+
+    def record(self, engine, statement, parameters, function, rowcount, elapsed):
+        entry = {
+            "id": next(self._ids),
+            "function": function,
+            "statement": statement,
+            "parameters": _loggable_parameters(parameters),
+            "rowcount": rowcount,
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "recorded_at": datetime.now(),
+            "plan": None,
+        }
+        with self._lock:
+            self.entries.append(entry)
+        logger.warning(
+            "Slow query in %s took %.1f ms (%s rows): %s %s",
+            function, elapsed * 1000, rowcount, statement, entry["parameters"]
+        )
+
+        if settings.slow_query_explain and statement.lstrip()[:6].upper() == "SELECT":
+            with self._lock:
+                # Under a storm of slow queries, skip plans rather than queue them without bound
+                if len(self._pending) >= MAX_PENDING_EXPLAINS:
+                    return
+                future = self._executor.submit(self._capture_plan, entry, engine, statement, parameters)
+                self._pending.add(future)
+            future.add_done_callback(self._pending.discard)
+
+    def _capture_plan(self, entry, engine, statement, parameters):
+        try:
+            entry["plan"] = explain(engine, statement, parameters)
+        except Exception as exc:
+            entry["plan"] = f"EXPLAIN failed: {exc}"
+
+    def recent(self, limit: int = None):
+        with self._lock:
+            entries = list(self.entries)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def wait_for_plans(self, timeout: float = None):
+        wait(list(self._pending), timeout=timeout)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+
+slow_query_log = SlowQueryLog(settings.slow_query_log_size)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_slow_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context._slow_query_started_at = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _check_slow_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._slow_query_started_at
+    if elapsed * 1000 < settings.slow_query_threshold_ms:
+        return
+    function = query_origin()
+    if function == "other":
+        return
+    slow_query_log.record(conn.engine, statement, parameters, function, cursor.rowcount, elapsed)
@@ -1,133 +1,160 @@
-import json
+"""
+Load-test profiles for the dashboard API.
+
+Each user class is one traffic profile; tests/run_load_test.py runs them
+headless and checks the results against SLO files. Run one interactively with:
+
+    locust -f tests/locustfile.py DashboardUser
+
+Every user draws from its own random generator seeded from LOAD_SEED and its
+user number, so a given seed replays the same request mix. Order IDs include
+LOAD_RUN_ID, so runs against the same database never collide.
+"""
+import itertools
+import os
 import random
+import uuid
 from datetime import date, timedelta
 from locust import HttpUser, task, between
 
+LOAD_SEED = int(os.getenv("LOAD_SEED", "42"))
+LOAD_RUN_ID = os.getenv("LOAD_RUN_ID") or uuid.uuid4().hex[:8]
+MARKETPLACES = ["Amazon", "Walmart", "Direct"]
 
-class EcommerceAdminUser(HttpUser):
-    wait_time = between(1, 3)  # Wait between 1 and 3 seconds between tasks
-    
-    # Simulate common API endpoints that would be frequently accessed
-    
-    @task(5)  # Higher weight for more common operations
-    def get_dashboard_data(self):
-        # Get today's and last week's date for analytics
+# between() draws from the global generator
+random.seed(LOAD_SEED)
+
+
+class SeededUser(HttpUser):
+    abstract = True
+    # Throughput runs set both to 0 to saturate the server
+    wait_time = between(float(os.getenv("LOCUST_MIN_WAIT", "1")), float(os.getenv("LOCUST_MAX_WAIT", "3")))
+    _user_numbers = itertools.count()
+
+    def on_start(self):
+        self.user_number = next(self._user_numbers)
+        self.rng = random.Random(f"{LOAD_SEED}-{type(self).__name__}-{self.user_number}")
+        self.order_numbers = itertools.count()
+        self.product_ids = [product["id"] for product in self.client.get("/api/v1/products/?limit=100").json()]
+        self.category_ids = [category["id"] for category in self.client.get("/api/v1/categories/").json()]
+
+    def next_order_id(self):
+        return f"ORD-LOAD-{LOAD_RUN_ID}-{type(self).__name__}-{self.user_number}-{next(self.order_numbers)}"
+
+    def date_range(self, days):
         today = date.today()
-        last_week = today - timedelta(days=7)
-        
-        # Get today's sales summary
+        return (today - timedelta(days=days)).isoformat(), today.isoformat()
+
+
+class DashboardUser(SeededUser):
+    """
+    Read-heavy dashboard: summaries, product and inventory pages
+    """
+    weight = 6
+
+    @task(5)
+    def get_dashboard_data(self):
+        start_date, end_date = self.date_range(0)
         self.client.get(
-            f"/api/v1/analytics/sales/?start_date={today.isoformat()}&end_date={today.isoformat()}"
+            f"/api/v1/analytics/sales/?start_date={start_date}&end_date={end_date}",
+            name="/api/v1/analytics/sales/"
         )
-        
-        # Get weekly revenue comparison
-        self.client.get(f"/api/v1/analytics/revenue/week")
-        
-        # Get low stock products
+        self.client.get("/api/v1/analytics/revenue/week", name="/api/v1/analytics/revenue/{period}")
         self.client.get("/api/v1/inventory/low-stock/")
-    
+
     @task(3)
     def browse_products(self):
-        # Get all categories
-        with self.client.get("/api/v1/categories/") as response:
-            if response.status_code == 200:
-                categories = response.json()
-                if categories:
-                    # Randomly select a category to view its products
-                    category = random.choice(categories)
-                    self.client.get(f"/api/v1/products/?category_id={category['id']}")
-        
-        # Get all products (paginated)
-        self.client.get("/api/v1/products/?skip=0&limit=20")
-    
+        category_id = self.rng.choice(self.category_ids)
+        self.client.get(f"/api/v1/products/?category_id={category_id}", name="/api/v1/products/?category_id")
+        self.client.get("/api/v1/products/?skip=0&limit=20", name="/api/v1/products/")
+
     @task(2)
     def check_inventory(self):
-        # Get all inventory
-        with self.client.get("/api/v1/inventory/") as response:
-            if response.status_code == 200:
-                inventory_items = response.json()
-                if inventory_items:
-                    # Randomly select an inventory item to view details
-                    inventory = random.choice(inventory_items)
-                    self.client.get(f"/api/v1/inventory/{inventory['product_id']}")
-    
+        self.client.get("/api/v1/inventory/")
+        # View the details of a few products in one batch
+        selected = self.rng.sample(self.product_ids, min(5, len(self.product_ids)))
+        product_ids = ",".join(str(product_id) for product_id in selected)
+        self.client.get(f"/api/v1/products/details?ids={product_ids}", name="/api/v1/products/details")
+
     @task(1)
+    def view_sale(self):
+        self.client.get("/api/v1/sales/?limit=20", name="/api/v1/sales/")
+
+
+class FlashSaleUser(SeededUser):
+    """
+    Write burst: many small orders on a few products, with restocks keeping them available
+    """
+    weight = 2
+
+    def on_start(self):
+        super().on_start()
+        self.hot_products = {
+            product["id"]: product["price"]
+            for product in self.client.get("/api/v1/products/?limit=5").json()
+        }
+
+    @task(8)
     def create_sale(self):
-        # First get some products to create a sale
-        with self.client.get("/api/v1/products/?limit=5") as response:
-            if response.status_code == 200:
-                products = response.json()
-                if products:
-                    # Create a sale with 1-3 random products
-                    num_items = random.randint(1, min(3, len(products)))
-                    selected_products = random.sample(products, num_items)
-                    
-                    # Calculate total and create sale items
-                    total_amount = 0
-                    items = []
-                    
-                    for product in selected_products:
-                        quantity = random.randint(1, 3)
-                        unit_price = product["price"]
-                        subtotal = unit_price * quantity
-                        
-                        items.append({
-                            "product_id": product["id"],
-                            "quantity": quantity,
-                            "unit_price": unit_price,
-                            "subtotal": subtotal
-                        })
-                        
-                        total_amount += subtotal
-                    
-                    # Create the sale
-                    sale_data = {
-                        "order_id": f"ORD-LOAD-{random.randint(10000, 99999)}",
-                        "total_amount": total_amount,
-                        "marketplace": random.choice(["Amazon", "Walmart", "Direct"]),
-                        "items": items
-                    }
-                    
-                    self.client.post("/api/v1/sales/", json=sale_data)
-    
-    @task(1)
-    def update_inventory(self):
-        # Get all inventory
-        with self.client.get("/api/v1/inventory/") as response:
-            if response.status_code == 200:
-                inventory_items = response.json()
-                if inventory_items:
-                    # Randomly select an inventory item to update
-                    inventory = random.choice(inventory_items)
-                    
-                    # Update with a random quantity (±10 of current quantity)
-                    current_quantity = inventory["quantity"]
-                    new_quantity = max(0, current_quantity + random.randint(-10, 10))
-                    
-                    update_data = {
-                        "quantity": new_quantity
-                    }
-                    
-                    self.client.put(f"/api/v1/inventory/{inventory['product_id']}", json=update_data)
-    
+        items = []
+        for product_id in self.rng.sample(list(self.hot_products), self.rng.randint(1, min(3, len(self.hot_products)))):
+            quantity = self.rng.randint(1, 3)
+            unit_price = self.hot_products[product_id]
+            items.append({
+                "product_id": product_id,
+                "quantity": quantity,
+                "unit_price": unit_price,
+                "subtotal": unit_price * quantity
+            })
+        sale_data = {
+            "order_id": self.next_order_id(),
+            "total_amount": sum(item["subtotal"] for item in items),
+            "marketplace": self.rng.choice(MARKETPLACES),
+            "items": items
+        }
+        with self.client.post("/api/v1/sales/", json=sale_data, catch_response=True) as response:
+            # Selling out is an expected outcome of a flash sale, not a server error
+            if response.status_code == 400 and "Not enough inventory" in response.text:
+                response.success()
+
     @task(1)
+    def restock(self):
+        product_id = self.rng.choice(list(self.hot_products))
+        self.client.put(
+            f"/api/v1/inventory/{product_id}", json={"quantity": 1000}, name="/api/v1/inventory/{product_id}"
+        )
+
+
+class AnalyticsUser(SeededUser):
+    """
+    BI analyst: long date ranges, product sales breakdowns and revenue comparisons
+    """
+    weight = 2
+
+    @task(3)
     def view_product_analytics(self):
-        # Get product sales analytics for the past 30 days
-        today = date.today()
-        month_ago = today - timedelta(days=30)
-        
-        query_data = {
-            "start_date": month_ago.isoformat(),
-            "end_date": today.isoformat()
-        }
-        
-        # Optionally add product or category filters
-        if random.choice([True, False]):
-            # Get a random product ID between 1 and 25
-            query_data["product_id"] = random.randint(1, 25)
-        
-        if random.choice([True, False]):
-            # Get a random category ID between 1 and 5
-            query_data["category_id"] = random.randint(1, 5)
-        
-        self.client.post("/api/v1/analytics/product-sales/", json=query_data) 
\ No newline at end of file
+        start_date, end_date = self.date_range(self.rng.choice([30, 90, 365]))
+        query_data = {"start_date": start_date, "end_date": end_date}
+        if self.rng.random() < 0.5:
+            query_data["product_id"] = self.rng.choice(self.product_ids)
+        if self.rng.random() < 0.5:
+            query_data["category_id"] = self.rng.choice(self.category_ids)
+        self.client.post("/api/v1/analytics/product-sales/", json=query_data)
+
+    @task(2)
+    def view_sales_summary(self):
+        start_date, end_date = self.date_range(self.rng.choice([30, 90, 365]))
+        self.client.get(
+            f"/api/v1/analytics/sales/?start_date={start_date}&end_date={end_date}",
+            name="/api/v1/analytics/sales/"
+        )
+
+    @task(2)
+    def view_revenue(self):
+        period = self.rng.choice(["day", "week", "month", "year"])
+        self.client.get(f"/api/v1/analytics/revenue/{period}", name="/api/v1/analytics/revenue/{period}")
+
+    @task(1)
+    def view_inventory_history(self):
+        product_id = self.rng.choice(self.product_ids)
+        self.client.get(f"/api/v1/inventory/history/{product_id}", name="/api/v1/inventory/history/{product_id}")
\ No newline at end of file
@@ -0,0 +1,203 @@
+"""
+Run a load-test profile headless against a local server and gate it on SLOs.
+
+Starts uvicorn on a freshly migrated and seeded SQLite database, drives it
+with Locust for the chosen profile, writes per-endpoint p50/p95/p99, request
+rates and error rates to a JSON report, and exits non-zero when the report
+breaks the profile's SLO file (tests/load_slos/<profile>.json). With
+--baseline, endpoints whose p95 regressed by more than the SLO file's
+max_regression_percent also fail the run.
+
+Usage (from services/dashboard):
+    python tests/run_load_test.py --profile dashboard --output dashboard.json
+    python tests/run_load_test.py --profile mixed --baseline dashboard-main.json
+"""
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SLO_DIR = os.path.join(SERVICE_DIR, "tests", "load_slos")
+
+# Profile name -> Locust user classes in tests/locustfile.py
+PROFILES = {
+    "dashboard": ["DashboardUser"],
+    "flash-sale": ["FlashSaleUser"],
+    "bi": ["AnalyticsUser"],
+    "mixed": ["DashboardUser", "FlashSaleUser", "AnalyticsUser"],
+}
+
+# Regressions below this p95, or on endpoints with fewer requests than this, are treated as noise
+REGRESSION_FLOOR_MS = 10
+REGRESSION_MIN_REQUESTS = 50
+
+
+def wait_for_server(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start")
+
+
+def run_profile(args, workdir):
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'load.db')}",
+        SEED_RANDOM_SEED=str(args.seed),
+        LOAD_SEED=str(args.seed),
+        LOAD_RUN_ID=f"seed{args.seed}",
+        LOCUST_MIN_WAIT=str(args.min_wait),
+        LOCUST_MAX_WAIT=str(args.max_wait),
+    )
+    for script in ("migrate.py", "seed_data.py"):
+        subprocess.run([sys.executable, script], cwd=SERVICE_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL
+    )
+    try:
+        wait_for_server(f"http://127.0.0.1:{args.port}/")
+        subprocess.run(
+            [
+                sys.executable, "-m", "locust", "-f", "tests/locustfile.py", "--headless",
+                "-u", str(args.users), "-r", str(args.spawn_rate), "-t", args.duration,
+                "--host", f"http://127.0.0.1:{args.port}", "--csv", os.path.join(workdir, "load"),
+                "--only-summary", "--exit-code-on-error", "0", *PROFILES[args.profile],
+            ],
+            cwd=SERVICE_DIR, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+    finally:
+        server.terminate()
+        server.wait()
+    return os.path.join(workdir, "load_stats.csv")
+
+
+def endpoint_stats(row):
+    requests = int(row["Request Count"])
+    failures = int(row["Failure Count"])
+    return {
+        "requests": requests,
+        "failures": failures,
+        "error_rate": failures / requests if requests else 0.0,
+        "requests_per_sec": float(row["Requests/s"]),
+        "p50_ms": float(row["50%"]),
+        "p95_ms": float(row["95%"]),
+        "p99_ms": float(row["99%"]),
+    }
+
+
+def build_report(args, stats_path):
+    endpoints, aggregate = {}, None
+    with open(stats_path) as f:
+        for row in csv.DictReader(f):
+            if row["Name"] == "Aggregated":
+                aggregate = endpoint_stats(row)
+            else:
+                endpoints[f"{row['Type']} {row['Name']}"] = endpoint_stats(row)
+    return {
+        "profile": args.profile,
+        "seed": args.seed,
+        "users": args.users,
+        "duration": args.duration,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "aggregate": aggregate,
+        "endpoints": endpoints,
+    }
+
+
+def check_slos(report, slos, baseline=None):
+    violations = []
+
+    def check(name, stats, limits):
+        for metric, limit in limits.items():
+            if stats[metric] > limit:
+                violations.append(f"{name}: {metric} {stats[metric]:.4g} > {limit}")
+
+    check("aggregate", report["aggregate"], slos.get("aggregate", {}))
+    for name, limits in slos.get("endpoints", {}).items():
+        if name in report["endpoints"]:
+            check(name, report["endpoints"][name], limits)
+
+    max_regression = slos.get("max_regression_percent")
+    if baseline and max_regression is not None:
+        for name, stats in report["endpoints"].items():
+            before = baseline["endpoints"].get(name)
+            if before is None or stats["p95_ms"] < REGRESSION_FLOOR_MS:
+                continue
+            if min(before["requests"], stats["requests"]) < REGRESSION_MIN_REQUESTS:
+                continue
+            if stats["p95_ms"] > before["p95_ms"] * (1 + max_regression / 100):
+                violations.append(
+                    f"{name}: p95 regressed {before['p95_ms']:.0f}ms -> {stats['p95_ms']:.0f}ms (> {max_regression}%)"
+                )
+    return violations
+
+
+def print_report(report, baseline=None):
+    print(f"{'endpoint':<55}{'reqs':>7}{'err %':>7}{'p50':>7}{'p95':>7}{'p99':>7}{'p95 diff':>10}")
+    rows = sorted(report["endpoints"].items()) + [("Aggregated", report["aggregate"])]
+    for name, stats in rows:
+        before = baseline["endpoints"].get(name) if baseline else None
+        if name == "Aggregated" and baseline:
+            before = baseline["aggregate"]
+        diff = f"{stats['p95_ms'] - before['p95_ms']:>+9.0f}ms" if before else ""
+        print(
+            f"{name:<55}{stats['requests']:>7}{stats['error_rate'] * 100:>7.2f}"
+            f"{stats['p50_ms']:>7.0f}{stats['p95_ms']:>7.0f}{stats['p99_ms']:>7.0f}{diff}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="mixed")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--spawn-rate", type=float, default=10)
+    parser.add_argument("--duration", default="30s")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-wait", type=float, default=0.1)
+    parser.add_argument("--max-wait", type=float, default=0.5)
+    parser.add_argument("--port", type=int, default=6063)
+    parser.add_argument("--slos", default=None, help="SLO file, defaults to tests/load_slos/<profile>.json")
+    parser.add_argument("--baseline", default=None, help="earlier report to diff against")
+    parser.add_argument("--output", default=None, help="write the JSON report here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        report = build_report(args, run_profile(args, workdir))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    with open(args.slos or os.path.join(SLO_DIR, f"{args.profile}.json")) as f:
+        slos = json.load(f)
+
+    violations = check_slos(report, slos, baseline)
+    report["slo_violations"] = violations
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if violations:
+        print("\nSLO violations:")
+        for violation in violations:
+            print(f"  {violation}")
+        sys.exit(1)
+    print("\nAll SLOs met")
+
+
+if __name__ == "__main__":
+    main()
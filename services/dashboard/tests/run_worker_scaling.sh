@@ -0,0 +1,66 @@
+#!/bin/bash
+
+# Measure how throughput scales with the number of gunicorn workers.
+#
+# Usage (from the services/dashboard directory):
+#   ./tests/run_worker_scaling.sh [worker counts...]     # defaults to 1 2 4
+#
+# Uses DATABASE_URL when set, otherwise a seeded SQLite file. Every run starts
+# the production profile (gunicorn.conf.py), drives it with Locust in headless
+# mode with no wait time between tasks, and reports requests/sec and latency.
+
+GREEN='\033[0;32m'
+YELLOW='\033[1;33m'
+NC='\033[0m' # No Color
+
+WORKER_COUNTS=${@:-1 2 4}
+PORT=${PORT:-6062}
+USERS=${LOCUST_USERS:-50}
+DURATION=${LOCUST_DURATION:-30s}
+RESULTS_DIR=$(mktemp -d)
+
+if [ -z "$DATABASE_URL" ]; then
+    export DATABASE_URL="sqlite:///$RESULTS_DIR/scaling.db"
+fi
+
+echo -e "${YELLOW}Preparing database...${NC}"
+python migrate.py > /dev/null && python seed_data.py > /dev/null || exit 1
+
+printf "%-10s%15s%15s%15s%12s\n" "workers" "requests/s" "median (ms)" "p95 (ms)" "failures"
+for workers in $WORKER_COUNTS; do
+    WEB_CONCURRENCY=$workers PORT=$PORT gunicorn -c gunicorn.conf.py main:app \
+        --access-logfile /dev/null --error-logfile "$RESULTS_DIR/gunicorn-$workers.log" &
+    server_pid=$!
+
+    # Wait for the server to come up
+    for _ in $(seq 1 50); do
+        curl -s "http://localhost:$PORT/" > /dev/null && break
+        sleep 0.2
+    done
+
+    LOCUST_MIN_WAIT=0 LOCUST_MAX_WAIT=0 locust -f tests/locustfile.py --headless \
+        -u "$USERS" -r "$USERS" -t "$DURATION" --host "http://localhost:$PORT" \
+        --csv "$RESULTS_DIR/workers-$workers" --only-summary > /dev/null 2>&1
+
+    # SIGTERM lets gunicorn drain in-flight requests before the workers exit
+    kill -TERM $server_pid
+    wait $server_pid
+
+    python - "$RESULTS_DIR/workers-${workers}_stats.csv" "$workers" <<'PYEOF'
+import csv
+import sys
+
+path, workers = sys.argv[1], sys.argv[2]
+with open(path) as f:
+    aggregated = [row for row in csv.DictReader(f) if row["Name"] == "Aggregated"][0]
+print("%-10s%15.1f%15s%15s%12s" % (
+    workers,
+    float(aggregated["Requests/s"]),
+    aggregated["Median Response Time"],
+    aggregated["95%"],
+    aggregated["Failure Count"],
+))
+PYEOF
+done
+
+echo -e "${GREEN}Raw Locust CSV results are in $RESULTS_DIR${NC}"
@@ -0,0 +1,112 @@
+import pytest
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionController, classify
+from config import settings
+from tests.test_api import client, seed_data, test_db
+
+
+@pytest.mark.parametrize("method, path, query, priority", [
+    ("POST", "/api/v1/sales/", b"", "critical"),
+    ("PUT", "/api/v1/inventory/1", b"", "critical"),
+    ("GET", "/api/v1/sales/", b"limit=100", "normal"),
+    ("GET", "/api/v1/sales/", b"limit=1000", "low"),
+    ("GET", "/api/v1/analytics/revenue/week", b"", "low"),
+    ("POST", "/api/v1/analytics/product-sales/", b"", "low"),
+    ("POST", "/api/v1/analytics/jobs", b"", "normal"),
+    ("GET", "/api/v1/admin/slow-queries", b"", None),
+    ("GET", "/metrics", b"", None),
+])
+def test_classify(method, path, query, priority):
+    assert classify(method, path, query) == priority
+
+
+def test_controller_sheds_by_priority():
+    pool = [0.0, 0.0]
+    controller = AdmissionController(lambda: tuple(pool))
+    assert controller.admit("low") is None
+
+    # Pool 80% checked out: low priority is shed, everything else still runs
+    pool[0] = 0.8
+    assert controller.admit("low") == "pool"
+    assert controller.admit("normal") is None
+    assert controller.admit("critical") is None
+
+    # Slow checkouts push saturation past 1.0
+    pool[1] = settings.admission_pool_wait_target_ms * 2 / 1000
+    assert controller.admit("normal") == "pool_wait"
+    assert controller.admit("critical") is None
+
+
+def test_controller_reserves_capacity_for_writes():
+    controller = AdmissionController(lambda: (0.0, 0.0))
+    shared = settings.admission_max_in_flight - settings.admission_reserved_in_flight
+    for _ in range(shared):
+        assert controller.admit("normal") is None
+    assert controller.admit("normal") == "in_flight"
+
+    for _ in range(settings.admission_reserved_in_flight):
+        assert controller.admit("critical") is None
+    assert controller.admit("critical") == "in_flight"
+
+    controller.release("critical", 0.01)
+    assert controller.admit("critical") is None
+
+
+def test_one_slow_request_after_idle_does_not_shed_normal_reads():
+    controller = AdmissionController(lambda: (0.0, 0.0))
+    slow = settings.admission_latency_target_ms * 6 / 1000
+    assert controller.admit("low") is None
+    controller.release("low", slow)
+    assert controller.admit("normal") is None
+    controller.release("normal", slow)
+    assert controller.admit("normal") is None
+    assert controller.admit("low") is None
+    controller.release("normal", 0.01)
+    controller.release("low", 0.01)
+
+    # Slow analytics, however many, only shed analytics
+    for _ in range(settings.admission_latency_min_samples):
+        controller.admit("low")
+        controller.release("low", slow)
+    assert controller.admit("low") == "latency"
+    assert controller.admit("normal") is None
+    controller.release("normal", 0.01)
+
+    # Sustained slow normal requests shed normal work too
+    for _ in range(settings.admission_latency_min_samples):
+        controller.admit("normal")
+        controller.release("normal", slow)
+    assert controller.admit("normal") == "latency"
+
+
+def test_overloaded_server_sheds_analytics_but_takes_sales(seed_data, monkeypatch):
+    # Any observed latency now counts as overload
+    monkeypatch.setattr(settings, "admission_latency_target_ms", 1e-6)
+    monkeypatch.setattr(settings, "admission_latency_min_samples", 0)
+    sale = {
+        "order_id": "ORD-ADMISSION-1",
+        "total_amount": 999.99,
+        "marketplace": "Direct",
+        "items": [{"product_id": 1, "quantity": 1, "unit_price": 999.99, "subtotal": 999.99}]
+    }
+    assert client.post("/api/v1/sales/", json=sale).status_code == 200
+
+    response = client.get("/api/v1/analytics/revenue/week")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(settings.admission_retry_after_seconds)
+
+    sale["order_id"] = "ORD-ADMISSION-2"
+    assert client.post("/api/v1/sales/", json=sale).status_code == 200
+
+    metrics = client.get("/metrics").text
+    assert 'admission_requests_total{priority="low",decision="shed",reason="latency"}' in metrics
+
+
+def test_admission_control_can_be_disabled(seed_data, monkeypatch):
+    monkeypatch.setattr(settings, "admission_latency_target_ms", 1e-6)
+    monkeypatch.setattr(settings, "admission_control", False)
+    assert client.get("/api/v1/analytics/revenue/week").status_code == 200
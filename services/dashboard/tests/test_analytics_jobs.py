@@ -0,0 +1,93 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from jobs import analytics_jobs, date_chunks
+from tests.test_api import SQLALCHEMY_DATABASE_URL, add_sales, client, seed_data, test_db
+
+# Job threads get their own connections to the test database, like they would in production
+job_engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=NullPool)
+JobSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=job_engine)
+
+
+@pytest.fixture
+def jobs(seed_data, monkeypatch):
+    monkeypatch.setattr(analytics_jobs, "session_factory", JobSessionLocal)
+    monkeypatch.setattr(analytics_jobs, "read_session_factory", JobSessionLocal)
+    monkeypatch.setattr(settings, "analytics_job_chunk_days", 7)
+
+
+def run_job(query, **params):
+    response = client.post("/api/v1/analytics/jobs", json=query)
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    analytics_jobs.wait(job_id, timeout=10)
+    return client.get(f"/api/v1/analytics/jobs/{job_id}", params=params).json()
+
+
+def test_date_chunks_cover_range_without_overlap():
+    chunks = list(date_chunks(date(2024, 1, 1), date(2024, 1, 20), 7))
+    assert chunks == [
+        (date(2024, 1, 1), date(2024, 1, 7)),
+        (date(2024, 1, 8), date(2024, 1, 14)),
+        (date(2024, 1, 15), date(2024, 1, 20)),
+    ]
+
+
+def test_product_sales_job_pages_result(jobs):
+    add_sales(5)
+    query = {
+        "kind": "product_sales",
+        "start_date": (date.today() - timedelta(days=60)).isoformat(),
+        "end_date": date.today().isoformat(),
+    }
+    job = run_job(query, limit=3)
+    assert job["status"] == "done"
+    assert job["progress"] == 1.0
+    assert job["result_count"] == 7
+    assert len(job["result"]) == 3
+    assert job["next_offset"] == 3
+    assert {"product_id", "product_name", "category_name", "quantity"} <= set(job["result"][0])
+
+    rest = client.get(f"/api/v1/analytics/jobs/{job['id']}", params={"offset": 3, "limit": 10}).json()
+    assert len(rest["result"]) == 4
+    assert rest["next_offset"] is None
+
+
+def test_sales_summary_job_matches_summary_route(jobs):
+    add_sales(3)
+    start_date = (date.today() - timedelta(days=400)).isoformat()
+    end_date = date.today().isoformat()
+    job = run_job({"kind": "sales_summary", "start_date": start_date, "end_date": end_date})
+    summary = client.get(f"/api/v1/analytics/sales/?start_date={start_date}&end_date={end_date}").json()
+    assert job["status"] == "done"
+    assert job["result"]["total_orders"] == summary["total_orders"] == 4
+    assert job["result"]["items_sold"] == summary["items_sold"]
+    assert job["result"]["total_sales"] == pytest.approx(summary["total_sales"])
+
+
+def test_identical_jobs_are_reused(jobs):
+    query = {"kind": "revenue", "period": "month"}
+    first = run_job(query)
+    second = client.post("/api/v1/analytics/jobs", json=query).json()
+    assert second["id"] == first["id"]
+
+    other = client.post("/api/v1/analytics/jobs", json={"kind": "revenue", "period": "year"}).json()
+    assert other["id"] != first["id"]
+    analytics_jobs.wait(other["id"], timeout=10)
+
+
+def test_invalid_jobs_are_rejected(jobs):
+    response = client.post("/api/v1/analytics/jobs", json={"kind": "sales_summary"})
+    assert response.status_code == 400
+    response = client.post("/api/v1/analytics/jobs", json={"kind": "revenue", "period": "decade"})
+    assert response.status_code == 400
+    assert client.get("/api/v1/analytics/jobs/missing").status_code == 404
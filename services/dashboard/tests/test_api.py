@@ -1,12 +1,14 @@
 import pytest
 from fastapi.testclient import TestClient
 from datetime import datetime, date, timedelta
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from main import app
-from database import Base, get_db
+from config import settings
+from database import Base, get_db, get_read_db
 import models
 import schemas
 from typing import Dict, List, Any
@@ -32,10 +34,26 @@ def override_get_db():
 
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
 
 client = TestClient(app)
 
 
+@contextmanager
+def count_queries():
+    # Collect every statement sent to the test database while the block runs
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
 # Fixture for database setup and teardown
 @pytest.fixture(scope="function")
 def test_db():
@@ -212,6 +230,30 @@ class TestProductAPI:
         response = client.post("/api/v1/products/", json=product_data)
         assert response.status_code == 400
 
+    def test_get_products_batch(self, seed_data):
+        response = client.get("/api/v1/products?ids=2,999,1")
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["id"] for item in data] == [2, 999, 1]
+        assert data[0]["found"] is True
+        assert data[0]["product"]["name"] == "T-shirt"
+        assert data[1]["found"] is False
+        assert data[1]["product"] is None
+        assert data[2]["product"]["name"] == "Smartphone"
+    
+    def test_get_products_batch_invalid_ids(self, seed_data):
+        response = client.get("/api/v1/products?ids=1,abc")
+        assert response.status_code == 400
+    
+    def test_get_product_details_batch(self, seed_data):
+        response = client.get("/api/v1/products/details?ids=1,999")
+        assert response.status_code == 200
+        data = response.json()
+        assert data[0]["found"] is True
+        assert data[0]["product"]["sku"] == "ELEC-001"
+        assert data[0]["inventory"]["quantity"] == 50
+        assert data[1] == {"id": 999, "found": False, "product": None, "inventory": None}
+
 
 # Test cases for Inventory API
 class TestInventoryAPI:
@@ -235,6 +277,16 @@ class TestInventoryAPI:
         response = client.get("/api/v1/inventory/999")
         assert response.status_code == 404
     
+    def test_get_inventory_batch(self, seed_data):
+        response = client.get("/api/v1/inventory?product_ids=2,1,999")
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["product_id"] for item in data] == [2, 1, 999]
+        assert data[0]["inventory"]["quantity"] == 100
+        assert data[1]["inventory"]["quantity"] == 50
+        assert data[2]["found"] is False
+        assert data[2]["inventory"] is None
+    
     def test_create_inventory(self, seed_data):
         # First create a new product
         product_data = {
@@ -611,4 +663,165 @@ class TestIntegration:
             ]
         }
         response = client.post("/api/v1/sales/", json=sale_data)
-        assert response.status_code == 400 
\ No newline at end of file
+        assert response.status_code == 400 
+
+
+# Query count regression tests
+def add_sales(count):
+    db = TestingSessionLocal()
+    for i in range(count):
+        sale = models.Sale(
+            order_id=f"ORD-QC-{i}",
+            total_amount=19.99,
+            marketplace="Direct",
+            transaction_date=datetime.now() - timedelta(minutes=i)
+        )
+        sale.items = [models.SaleItem(product_id=2, quantity=1, unit_price=19.99, subtotal=19.99)]
+        db.add(sale)
+    db.commit()
+    db.close()
+
+
+class TestQueryCounts:
+    def test_sales_list_query_count_is_constant(self, seed_data):
+        with count_queries() as small_page:
+            response = client.get("/api/v1/sales/")
+        assert response.status_code == 200
+        assert len(response.json()) == 1
+
+        add_sales(50)
+        with count_queries() as large_page:
+            response = client.get("/api/v1/sales/?limit=100")
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 51
+        assert all(len(sale["items"]) >= 1 for sale in data)
+
+        # One SELECT for the sales page plus one batched SELECT for their items
+        assert len(small_page) == len(large_page) == 2
+
+    def test_sale_detail_query_count(self, seed_data):
+        with count_queries() as statements:
+            response = client.get("/api/v1/sales/1")
+        assert response.status_code == 200
+        assert len(response.json()["items"]) == 2
+        assert len(statements) == 2
+
+    def test_batch_lookups_use_single_query(self, seed_data):
+        for url in [
+            "/api/v1/products?ids=1,2,999",
+            "/api/v1/inventory?product_ids=1,2,999",
+            "/api/v1/products/details?ids=1,2,999",
+        ]:
+            with count_queries() as statements:
+                response = client.get(url)
+            assert response.status_code == 200
+            assert len(statements) == 1
+
+    # SELECTs each write route may issue: the lookups it validates with, plus reading back the result
+    @pytest.mark.parametrize("method, url, body, selects", [
+        ("put", "/api/v1/inventory/1", {"quantity": 60}, 3),
+        ("post", "/api/v1/inventory/", {"product_id": 3, "quantity": 5}, 3),
+        ("get", "/api/v1/inventory/history/1", None, 2),
+        ("post", "/api/v1/sales/", {
+            "order_id": "ORD-67890", "total_amount": 1039.97, "marketplace": "Amazon",
+            "items": [
+                {"product_id": 1, "quantity": 1, "unit_price": 999.99, "subtotal": 999.99},
+                {"product_id": 2, "quantity": 1, "unit_price": 19.99, "subtotal": 19.99},
+                {"product_id": 2, "quantity": 1, "unit_price": 19.99, "subtotal": 19.99},
+            ],
+        }, 4),
+    ])
+    def test_routes_look_up_each_row_once(self, seed_data, method, url, body, selects):
+        # A product without stock yet, for the inventory create route
+        client.post("/api/v1/products/", json={
+            "name": "Jeans", "description": "Denim", "price": 49.99, "sku": "CLOTH-002", "category_id": 2
+        })
+        with count_queries() as statements:
+            response = client.request(method, url, json=body)
+        assert response.status_code == 200
+
+        queries = [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+        assert len(queries) == selects
+        assert len(set(queries)) == len(queries)
+
+
+# Fast JSON serialization path
+class TestFastJSONResponses:
+    LIST_ENDPOINTS = [
+        "/api/v1/categories/",
+        "/api/v1/products/",
+        "/api/v1/inventory/",
+        "/api/v1/inventory/history/1",
+        "/api/v1/sales/",
+    ]
+
+    def test_fast_path_matches_validated_output(self, seed_data, monkeypatch):
+        for url in self.LIST_ENDPOINTS:
+            monkeypatch.setattr(settings, "fast_json_responses", False)
+            expected = client.get(url)
+            monkeypatch.setattr(settings, "fast_json_responses", True)
+            actual = client.get(url)
+            assert actual.status_code == expected.status_code == 200
+            assert actual.json() == expected.json()
+
+    def test_fast_path_keeps_openapi_schema(self, monkeypatch):
+        monkeypatch.setattr(settings, "fast_json_responses", False)
+        app.openapi_schema = None
+        expected = app.openapi()
+        monkeypatch.setattr(settings, "fast_json_responses", True)
+        app.openapi_schema = None
+        assert app.openapi() == expected
+
+
+# Compression and binary encodings
+class TestResponseEncodings:
+    def test_large_response_is_gzip_compressed(self, seed_data):
+        add_sales(20)
+        response = client.get("/api/v1/sales/", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert len(response.json()) == 21
+
+    def test_brotli_is_preferred_when_accepted(self, seed_data):
+        pytest.importorskip("brotli")
+        add_sales(20)
+        response = client.get("/api/v1/sales/", headers={"Accept-Encoding": "gzip, br"})
+        assert response.headers["content-encoding"] == "br"
+        assert len(response.json()) == 21
+
+    def test_small_response_is_not_compressed(self, seed_data):
+        response = client.get("/api/v1/categories/1", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+
+    def test_msgpack_encoding(self, seed_data):
+        msgpack = pytest.importorskip("msgpack")
+        response = client.get("/api/v1/sales/", headers={"Accept": "application/msgpack"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/msgpack"
+        data = msgpack.unpackb(response.content)
+        assert data[0]["order_id"] == "ORD-12345"
+        assert len(data[0]["items"]) == 2
+
+    def test_arrow_encoding(self, seed_data):
+        pyarrow = pytest.importorskip("pyarrow")
+        import pyarrow.ipc
+        response = client.get("/api/v1/inventory/", headers={"Accept": "application/vnd.apache.arrow.stream"})
+        assert response.status_code == 200
+        table = pyarrow.ipc.open_stream(response.content).read_all()
+        assert table.num_rows == 2
+        assert table.column("quantity").to_pylist() == [50, 100]
+
+    def test_analytics_msgpack_encoding(self, seed_data):
+        msgpack = pytest.importorskip("msgpack")
+        today = date.today().isoformat()
+        response = client.get(
+            "/api/v1/analytics/sales/",
+            params={"start_date": today, "end_date": today},
+            headers={"Accept": "application/msgpack"}
+        )
+        assert response.status_code == 200
+        data = msgpack.unpackb(response.content)
+        assert data["total_orders"] == 1
@@ -0,0 +1,70 @@
+import json
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models
+from config import settings
+from tests.test_api import TestingSessionLocal, client, seed_data, test_db
+
+CSV_UPLOAD = """sku,name,description,price,category,quantity
+ELEC-001,Smartphone,"New model, 2 cameras",899.99,Electronics,
+ELEC-002,Headphones,,59.5,Electronics,25
+BOOK-001,Novel,,12,Books,5
+CLOTH-002,Scarf,,not-a-price,Clothing,3
+"""
+
+
+def import_products(body, content_type, **params):
+    return client.post(
+        "/api/v1/products/import", content=body.encode(), headers={"Content-Type": content_type}, params=params
+    )
+
+
+def test_csv_import_upserts_by_sku(seed_data):
+    response = import_products(CSV_UPLOAD, "text/csv", create_inventory="true")
+    assert response.status_code == 200
+    result = response.json()
+    assert {key: result[key] for key in ("inserted", "updated", "rejected", "inventory_created")} == {
+        "inserted": 1, "updated": 1, "rejected": 2, "inventory_created": 1
+    }
+    assert [error["line"] for error in result["errors"]] == [4, 5]
+    assert "Category 'Books' not found" in result["errors"][0]["error"]
+    assert "price" in result["errors"][1]["error"]
+
+    db = TestingSessionLocal()
+    smartphone = db.query(models.Product).filter(models.Product.sku == "ELEC-001").one()
+    assert (smartphone.price, smartphone.description) == (899.99, "New model, 2 cameras")
+    headphones = db.query(models.Product).filter(models.Product.sku == "ELEC-002").one()
+    assert headphones.category_id == 1
+    # New products get stock; existing stock is left alone
+    assert db.query(models.Inventory).filter(models.Inventory.product_id == headphones.id).one().quantity == 25
+    assert db.query(models.Inventory).filter(models.Inventory.product_id == smartphone.id).one().quantity == 50
+    db.close()
+
+
+def test_ndjson_import_in_batches(seed_data, monkeypatch):
+    monkeypatch.setattr(settings, "product_import_batch_size", 2)
+    records = [
+        {"sku": f"CLOTH-{i:03d}", "name": f"Shirt {i}", "price": 10 + i, "category_id": 2} for i in range(2, 7)
+    ]
+    # The last line wins for a repeated SKU
+    records.append({"sku": "CLOTH-002", "name": "Shirt 2 (v2)", "price": 30, "category_id": 2})
+    body = "\n".join(json.dumps(record) for record in records) + "\n{not json\n"
+
+    result = import_products(body, "application/x-ndjson").json()
+    assert (result["inserted"], result["updated"], result["rejected"]) == (5, 1, 1)
+    assert result["errors"][0]["line"] == 7
+
+    db = TestingSessionLocal()
+    assert db.query(models.Product).count() == 7
+    assert db.query(models.Product).filter(models.Product.sku == "CLOTH-002").one().name == "Shirt 2 (v2)"
+    # Without create_inventory no stock is created
+    assert db.query(models.Inventory).count() == 2
+    db.close()
+
+
+def test_import_needs_a_known_format(seed_data):
+    assert import_products("sku,name", "text/plain").status_code == 415
+    assert import_products("sku,name,price,category_id\nX-1,Thing,1,1\n", "text/plain", format="csv").json()["inserted"] == 1
@@ -0,0 +1,76 @@
+import importlib
+import json
+
+from sqlalchemy import create_engine, text
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations
+from tests.test_api import client, seed_data, test_db
+
+
+def read_feed(feed, since=0, **params):
+    response = client.get(f"/api/v1/changes/{feed}", params={"since": since, **params})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    return rows, int(response.headers["x-next-cursor"])
+
+
+def test_full_sync_then_only_changes(seed_data):
+    rows, cursor = read_feed("inventory")
+    assert [row["product_id"] for row in rows] == [1, 2]
+    assert cursor == rows[-1]["change_seq"]
+
+    # Caught up: nothing new and the cursor stays put
+    assert read_feed("inventory", since=cursor) == ([], cursor)
+
+    client.put("/api/v1/inventory/2", json={"quantity": 7})
+    rows, next_cursor = read_feed("inventory", since=cursor)
+    assert [(row["product_id"], row["quantity"]) for row in rows] == [(2, 7)]
+    assert next_cursor > cursor
+
+
+def test_sales_feed_pages_and_includes_items(seed_data):
+    sale = {
+        "order_id": "ORD-FEED-1",
+        "total_amount": 19.99,
+        "marketplace": "Direct",
+        "items": [{"product_id": 2, "quantity": 1, "unit_price": 19.99, "subtotal": 19.99}]
+    }
+    client.post("/api/v1/sales/", json=sale)
+
+    first, cursor = read_feed("sales", limit=1)
+    second, cursor = read_feed("sales", since=cursor, limit=1)
+    assert [row["order_id"] for row in first + second] == ["ORD-12345", "ORD-FEED-1"]
+    assert len(first[0]["items"]) == 2
+    assert second[0]["items"][0]["subtotal"] == 19.99
+    assert read_feed("sales", since=cursor) == ([], cursor)
+
+    # The sale also logged an inventory change
+    logs, _ = read_feed("inventory_logs")
+    assert logs[-1]["change_reason"] == "Sale - Order ID: ORD-FEED-1"
+
+
+def test_unknown_feed(test_db):
+    assert client.get("/api/v1/changes/categories").status_code == 404
+
+
+def test_migration_numbers_existing_rows_and_tracks_new_ones(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'feed.db'}")
+    with engine.begin() as conn:
+        # A database from before the change feed, with rows in it
+        importlib.import_module("migrations.0001_initial_schema").metadata.create_all(conn)
+        conn.execute(text("INSERT INTO categories (id, name) VALUES (1, 'Books')"))
+        conn.execute(text("INSERT INTO products (id, name, price, sku, category_id) VALUES (1, 'Novel', 9.5, 'BK-1', 1)"))
+    migrations.upgrade(engine)
+
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO products (id, name, price, sku, category_id) VALUES (2, 'Atlas', 30, 'BK-2', 1)"))
+        conn.execute(text("UPDATE products SET price = 8.5 WHERE id = 1"))
+        rows = conn.execute(text("SELECT id, change_seq FROM products ORDER BY change_seq")).all()
+    assert [row.id for row in rows] == [2, 1]
+    assert rows[0].change_seq > 1
+    engine.dispose()
@@ -0,0 +1,131 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crud
+import ingest
+import models
+from tests.test_api import TestingSessionLocal, client, seed_data, test_db
+
+
+def sale_json(order_id, quantity=1):
+    return {
+        "order_id": order_id, "total_amount": 19.99 * quantity, "marketplace": "Walmart",
+        "items": [{"product_id": 2, "quantity": quantity, "unit_price": 19.99, "subtotal": 19.99 * quantity}],
+    }
+
+
+@pytest.fixture
+def sales_ingest(seed_data, tmp_path, monkeypatch):
+    buffer = ingest.SalesIngest(str(tmp_path))
+    buffer.session_factory = TestingSessionLocal
+    monkeypatch.setattr(ingest, "sales_ingest", buffer)
+    buffer.start()
+    yield buffer
+    buffer.stop()
+
+
+def status(tracking_id):
+    response = client.get(f"/api/v1/sales/ingest/{tracking_id}")
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_sales_are_accepted_then_committed(sales_ingest):
+    tracking_ids = []
+    for i in range(3):
+        response = client.post("/api/v1/sales/", json=sale_json(f"ORD-INGEST-{i}"))
+        assert response.status_code == 202
+        assert response.json()["status"] == "pending"
+        assert response.headers["Location"] == f"/api/v1/sales/ingest/{response.json()['tracking_id']}"
+        tracking_ids.append(response.json()["tracking_id"])
+
+    assert sales_ingest.wait_idle(timeout=10)
+    for i, tracking_id in enumerate(tracking_ids):
+        result = status(tracking_id)
+        assert result["status"] == "committed"
+        assert client.get(f"/api/v1/sales/{result['sale_id']}").json()["order_id"] == f"ORD-INGEST-{i}"
+
+    db = TestingSessionLocal()
+    assert db.query(models.Inventory).filter(models.Inventory.product_id == 2).one().quantity == 97
+    assert db.query(models.InventoryLog).count() == 5
+    db.close()
+
+
+def test_sales_refused_at_commit_time_fail(sales_ingest):
+    duplicate = client.post("/api/v1/sales/", json=sale_json("ORD-12345")).json()["tracking_id"]
+    short = client.post("/api/v1/sales/", json=sale_json("ORD-INGEST-BIG", quantity=1000)).json()["tracking_id"]
+    assert sales_ingest.wait_idle(timeout=10)
+
+    assert status(duplicate) == {"tracking_id": duplicate, "status": "failed", "sale_id": None, "error": "Order ID already exists"}
+    assert status(short)["error"] == "Not enough inventory for product 2"
+
+    # Checks against the catalog and the total still answer straight away
+    unknown = {**sale_json("ORD-INGEST-X"), "items": [{"product_id": 99, "quantity": 1, "unit_price": 19.99, "subtotal": 19.99}]}
+    assert client.post("/api/v1/sales/", json=unknown).status_code == 404
+    assert client.post("/api/v1/sales/", json={**sale_json("ORD-INGEST-Y"), "total_amount": 5}).status_code == 400
+    assert client.get("/api/v1/sales/ingest/0123456789abcdef-1").status_code == 404
+
+
+def test_only_the_entry_at_fault_fails(sales_ingest, monkeypatch):
+    create_sales_batch = crud.create_sales_batch
+    outages = [OperationalError("SELECT 1", {}, Exception("server closed the connection"))]
+
+    def flaky_create_sales_batch(db, sales):
+        if outages:
+            raise outages.pop()
+        if any(sale.order_id == "ORD-INGEST-BAD" for sale, _ in sales):
+            raise ValueError("unexpected")
+        return create_sales_batch(db, sales)
+
+    monkeypatch.setattr(ingest, "RETRY_SECONDS", 0.01)
+    monkeypatch.setattr(crud, "create_sales_batch", flaky_create_sales_batch)
+    # Hold the committer back so all three go in one batch
+    with sales_ingest._cond:
+        tracking_ids = [
+            client.post("/api/v1/sales/", json=sale_json(order_id)).json()["tracking_id"]
+            for order_id in ("ORD-INGEST-1", "ORD-INGEST-BAD", "ORD-INGEST-2")
+        ]
+    assert sales_ingest.wait_idle(timeout=10)
+
+    # The outage is retried; the bad entry fails without holding up the others
+    assert [status(tracking_id)["status"] for tracking_id in tracking_ids] == ["committed", "failed", "committed"]
+    assert status(tracking_ids[1])["error"] == "Could not be stored (ValueError)"
+
+
+def test_orphaned_logs_are_replayed_once(seed_data, tmp_path, monkeypatch):
+    buffer = ingest.SalesIngest(str(tmp_path))
+    buffer.session_factory = TestingSessionLocal
+    monkeypatch.setattr(ingest, "sales_ingest", buffer)
+
+    # Left by a process that crashed mid-append, after committing one of its entries
+    accepted_at = datetime.now(timezone.utc).isoformat()
+    lines = [
+        json.dumps({"id": f"deadbeef-{i}", "accepted_at": accepted_at, "sale": sale_json(f"ORD-REPLAY-{i}")})
+        for i in range(1, 4)
+    ]
+    lines.append(json.dumps({"done": ["deadbeef-2"]}))
+    lines.append('{"id": "deadbeef-4", "acc')
+    orphan = tmp_path / "deadbeef.log"
+    orphan.write_text("\n".join(lines))
+
+    assert status("deadbeef-1")["status"] == "pending"
+    assert buffer.replay_orphans() == 2
+    assert not orphan.exists()
+    assert status("deadbeef-1")["status"] == "committed"
+    assert client.get("/api/v1/sales/ingest/deadbeef-2").status_code == 404
+
+    # Replaying the same entries again stores nothing
+    orphan.write_text("\n".join(lines))
+    buffer.replay_orphans()
+    db = TestingSessionLocal()
+    assert sorted(sale.order_id for sale in db.query(models.Sale).filter(models.Sale.order_id.like("ORD-REPLAY-%"))) == [
+        "ORD-REPLAY-1", "ORD-REPLAY-3"
+    ]
+    db.close()
@@ -0,0 +1,74 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+from metrics import Counter, Gauge, Histogram, Registry
+from tests.test_api import client, seed_data, test_db
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency", ["route"], buckets=(0.1, 1.0))
+    for value in [0.05, 0.5, 0.5, 5]:
+        histogram.observe(value, ("/a",))
+
+    registry = Registry()
+    registry.register(histogram)
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{route="/a"} 4' in text
+    assert 'latency_seconds_sum{route="/a"} 6.05' in text
+
+
+def test_counter_and_gauge_render():
+    counter = Counter("things_total", "Things", ["kind"])
+    counter.inc(("a",))
+    counter.inc(("a",), 2)
+    gauge = Gauge("busy", "Busy")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+
+    registry = Registry()
+    registry.register(counter)
+    registry.register(gauge)
+    text = registry.render()
+    assert 'things_total{kind="a"} 3' in text
+    assert "busy 1" in text
+
+
+def test_request_metrics_use_route_template(seed_data):
+    labels = ("GET", "/api/v1/sales/{sale_id}", 200)
+    before = metrics.request_duration.get_count(labels)
+    client.get("/api/v1/sales/1")
+    assert metrics.request_duration.get_count(labels) == before + 1
+    assert metrics.requests_in_flight.get() == 0
+
+
+def test_sql_metrics_are_attributed_to_crud_functions(seed_data):
+    before = metrics.sql_statements.get(("get_sales",))
+    client.get("/api/v1/sales/")
+    assert metrics.sql_statements.get(("get_sales",)) - before == 1
+    assert metrics.sql_statements.get(("get_sale_items_by_sale_ids",)) >= 1
+
+    # The per-request stats follow the request into the threadpool
+    _, statements_sum, _ = metrics.request_statements.values[("/api/v1/sales/",)]
+    client.get("/api/v1/sales/")
+    _, statements_sum_after, _ = metrics.request_statements.values[("/api/v1/sales/",)]
+    # One SELECT for the page and one for its items
+    assert statements_sum_after - statements_sum == 2
+
+
+def test_metrics_endpoint(seed_data):
+    client.get("/api/v1/categories/")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/categories/",status="200"}' in response.text
+    assert 'db_statements_total{function="get_categories"}' in response.text
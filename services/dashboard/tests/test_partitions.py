@@ -0,0 +1,42 @@
+from datetime import date, datetime, timedelta, timezone
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models
+from partitions import add_months, ensure_partitions, month_start, partition_name, partitioned_tables
+from tests.test_api import TestingSessionLocal, client, seed_data, test_db
+
+
+def test_month_arithmetic():
+    assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    # Partition bounds are UTC, so aware timestamps are converted first
+    assert month_start(datetime(2024, 3, 1, 0, 30, tzinfo=timezone(timedelta(hours=2)))) == date(2024, 2, 1)
+    assert partition_name("sales", date(2024, 2, 1)) == "sales_y2024m02"
+
+
+def test_partitioning_is_a_no_op_on_sqlite(test_db):
+    db = TestingSessionLocal()
+    assert partitioned_tables(db.connection()) == []
+    assert ensure_partitions(db.connection(), datetime(2020, 1, 1), datetime.now()) == []
+    db.close()
+
+
+def test_sale_items_carry_their_sale_date(seed_data):
+    sale = {
+        "order_id": "ORD-PARTITION-1",
+        "total_amount": 19.99,
+        "marketplace": "Direct",
+        "items": [{"product_id": 2, "quantity": 1, "unit_price": 19.99, "subtotal": 19.99}]
+    }
+    sale_id = client.post("/api/v1/sales/", json=sale).json()["id"]
+
+    db = TestingSessionLocal()
+    # Items written without a date, like the fixture's, get it from their sale too
+    for item in db.query(models.SaleItem).all():
+        assert item.transaction_date is not None
+        assert item.transaction_date == item.sale.transaction_date
+    assert db.query(models.SaleItem).filter(models.SaleItem.sale_id == sale_id).count() == 1
+    db.close()
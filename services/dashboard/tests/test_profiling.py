@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crud
+import profiling
+from config import settings
+from tests.test_api import client, seed_data, test_db
+
+ADMIN_HEADERS = {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "secret")
+    monkeypatch.setattr(settings, "profile_min_interval_seconds", 0)
+    monkeypatch.setattr(profiling, "rate_limiter", profiling.ProfileRateLimiter())
+
+
+def test_profile_requires_admin_token(seed_data, admin):
+    response = client.get("/api/v1/products/", headers={"X-Profile": "calltree"})
+    assert response.status_code == 403
+
+    response = client.get("/api/v1/products/", headers={"X-Profile": "flame", **ADMIN_HEADERS})
+    assert response.status_code == 400
+
+
+def test_calltree_profile(seed_data, admin):
+    response = client.get("/api/v1/sales/", headers={"X-Profile": "calltree", **ADMIN_HEADERS})
+    assert response.status_code == 200
+    assert response.headers["x-profile-response-status"] == "200"
+    assert int(response.headers["x-profile-sql-statements"]) >= 1
+    assert float(response.headers["x-profile-sql-time-ms"]) > 0
+    assert "get_sales" in response.text
+
+    # Requests without the header are not profiled
+    response = client.get("/api/v1/sales/")
+    assert isinstance(response.json(), list)
+
+
+def test_collapsed_profile(seed_data, admin, monkeypatch):
+    get_sales = crud.get_sales
+
+    def slow_get_sales(*args, **kwargs):
+        time.sleep(0.05)
+        return get_sales(*args, **kwargs)
+
+    monkeypatch.setattr(crud, "get_sales", slow_get_sales)
+    response = client.get("/api/v1/sales/?__profile=collapsed", headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert "read_sales" in stack and "slow_get_sales" in stack
+    assert int(count) > 1
+
+
+def test_profiles_are_rate_limited(seed_data, admin, monkeypatch):
+    monkeypatch.setattr(settings, "profile_min_interval_seconds", 60)
+    headers = {"X-Profile": "calltree", **ADMIN_HEADERS}
+    assert client.get("/api/v1/categories/", headers=headers).status_code == 200
+
+    response = client.get("/api/v1/categories/", headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) > 0
@@ -0,0 +1,82 @@
+import itertools
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import query_limits
+from config import settings
+from jobs import analytics_jobs
+from query_limits import is_statement_timeout, set_statement_timeout
+from tests.test_analytics_jobs import jobs
+from tests.test_api import TestingSessionLocal, add_sales, client, seed_data, test_db
+
+# Cross-joins a few hundred rows into far more work than a 1 ms deadline allows
+SLOW_QUERY = text("""
+    WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 300)
+    SELECT count(*) FROM n a, n b, n c
+""")
+
+
+def week_query():
+    return {"start_date": (date.today() - timedelta(days=7)).isoformat(), "end_date": date.today().isoformat()}
+
+
+def test_sqlite_statement_timeout_interrupts_query(test_db):
+    db = TestingSessionLocal()
+    set_statement_timeout(db, 1)
+    with pytest.raises(OperationalError) as excinfo:
+        db.execute(SLOW_QUERY).scalar()
+    assert is_statement_timeout(excinfo.value)
+    db.close()
+
+    # The deadline is cleared when the connection goes back to the pool
+    db = TestingSessionLocal()
+    assert db.execute(text("SELECT 1")).scalar() == 1
+    db.close()
+
+
+def test_timed_out_route_returns_advice(seed_data, monkeypatch):
+    # A clock that moves a second per reading makes every statement overrun its deadline
+    clock = itertools.count()
+    monkeypatch.setattr(query_limits, "time", SimpleNamespace(monotonic=lambda: next(clock)))
+    monkeypatch.setattr(query_limits, "SQLITE_PROGRESS_INTERVAL", 1)
+    monkeypatch.setattr(settings, "analytics_statement_timeout_ms", 1)
+    response = client.post("/api/v1/analytics/product-sales/", json=week_query())
+    assert response.status_code == 503
+    assert "statement timeout" in response.json()["detail"]
+    assert "POST /api/v1/analytics/jobs" in response.json()["detail"]
+
+    # Routes without a timeout are unaffected
+    assert client.get("/api/v1/sales/").status_code == 200
+
+
+def test_over_budget_query_is_rejected(seed_data, monkeypatch):
+    monkeypatch.setattr(settings, "analytics_row_budget", 2)
+    assert len(client.post("/api/v1/analytics/product-sales/", json=week_query()).json()) == 2
+
+    add_sales(1)
+    response = client.post("/api/v1/analytics/product-sales/", json=week_query())
+    assert response.status_code == 400
+    assert "about 3 rows, over the budget of 2" in response.json()["detail"]
+    assert "narrow the date range" in response.json()["detail"]
+
+
+def test_over_budget_query_runs_as_job(jobs, monkeypatch):
+    monkeypatch.setattr(settings, "analytics_row_budget", 1)
+    monkeypatch.setattr(settings, "analytics_over_budget_action", "job")
+    response = client.post("/api/v1/analytics/product-sales/", json=week_query())
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    assert response.headers["location"] == f"/api/v1/analytics/jobs/{job_id}"
+
+    analytics_jobs.wait(job_id, timeout=10)
+    job = client.get(response.headers["location"]).json()
+    assert job["status"] == "done"
+    assert job["result_count"] == 2
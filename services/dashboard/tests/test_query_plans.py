@@ -0,0 +1,206 @@
+"""
+EXPLAIN-based checks that the hot crud queries are served by indexes.
+
+The schema is built by the versioned migrations and seeded with a large
+dataset. Each crud call is captured at the cursor level and its plan is
+inspected: every access to a hot table must go through an index. Set
+TEST_POSTGRES_URL to run the same checks against Postgres, where the
+analytics queries must also be pruned to the monthly partitions they cover.
+"""
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import migrations
+import schemas
+from partitions import PARTITION_NAME, ensure_partitions, month_start, partition_name
+from benchmarks.common import seed
+from database import Base
+
+HOT_TABLES = {"sales", "sale_items", "inventory_logs", "products"}
+SQLITE_INDEX_ACCESS = ("USING INDEX", "USING COVERING INDEX", "USING INTEGER PRIMARY KEY", "USING PRIMARY KEY")
+
+NUM_SALES = 20000
+
+
+def now():
+    return datetime.now()
+
+
+def last_week():
+    return schemas.ProductSalesQuery(start_date=(now() - timedelta(days=7)).date(), end_date=now().date())
+
+
+HOT_QUERIES = {
+    "get_sales_summary": lambda db: crud.get_sales_summary(db, now() - timedelta(days=7), now()),
+    "get_revenue_by_period": lambda db: crud.get_revenue_by_period(db, "week", now()),
+    "get_sales_by_date_range": lambda db: crud.get_sales_by_date_range(db, now() - timedelta(days=1), now()),
+    "get_sales": lambda db: crud.get_sales(db, limit=100),
+    "get_product_sales": lambda db: crud.get_product_sales(db, last_week()),
+    "get_product_sales_by_product": lambda db: crud.get_product_sales(
+        db, last_week().model_copy(update={"product_id": 7})
+    ),
+    "get_inventory_history": lambda db: crud.get_inventory_history(db, product_id=7),
+    "get_products_by_category": lambda db: crud.get_products(db, category_id=3),
+}
+
+
+def search_sales(cursor=None, **filters):
+    return lambda db: crud.get_sales(db, limit=100, filters=schemas.SalesFilter(**filters), cursor=cursor)
+
+
+# GET /sales/ filter combinations, including deep keyset pages
+HOT_QUERIES.update({
+    "search_sales_deep_page": search_sales(cursor=NUM_SALES // 2),
+    "search_sales_by_marketplace": search_sales(marketplace="Walmart", cursor=NUM_SALES // 2),
+    "search_sales_by_marketplace_dates_totals": search_sales(
+        marketplace="Walmart", start_date=last_week().start_date, end_date=last_week().end_date,
+        min_total=500, max_total=2000
+    ),
+    "search_sales_by_totals": search_sales(min_total=500),
+    "search_sales_by_product": search_sales(product_id=7, cursor=NUM_SALES // 2),
+    "search_sales_by_product_and_dates": search_sales(
+        product_id=7, start_date=last_week().start_date, end_date=last_week().end_date
+    ),
+    "search_sales_by_order_id_prefix": search_sales(order_id_prefix="ORD-BENCH-123"),
+})
+
+
+@pytest.fixture(scope="module", params=["sqlite", "postgresql"])
+def plan_engine(request):
+    if request.param == "sqlite":
+        engine = create_engine("sqlite:///./test_plans.db", connect_args={"check_same_thread": False})
+    else:
+        url = os.getenv("TEST_POSTGRES_URL")
+        if not url:
+            pytest.skip("TEST_POSTGRES_URL is not set")
+        engine = create_engine(url)
+
+    Base.metadata.drop_all(bind=engine)
+    migrations.metadata.drop_all(bind=engine)
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        ensure_partitions(conn, now() - timedelta(days=366), now())
+    seed(engine, num_products=500, num_sales=NUM_SALES)
+    with engine.begin() as conn:
+        # Give the planner real statistics, as a production database would have
+        conn.execute(text("ANALYZE"))
+        conn.execute(text(
+            "INSERT INTO inventory_logs (product_id, previous_quantity, new_quantity, change_reason, timestamp) "
+            "SELECT product_id, quantity + 1, quantity, 'Sale', sales.transaction_date FROM sale_items "
+            "JOIN sales ON sales.id = sale_items.sale_id"
+        ))
+        conn.execute(text("ANALYZE"))
+    yield engine
+    Base.metadata.drop_all(bind=engine)
+    migrations.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+
+def capture_statements(engine, fn):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    db = sessionmaker(bind=engine)()
+    try:
+        fn(db)
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def sqlite_plan_problems(conn, statement, parameters):
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    problems = []
+    for row in rows:
+        detail = row[-1]
+        words = detail.split()
+        if words[0] not in ("SCAN", "SEARCH") or words[1] not in HOT_TABLES:
+            continue
+        if not any(access in detail for access in SQLITE_INDEX_ACCESS):
+            problems.append(detail)
+    return problems
+
+
+def postgres_plan_problems(conn, statement, parameters):
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    problems = []
+    nodes = [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in HOT_TABLES:
+            problems.append(f"Seq Scan on {node['Relation Name']}")
+        nodes.extend(node.get("Plans", []))
+    return problems
+
+
+def test_migrations_create_hot_path_indexes(plan_engine):
+    assert migrations.pending_migrations(plan_engine) == []
+    inspector = inspect(plan_engine)
+    index_columns = {
+        table: [index["column_names"] for index in inspector.get_indexes(table)]
+        for table in ["sales", "sale_items", "products", "inventory_logs"]
+    }
+    assert ["transaction_date"] in index_columns["sales"]
+    assert ["sale_id"] in index_columns["sale_items"]
+    assert ["transaction_date"] in index_columns["sale_items"]
+    assert ["product_id"] in index_columns["sale_items"]
+    assert ["category_id"] in index_columns["products"]
+    assert ["product_id", "timestamp"] in index_columns["inventory_logs"]
+    assert ["marketplace", "transaction_date", "id", "total_amount"] in index_columns["sales"]
+    assert ["product_id", "transaction_date", "sale_id"] in index_columns["sale_items"]
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_indexes(plan_engine, name):
+    statements = capture_statements(plan_engine, HOT_QUERIES[name])
+    assert statements
+
+    check = sqlite_plan_problems if plan_engine.dialect.name == "sqlite" else postgres_plan_problems
+    with plan_engine.connect() as conn:
+        for statement, parameters in statements:
+            problems = check(conn, statement, parameters)
+            assert not problems, f"{name} does not use an index: {problems}\n{statement}"
+
+
+def scanned_partitions(conn, statement, parameters):
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scanned = set()
+    nodes = [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if PARTITION_NAME.match(node.get("Relation Name", "")):
+            scanned.add(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+    return scanned
+
+
+@pytest.mark.parametrize("name", ["get_sales_summary", "get_revenue_by_period", "get_product_sales"])
+def test_analytics_queries_prune_partitions(plan_engine, name):
+    if plan_engine.dialect.name != "postgresql":
+        pytest.skip("partitioning is Postgres only")
+    # Every query above covers at most the last week, which touches one or two months
+    allowed = {
+        partition_name(table, month_start(day))
+        for table in ["sales", "sale_items"]
+        for day in [now() - timedelta(days=8), now() + timedelta(days=7)]
+    }
+    statements = capture_statements(plan_engine, HOT_QUERIES[name])
+    with plan_engine.connect() as conn:
+        for statement, parameters in statements:
+            scanned = scanned_partitions(conn, statement, parameters)
+            assert scanned, f"{name} does not read a partition:\n{statement}"
+            assert scanned <= allowed, f"{name} is not pruned to its months: {sorted(scanned - allowed)}"
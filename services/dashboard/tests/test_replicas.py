@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Base, ReplicaSet, RoutingSession
+from models import Category
+
+# Two independent database files stand in for the primary and the replica
+primary_engine = create_engine("sqlite:///./test_primary.db", connect_args={"check_same_thread": False})
+replica_engine = create_engine("sqlite:///./test_replica.db", connect_args={"check_same_thread": False})
+broken_engine = create_engine("sqlite:////nonexistent-directory/replica.db")
+
+
+def make_session_factory(replica_set):
+    return sessionmaker(
+        class_=RoutingSession, autocommit=False, autoflush=False, bind=primary_engine, replica_set=replica_set
+    )
+
+
+# Fixture for database setup and teardown
+@pytest.fixture(scope="function")
+def test_dbs():
+    for engine, name in [(primary_engine, "Primary"), (replica_engine, "Replica")]:
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(Category.__table__.insert(), {"name": name, "description": f"Only in the {name.lower()}"})
+    yield
+    for engine in [primary_engine, replica_engine]:
+        Base.metadata.drop_all(bind=engine)
+
+
+def test_reads_go_to_replica(test_dbs):
+    SessionLocal = make_session_factory(ReplicaSet(primary_engine, [replica_engine]))
+    db = SessionLocal()
+    assert [c.name for c in db.query(Category).all()] == ["Replica"]
+    db.close()
+
+
+def test_reads_after_write_stay_on_primary(test_dbs):
+    SessionLocal = make_session_factory(ReplicaSet(primary_engine, [replica_engine]))
+    db = SessionLocal()
+    db.add(Category(name="New", description="Written in this request"))
+    db.flush()
+    assert sorted(c.name for c in db.query(Category).all()) == ["New", "Primary"]
+    db.commit()
+    assert sorted(c.name for c in db.query(Category).all()) == ["New", "Primary"]
+    db.close()
+
+    # The write only reached the primary
+    with replica_engine.connect() as conn:
+        assert conn.execute(Category.__table__.select()).all()[0].name == "Replica"
+
+
+def test_unreachable_replica_falls_back_to_primary(test_dbs):
+    SessionLocal = make_session_factory(ReplicaSet(primary_engine, [broken_engine]))
+    db = SessionLocal()
+    assert [c.name for c in db.query(Category).all()] == ["Primary"]
+    db.close()
+
+
+def test_lagging_replica_falls_back_to_primary(test_dbs):
+    replica_set = ReplicaSet(primary_engine, [replica_engine], max_lag_seconds=5, lag_probe=lambda replica: 30.0)
+    db = make_session_factory(replica_set)()
+    assert [c.name for c in db.query(Category).all()] == ["Primary"]
+    db.close()
+
+
+def test_round_robin_skips_unhealthy_replicas():
+    replica_set = ReplicaSet(primary_engine, [replica_engine, broken_engine, replica_engine])
+    assert [replica_set.choose() for _ in range(4)] == [replica_engine] * 4
+
+    replica_set = ReplicaSet(primary_engine, [replica_engine, primary_engine])
+    assert [replica_set.choose() for _ in range(4)] == [replica_engine, primary_engine] * 2
+
+
+def test_health_is_cached_between_checks(test_dbs):
+    calls = []
+
+    def probe(replica):
+        calls.append(replica)
+        return 0.0
+
+    replica_set = ReplicaSet(primary_engine, [replica_engine], check_interval=60, lag_probe=probe)
+    for _ in range(5):
+        replica_set.choose()
+    assert len(calls) == 1
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import selectinload
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models
+from tests.test_api import TestingSessionLocal, client, seed_data, test_db
+
+MARKETPLACES = ["Amazon", "Walmart", "Direct"]
+# Leaves out the fixture's own sale, which is dated today
+IN_2024 = {"start_date": "2024-01-01", "end_date": "2024-12-31"}
+
+
+def add_search_sales():
+    # 30 sales, two per timestamp, so pages have to break ties on id
+    db = TestingSessionLocal()
+    start = datetime(2024, 5, 20, 12, 0)
+    for i in range(30):
+        product_id = 1 if i % 4 == 0 else 2
+        total = 100.0 * (i % 10)
+        sale = models.Sale(
+            order_id=f"{'WEB' if i % 2 else 'POS'}-{i:03d}",
+            total_amount=total,
+            marketplace=MARKETPLACES[i % 3],
+            transaction_date=start - timedelta(days=i // 2),
+        )
+        sale.items = [models.SaleItem(product_id=product_id, quantity=1, unit_price=total, subtotal=total)]
+        db.add(sale)
+    db.commit()
+    sales = db.query(models.Sale).options(selectinload(models.Sale.items)).filter(models.Sale.order_id != "ORD-12345").all()
+    db.close()
+    return sales
+
+
+def newest_first(sales):
+    return [sale.id for sale in sorted(sales, key=lambda sale: (sale.transaction_date, sale.id), reverse=True)]
+
+
+def walk(params, limit):
+    ids, cursor = [], None
+    while True:
+        response = client.get("/api/v1/sales/", params={**params, "limit": limit, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        ids.extend(sale["id"] for sale in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return ids
+
+
+def test_filters_combine(seed_data):
+    sales = add_search_sales()
+    params = {
+        "marketplace": "Walmart",
+        "start_date": "2024-05-10",
+        "end_date": "2024-05-20",
+        "min_total": 300,
+        "max_total": 900,
+    }
+    expected = [
+        sale for sale in sales
+        if sale.marketplace == "Walmart" and datetime(2024, 5, 10) <= sale.transaction_date
+        and 300 <= sale.total_amount <= 900
+    ]
+    assert expected
+    response = client.get("/api/v1/sales/", params=params)
+    assert response.status_code == 200
+    assert [sale["id"] for sale in response.json()] == newest_first(expected)
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_product_and_order_id_prefix_filters(seed_data):
+    sales = add_search_sales()
+    with_product = client.get("/api/v1/sales/", params={"product_id": 1, **IN_2024}).json()
+    assert [sale["id"] for sale in with_product] == newest_first([sale for sale in sales if sale.items[0].product_id == 1])
+    assert all(1 in [item["product_id"] for item in sale["items"]] for sale in with_product)
+
+    web = client.get("/api/v1/sales/", params={"order_id_prefix": "WEB-01"}).json()
+    assert sorted(sale["order_id"] for sale in web) == [f"WEB-{i:03d}" for i in range(11, 20, 2)]
+    # Wildcards in the prefix are matched literally
+    assert client.get("/api/v1/sales/", params={"order_id_prefix": "WEB%"}).json() == []
+    assert client.get("/api/v1/sales/", params={"order_id_prefix": "WEB*"}).json() == []
+
+
+def test_keyset_pages_cover_every_sale_once(seed_data):
+    sales = add_search_sales()
+    assert walk(IN_2024, limit=7) == newest_first(sales)
+    amazon = [sale for sale in sales if sale.marketplace == "Amazon"]
+    assert walk({"marketplace": "Amazon", **IN_2024}, limit=3) == newest_first(amazon)
+
+
+def test_invalid_ranges_are_rejected(seed_data):
+    assert client.get("/api/v1/sales/", params={"start_date": "2024-05-02", "end_date": "2024-05-01"}).status_code == 400
+    assert client.get("/api/v1/sales/", params={"min_total": 10, "max_total": 5}).status_code == 400
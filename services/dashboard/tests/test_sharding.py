@@ -0,0 +1,164 @@
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models
+import query_limits
+import sharding
+from config import settings
+from database import Base
+from tests.test_api import TestingSessionLocal, client, seed_data, test_db
+
+NUM_SHARDS = 3
+NUM_SALES = 12
+
+
+@pytest.fixture
+def shards(seed_data, monkeypatch):
+    engines = [
+        create_engine(f"sqlite:///./test_shard_{index}.db", connect_args={"check_same_thread": False})
+        for index in range(NUM_SHARDS)
+    ]
+    for engine in engines:
+        Base.metadata.create_all(bind=engine)
+    shard_set = sharding.ShardSet(engines)
+    monkeypatch.setattr(sharding, "shards", shard_set)
+    yield shard_set
+    shard_set.shutdown()
+    for engine in engines:
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+
+
+def post_sales(count=NUM_SALES):
+    sales = []
+    for i in range(count):
+        response = client.post("/api/v1/sales/", json={
+            "order_id": f"ORD-SHARD-{i}", "total_amount": 19.99, "marketplace": "Walmart",
+            "items": [{"product_id": 2, "quantity": 1, "unit_price": 19.99, "subtotal": 19.99}],
+        })
+        assert response.status_code == 200
+        sales.append(response.json())
+    return sales
+
+
+def stored_sales(shards):
+    return shards.scatter(lambda db: [(sale.id, sale.order_id) for sale in db.query(models.Sale).all()])
+
+
+def test_sales_are_written_to_the_shard_of_their_order_id(shards):
+    sales = post_sales()
+    per_shard = stored_sales(shards)
+    # With 12 orders every shard gets some
+    assert all(per_shard)
+    for sale in sales:
+        index = shards.index_for_order(sale["order_id"])
+        assert shards.index_for_sale(sale["id"]) == index
+        assert (sale["id"], sale["order_id"]) in per_shard[index]
+        fetched = client.get(f"/api/v1/sales/{sale['id']}").json()
+        assert fetched["order_id"] == sale["order_id"] and len(fetched["items"]) == 1
+
+    # Stock and its log stay on the primary
+    db = TestingSessionLocal()
+    assert db.query(models.Inventory).filter(models.Inventory.product_id == 2).one().quantity == 100 - NUM_SALES
+    assert db.query(models.InventoryLog).count() == 2 + NUM_SALES
+    db.close()
+
+
+def test_listing_merges_the_shards(shards):
+    sales = post_sales()
+    newest_first = [sale["id"] for sale in sorted(sales, key=lambda sale: (sale["transaction_date"], sale["id"]), reverse=True)]
+
+    ids, cursor = [], None
+    while True:
+        response = client.get("/api/v1/sales/", params={"limit": 5, **({"cursor": cursor} if cursor else {})})
+        ids.extend(sale["id"] for sale in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert ids == newest_first
+
+    page = client.get("/api/v1/sales/", params={"skip": 5, "limit": 5}).json()
+    assert [sale["id"] for sale in page] == newest_first[5:10]
+    walmart = client.get("/api/v1/sales/", params={"marketplace": "Walmart", "order_id_prefix": "ORD-SHARD-1"}).json()
+    assert sorted(sale["order_id"] for sale in walmart) == ["ORD-SHARD-1", "ORD-SHARD-10", "ORD-SHARD-11"]
+
+
+def test_analytics_merge_partial_results(shards):
+    post_sales()
+    today = datetime.now(timezone.utc).date().isoformat()
+
+    summary = client.get("/api/v1/analytics/sales/", params={"start_date": today, "end_date": today}).json()
+    assert summary["total_orders"] == NUM_SALES
+    assert summary["items_sold"] == NUM_SALES
+    assert summary["total_sales"] == pytest.approx(19.99 * NUM_SALES)
+
+    revenue = client.get("/api/v1/analytics/revenue/day", params={"date": today}).json()
+    assert revenue["revenue"] == pytest.approx(19.99 * NUM_SALES)
+
+    rows = client.post("/api/v1/analytics/product-sales/", json={
+        "start_date": today, "end_date": today, "category_id": 2
+    }).json()
+    assert len(rows) == NUM_SALES
+    assert {(row["product_name"], row["category_name"]) for row in rows} == {("T-shirt", "Clothing")}
+    assert client.post("/api/v1/analytics/product-sales/", json={
+        "start_date": today, "end_date": today, "category_id": 1
+    }).json() == []
+
+
+def test_sales_change_feed_is_not_sharded(shards):
+    assert client.get("/api/v1/changes/sales").status_code == 501
+    assert client.get("/api/v1/changes/inventory").status_code == 200
+
+
+def test_row_budget_counts_items_on_every_shard(shards, monkeypatch):
+    post_sales()
+    today = datetime.now(timezone.utc).date().isoformat()
+    monkeypatch.setattr(settings, "analytics_row_budget", NUM_SALES - 1)
+    response = client.post("/api/v1/analytics/product-sales/", json={"start_date": today, "end_date": today})
+    assert response.status_code == 400
+    assert f"about {NUM_SALES} rows" in response.json()["detail"]
+
+    monkeypatch.setattr(settings, "analytics_row_budget", NUM_SALES)
+    assert len(client.post("/api/v1/analytics/product-sales/", json={"start_date": today, "end_date": today}).json()) == NUM_SALES
+
+
+def test_statement_timeout_bounds_shard_queries(shards, monkeypatch):
+    post_sales()
+    today = datetime.now(timezone.utc).date().isoformat()
+    # A clock that moves a second per reading makes every statement overrun its deadline
+    clock = itertools.count()
+    monkeypatch.setattr(query_limits, "time", SimpleNamespace(monotonic=lambda: next(clock)))
+    monkeypatch.setattr(query_limits, "SQLITE_PROGRESS_INTERVAL", 1)
+    monkeypatch.setattr(settings, "analytics_statement_timeout_ms", 1)
+    # The summary only queries the shards
+    response = client.get("/api/v1/analytics/sales/", params={"start_date": today, "end_date": today})
+    assert response.status_code == 503
+    assert "statement timeout" in response.json()["detail"]
+
+
+def test_concurrent_sales_on_one_shard_get_distinct_ids(shards):
+    first, second = shards.sessions[0](), shards.sessions[0]()
+    first_id = shards.next_sale_id(first, 0)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        # The second allocation waits for the first sale to be stored
+        second_id = pool.submit(shards.next_sale_id, second, 0)
+        time.sleep(0.2)
+        assert not second_id.done()
+        first.add(models.Sale(
+            id=first_id, order_id="ORD-SHARD-A", total_amount=1.0, marketplace="Direct",
+            transaction_date=datetime.now(timezone.utc)
+        ))
+        first.commit()
+        assert second_id.result(timeout=5) == first_id + NUM_SHARDS
+    first.close()
+    second.close()
@@ -0,0 +1,112 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crud
+from singleflight import SingleFlight
+from tests.test_api import client, seed_data, test_db
+
+CALLERS = 8
+
+
+class Abort(BaseException):
+    pass
+
+
+def call_concurrently(flight, key, fn, release):
+    # Every caller starts while the leader is blocked in fn, then the leader is released
+    with ThreadPoolExecutor(max_workers=CALLERS) as executor:
+        futures = [executor.submit(flight.do, key, fn) for _ in range(CALLERS)]
+        while flight.in_flight() == 0:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        release.set()
+    return futures
+
+
+def test_concurrent_calls_share_one_computation():
+    flight = SingleFlight("test")
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"total": 42}
+
+    futures = call_concurrently(flight, "key", compute, release)
+    assert [future.result() for future in futures] == [{"total": 42}] * CALLERS
+    assert len(calls) == 1
+    assert flight.in_flight() == 0
+
+    # Nothing is cached once the call has finished
+    assert flight.do("key", compute) == {"total": 42}
+    assert len(calls) == 2
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError("database unavailable")
+
+    futures = call_concurrently(flight, "key", fail, release)
+    for future in futures:
+        with pytest.raises(ValueError, match="database unavailable"):
+            future.result()
+    assert flight.in_flight() == 0
+
+
+def test_waiters_retry_when_leader_is_cancelled():
+    flight = SingleFlight("test")
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+            raise Abort()
+        return "fresh"
+
+    futures = call_concurrently(flight, "key", compute, release)
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Abort:
+            results.append("aborted")
+    assert results.count("aborted") == 1
+    assert results.count("fresh") == CALLERS - 1
+    assert len(calls) >= 2
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight("test")
+    assert flight.do(("revenue", "week"), lambda: 1) == 1
+    assert flight.do(("revenue", "month"), lambda: 2) == 2
+
+
+def test_analytics_route_coalesces_identical_requests(seed_data, monkeypatch):
+    get_revenue_comparison = crud.get_revenue_comparison
+    calls = []
+
+    def slow_revenue_comparison(*args, **kwargs):
+        calls.append(1)
+        time.sleep(0.2)
+        return get_revenue_comparison(*args, **kwargs)
+
+    monkeypatch.setattr(crud, "get_revenue_comparison", slow_revenue_comparison)
+    with ThreadPoolExecutor(max_workers=CALLERS) as executor:
+        responses = list(executor.map(lambda _: client.get("/api/v1/analytics/revenue/week"), range(CALLERS)))
+    assert all(response.status_code == 200 for response in responses)
+    assert len({response.text for response in responses}) == 1
+    assert len(calls) < CALLERS
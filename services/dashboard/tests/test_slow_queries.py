@@ -0,0 +1,64 @@
+import pytest
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from slow_queries import slow_query_log
+from tests.test_api import client, seed_data, test_db
+
+ADMIN_HEADERS = {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "secret")
+    slow_query_log.clear()
+    yield
+    slow_query_log.wait_for_plans(timeout=5)
+    slow_query_log.clear()
+
+
+def test_slow_queries_require_admin_token(seed_data, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", None)
+    assert client.get("/api/v1/admin/slow-queries", headers=ADMIN_HEADERS).status_code == 403
+
+    monkeypatch.setattr(settings, "admin_token", "secret")
+    assert client.get("/api/v1/admin/slow-queries").status_code == 403
+    assert client.get("/api/v1/admin/slow-queries", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/api/v1/admin/slow-queries", headers=ADMIN_HEADERS).status_code == 200
+
+
+def test_fast_queries_are_not_logged(seed_data, admin):
+    client.get("/api/v1/products/1")
+    response = client.get("/api/v1/admin/slow-queries", headers=ADMIN_HEADERS)
+    assert response.json() == []
+
+
+def test_slow_query_is_logged_with_plan(seed_data, admin, monkeypatch):
+    monkeypatch.setattr(settings, "slow_query_threshold_ms", 0)
+    client.get("/api/v1/inventory/history/1")
+    monkeypatch.setattr(settings, "slow_query_threshold_ms", 10000)
+    slow_query_log.wait_for_plans(timeout=5)
+
+    response = client.get("/api/v1/admin/slow-queries", headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    entries = {entry["function"]: entry for entry in response.json()}
+    entry = entries["get_inventory_history"]
+    assert "inventory_logs" in entry["statement"]
+    assert "1" in entry["parameters"]
+    assert entry["elapsed_ms"] >= 0
+    # SQLite falls back to EXPLAIN QUERY PLAN
+    assert "inventory_logs" in entry["plan"]
+
+
+def test_writes_are_logged_without_explain(seed_data, admin, monkeypatch):
+    monkeypatch.setattr(settings, "slow_query_threshold_ms", 0)
+    client.put("/api/v1/inventory/1", json={"quantity": 40})
+    monkeypatch.setattr(settings, "slow_query_threshold_ms", 10000)
+    slow_query_log.wait_for_plans(timeout=5)
+
+    updates = [entry for entry in slow_query_log.recent() if entry["statement"].startswith("UPDATE")]
+    assert updates
+    assert all(entry["plan"] is None for entry in updates)
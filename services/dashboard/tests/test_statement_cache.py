@@ -0,0 +1,43 @@
+from sqlalchemy import event
+from sqlalchemy.engine.default import CACHE_HIT
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crud
+from tests.test_api import TestingSessionLocal, engine, seed_data, test_db
+
+# Lookup and an ID other than 1 to look up (the fixture has a single sale)
+LOOKUPS = [
+    (lambda db, i: crud.get_category(db, category_id=i), 2),
+    (lambda db, i: crud.get_product(db, product_id=i), 2),
+    (lambda db, i: crud.get_inventory(db, product_id=i), 2),
+    (lambda db, i: crud.get_sale(db, sale_id=i), 1),
+]
+
+
+def test_hot_lookups_reuse_compiled_statements(seed_data):
+    cache = []
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        cache.append((statement, context.cache_hit))
+
+    db = TestingSessionLocal()
+    # The first round may compile; every later call, with any ID, must come from the cache
+    for lookup, _ in LOOKUPS:
+        assert lookup(db, 1) is not None
+
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    try:
+        for lookup, other_id in LOOKUPS:
+            db.expunge_all()
+            assert lookup(db, other_id) is not None
+    finally:
+        event.remove(engine, "after_cursor_execute", after_cursor_execute)
+
+    # get_sale also loads the items with a second, cached SELECT
+    assert len(cache) == 5
+    assert [statement for statement, hit in cache if hit != CACHE_HIT] == []
+    assert len(crud.get_sale(db, sale_id=1).items) == 2
+    db.close()
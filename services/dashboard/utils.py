@@ -0,0 +1,45 @@
+import secrets
+from typing import List, Optional
+
+from fastapi import Header, HTTPException
+
+from config import settings
+
+MAX_BATCH_IDS = 200
+
+
+def parse_id_list(value: str, name: str = "ids") -> List[int]:
+    """
+    Parse a comma separated list of IDs, keeping the request order and dropping duplicates
+    """
+    ids = []
+    seen = set()
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            item_id = int(part)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid ID in {name}: {part}")
+        if item_id not in seen:
+            seen.add(item_id)
+            ids.append(item_id)
+
+    if not ids:
+        raise HTTPException(status_code=400, detail=f"{name} must contain at least one ID")
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"{name} can contain at most {MAX_BATCH_IDS} IDs")
+    return ids
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    return bool(settings.admin_token and token and secrets.compare_digest(token, settings.admin_token))
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """
+    Dependency for admin-only routes; they are disabled unless ADMIN_TOKEN is set
+    """
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")